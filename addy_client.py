@@ -0,0 +1,544 @@
+import os
+import time
+import asyncio
+import random
+import logging
+import threading
+import collections
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, Any, Optional
+from dotenv import load_dotenv
+from rate_limiter import AddyRateLimiter, get_rate_limiter
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+ADDY_API_BASE = 'https://addy-ai-external-api-dev.firebaseapp.com'
+
+# Responses worth retrying: rate limiting and transient upstream failures
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Transport errors worth retrying: the request never reached Addy. Read
+# timeouts are not retried, since the extraction may already be running
+# upstream and another full timeout would follow.
+RETRY_EXCEPTIONS = (requests.exceptions.ConnectionError, requests.exceptions.ConnectTimeout)
+ASYNC_RETRY_EXCEPTIONS = (httpx.ConnectError, httpx.ConnectTimeout)
+
+# Extract latencies needed before the hedge delay is taken from them
+HEDGE_MIN_SAMPLES = 20
+
+class CircuitOpenError(ConnectionError):
+    """Raised instead of calling Addy while the circuit breaker is open"""
+
+class HedgeCancelled(Exception):
+    """Raised by a hedged request whose call was already answered when it got a limiter slot"""
+
+class CircuitBreaker:
+    """
+    Fail fast while the Addy API is degraded.
+
+    After `failure_threshold` consecutive failed calls (transport errors or
+    429/5xx once retries are exhausted) the circuit opens and calls raise
+    CircuitOpenError immediately. After `reset_timeout` seconds one trial
+    call is let through; its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold: int = None, reset_timeout: float = None):
+        self.failure_threshold = failure_threshold or int(os.getenv('ADDY_BREAKER_FAILURES', '5'))
+        self.reset_timeout = reset_timeout or float(os.getenv('ADDY_BREAKER_RESET', '30'))
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """'closed', 'open' or 'half_open'"""
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at < self.reset_timeout:
+            return 'open'
+        return 'half_open'
+
+    @property
+    def is_open(self) -> bool:
+        """True while calls would be rejected"""
+        return self.state == 'open' or (self.state == 'half_open' and self.trial_in_flight)
+
+    def allow(self) -> bool:
+        """Whether a call may go out now; claims the trial call when half open"""
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return True
+            return False
+
+    def abandon(self) -> None:
+        """Give back a call that was allowed but ended without an outcome"""
+        with self._lock:
+            self.trial_in_flight = False
+
+    def reset(self) -> None:
+        """Close the circuit and forget past failures"""
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def record(self, success: bool) -> None:
+        """Record the outcome of a call that was allowed"""
+        with self._lock:
+            self.trial_in_flight = False
+            if success:
+                self.failures = 0
+                self.opened_at = None
+                return
+            self.failures += 1
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    logger.error(f"Addy circuit opened after {self.failures} consecutive failures")
+                self.opened_at = time.monotonic()
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+def get_circuit_breaker(base_url: str = ADDY_API_BASE) -> CircuitBreaker:
+    """Return the breaker shared by every client of an Addy deployment"""
+    with _breakers_lock:
+        if base_url not in _breakers:
+            _breakers[base_url] = CircuitBreaker()
+        return _breakers[base_url]
+
+def default_hedge_percentile() -> Optional[float]:
+    """Percentile of extract latency after which a hedged request is sent; None disables hedging"""
+    value = os.getenv('ADDY_HEDGE_PERCENTILE')
+    return float(value) if value else None
+
+class LatencyTracker:
+    """Recent successful call latencies, used to time hedged requests"""
+
+    def __init__(self, size: int = 200):
+        self.samples = collections.deque(maxlen=size)
+
+    def add(self, latency: float) -> None:
+        self.samples.append(latency)
+
+    def reset(self) -> None:
+        self.samples.clear()
+
+    def percentile(self, percentile: float) -> Optional[float]:
+        if len(self.samples) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percentile / 100))]
+
+_latency_trackers = {}
+
+def get_latency_tracker(base_url: str, endpoint: str) -> LatencyTracker:
+    """Return the latency history shared by every client of an Addy endpoint"""
+    with _breakers_lock:
+        key = (base_url, endpoint)
+        if key not in _latency_trackers:
+            _latency_trackers[key] = LatencyTracker()
+        return _latency_trackers[key]
+
+def reset_shared_state() -> None:
+    """
+    Reset the process-wide circuit breakers, latency histories and rate limiter.
+
+    Clients keep references to these shared objects, so they are reset in
+    place; tests call this so one test's failures don't leak into the next.
+    """
+    with _breakers_lock:
+        shared = list(_breakers.values()) + list(_latency_trackers.values())
+    for item in shared:
+        item.reset()
+    get_rate_limiter().reset()
+
+class AddyClient:
+    """
+    Pooled HTTP client shared by every Addy AI API call.
+
+    A single requests.Session keeps connections alive between calls, and
+    rate-limited or failed requests are retried with jittered exponential
+    backoff before the response is handed back to the caller. Every attempt
+    goes through the process-wide rate limiter, and calls fail fast while
+    the shared circuit breaker is open.
+
+    With `hedge_percentile` set (or ADDY_HEDGE_PERCENTILE), an extract call
+    still running after that percentile of recent extract latencies gets a
+    duplicate request if the rate limiter has room, and whichever answers
+    first is returned.
+    """
+
+    ENDPOINTS = {
+        'classify': '/document/classify',
+        'extract': '/document/extract'
+    }
+
+    def __init__(self, api_key: str, base_url: str = ADDY_API_BASE, timeouts: Dict[str, float] = None,
+                 max_retries: int = None, backoff_base: float = 0.5, backoff_max: float = 30.0,
+                 pool_size: int = None, limiter: AddyRateLimiter = None, breaker: CircuitBreaker = None,
+                 hedge_percentile: float = None):
+        self.api_key = api_key
+        self.limiter = limiter or get_rate_limiter()
+        self.base_url = base_url.rstrip('/')
+        self.breaker = breaker or get_circuit_breaker(self.base_url)
+        self.hedge_percentile = hedge_percentile if hedge_percentile is not None else default_hedge_percentile()
+        self.hedge_delay_default = float(os.getenv('ADDY_HEDGE_DELAY', '30'))
+        self.latency = {endpoint: get_latency_tracker(self.base_url, endpoint) for endpoint in self.ENDPOINTS}
+        self.hedged_requests = 0
+        self.timeouts = {
+            'classify': float(os.getenv('ADDY_CLASSIFY_TIMEOUT', 300)),
+            'extract': float(os.getenv('ADDY_EXTRACT_TIMEOUT', 300)),
+            **(timeouts or {})
+        }
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv('ADDY_MAX_RETRIES', 3))
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        pool_size = pool_size or int(os.getenv('ADDY_POOL_SIZE', 10))
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+
+        # Runs hedged extract calls, primaries and hedges alike; more threads
+        # than pooled connections would only wait for a connection
+        self._hedge_pool = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix='addy-hedge')
+
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            'api-key': api_key,
+            'Content-Type': 'application/json',
+            'Accept': 'application/json'
+        })
+
+    def _backoff_delay(self, attempt: int, response: requests.Response = None) -> float:
+        """Full-jitter exponential backoff, honouring Retry-After on 429s"""
+        if response is not None and response.status_code == 429:
+            try:
+                return min(float(response.headers.get('Retry-After')), self.backoff_max)
+            except (TypeError, ValueError):
+                pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def hedge_delay(self, endpoint: str) -> float:
+        """Seconds to wait before hedging, from recent latencies once there are enough"""
+        delay = self.latency[endpoint].percentile(self.hedge_percentile)
+        return delay if delay is not None else self.hedge_delay_default
+
+    def post(self, endpoint: str, payload: Dict[str, Any], timeout: float = None,
+             sent: threading.Event = None, abort: threading.Event = None) -> requests.Response:
+        """
+        POST a payload to an Addy endpoint, retrying transient failures.
+
+        Args:
+            endpoint: Endpoint name ('classify' or 'extract')
+            payload: JSON request body, or a file-like body of JSON bytes
+                (e.g. memory_budget.RequestBody) that is streamed
+            timeout: Override the configured timeout for this endpoint
+            sent: Set once the request has a limiter slot and goes out;
+                hedging is timed from it
+            abort: Once set, the request is dropped instead of sent when it
+                gets a limiter slot
+
+        Returns:
+            The final response; callers check the status as before
+
+        Raises:
+            CircuitOpenError: If the circuit breaker is open
+            HedgeCancelled: If `abort` was set before the request went out
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"Addy API circuit is open, not sending {endpoint} request")
+
+        try:
+            response = self._post_with_retries(endpoint, payload, timeout, sent, abort)
+        except HedgeCancelled:
+            raise
+        except Exception:
+            self.breaker.record(False)
+            raise
+        self.breaker.record(response.status_code not in RETRY_STATUS_CODES)
+        return response
+
+    def _post_with_retries(self, endpoint: str, payload: Dict[str, Any], timeout: float = None,
+                           sent: threading.Event = None, abort: threading.Event = None) -> requests.Response:
+        url = f"{self.base_url}{self.ENDPOINTS[endpoint]}"
+        timeout = timeout or self.timeouts.get(endpoint, 300)
+
+        for attempt in range(self.max_retries + 1):
+            started = time.monotonic()
+            try:
+                with self.limiter.request() as slot:
+                    if abort is not None and abort.is_set():
+                        slot.unused = True
+                        raise HedgeCancelled(f"Addy {endpoint} call already answered")
+                    if sent is not None:
+                        sent.set()
+                    if hasattr(payload, 'read'):
+                        # Streamed bodies are re-read from the start on every attempt
+                        payload.seek(0)
+                        response = self.session.post(url, data=payload, timeout=timeout)
+                    else:
+                        response = self.session.post(url, json=payload, timeout=timeout)
+                    slot.error = response.status_code in RETRY_STATUS_CODES
+            except RETRY_EXCEPTIONS as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self._backoff_delay(attempt)
+                logger.warning(f"Addy {endpoint} request failed ({str(e)}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+
+            if response.status_code not in RETRY_STATUS_CODES:
+                self.latency[endpoint].add(time.monotonic() - started)
+                return response
+            if attempt == self.max_retries:
+                return response
+
+            delay = self._backoff_delay(attempt, response)
+            logger.warning(f"Addy {endpoint} returned {response.status_code}, retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+    def _hedged_post(self, endpoint: str, payload: Dict[str, Any], timeout: float = None) -> requests.Response:
+        """
+        POST, sending a duplicate if the first request is slower than the hedge delay.
+
+        No duplicate is started while the limiter is full, and one still
+        waiting for a slot when the call is answered is dropped unsent.
+        """
+        sent = threading.Event()
+        answered = threading.Event()
+
+        def primary() -> requests.Response:
+            try:
+                return self.post(endpoint, payload, timeout, sent)
+            finally:
+                # Also released when the call ends without sending anything
+                sent.set()
+
+        delay = self.hedge_delay(endpoint)
+        pending = {self._hedge_pool.submit(primary)}
+        # Time the hedge from when the request goes out, not while it waits for a limiter slot
+        sent.wait()
+        done, pending = wait(pending, timeout=delay)
+        if not done and self.limiter.in_flight < self.limiter.limit:
+            logger.info(f"Addy {endpoint} still running after {delay:.1f}s, sending hedged request")
+            self.hedged_requests += 1
+            pending.add(self._hedge_pool.submit(self.post, endpoint, payload, timeout, None, answered))
+
+        # Take the first good response; the loser finishes in the background
+        response, error = None, None
+        try:
+            while done or pending:
+                for future in done:
+                    try:
+                        response = future.result()
+                    except Exception as e:
+                        error = e
+                        continue
+                    if response.status_code not in RETRY_STATUS_CODES:
+                        return response
+                if not pending:
+                    break
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        finally:
+            # A hedge still waiting for a limiter slot is dropped unsent
+            answered.set()
+
+        if response is not None:
+            return response
+        raise error
+
+    def classify(self, payload: Dict[str, Any], timeout: float = None) -> requests.Response:
+        """POST to the document classification endpoint"""
+        return self.post('classify', payload, timeout)
+
+    def extract(self, payload: Dict[str, Any], timeout: float = None) -> requests.Response:
+        """POST to the document extraction endpoint, hedged if enabled"""
+        # A streamed body can't be read by two requests at once, so it is never hedged
+        if self.hedge_percentile and not hasattr(payload, 'read'):
+            return self._hedged_post('extract', payload, timeout)
+        return self.post('extract', payload, timeout)
+
+class AsyncAddyClient:
+    """
+    asyncio counterpart of AddyClient built on httpx.
+
+    A semaphore bounds the number of requests in flight, so a single event
+    loop can keep many extractions running without a thread per request.
+    Use it as an async context manager so the connection pool is closed.
+    Rate limiting, the circuit breaker and hedging work as in AddyClient;
+    a losing hedged request is cancelled.
+    """
+
+    ENDPOINTS = AddyClient.ENDPOINTS
+
+    def __init__(self, api_key: str, base_url: str = ADDY_API_BASE, timeouts: Dict[str, float] = None,
+                 max_retries: int = None, backoff_base: float = 0.5, backoff_max: float = 30.0,
+                 max_concurrency: int = None, limiter: AddyRateLimiter = None, breaker: CircuitBreaker = None,
+                 hedge_percentile: float = None):
+        self.api_key = api_key
+        self.limiter = limiter or get_rate_limiter()
+        self.base_url = base_url.rstrip('/')
+        self.breaker = breaker or get_circuit_breaker(self.base_url)
+        self.hedge_percentile = hedge_percentile if hedge_percentile is not None else default_hedge_percentile()
+        self.hedge_delay_default = float(os.getenv('ADDY_HEDGE_DELAY', '30'))
+        self.latency = {endpoint: get_latency_tracker(self.base_url, endpoint) for endpoint in self.ENDPOINTS}
+        self.hedged_requests = 0
+        self.timeouts = {
+            'classify': float(os.getenv('ADDY_CLASSIFY_TIMEOUT', 300)),
+            'extract': float(os.getenv('ADDY_EXTRACT_TIMEOUT', 300)),
+            **(timeouts or {})
+        }
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv('ADDY_MAX_RETRIES', 3))
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        max_concurrency = max_concurrency or int(os.getenv('ADDY_MAX_CONCURRENCY', 100))
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.client = httpx.AsyncClient(
+            headers={
+                'api-key': api_key,
+                'Content-Type': 'application/json',
+                'Accept': 'application/json'
+            },
+            limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency)
+        )
+
+    _backoff_delay = AddyClient._backoff_delay
+    hedge_delay = AddyClient.hedge_delay
+
+    async def post(self, endpoint: str, payload: Dict[str, Any], timeout: float = None,
+                   sent: asyncio.Event = None) -> httpx.Response:
+        """POST a payload to an Addy endpoint, retrying transient failures; `sent` is set as in AddyClient.post"""
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"Addy API circuit is open, not sending {endpoint} request")
+
+        try:
+            response = await self._post_with_retries(endpoint, payload, timeout, sent)
+        except asyncio.CancelledError:
+            # A cancelled hedge says nothing about upstream health
+            self.breaker.abandon()
+            raise
+        except Exception:
+            self.breaker.record(False)
+            raise
+        self.breaker.record(response.status_code not in RETRY_STATUS_CODES)
+        return response
+
+    async def _post_with_retries(self, endpoint: str, payload: Dict[str, Any], timeout: float = None,
+                                 sent: asyncio.Event = None) -> httpx.Response:
+        url = f"{self.base_url}{self.ENDPOINTS[endpoint]}"
+        timeout = timeout or self.timeouts.get(endpoint, 300)
+
+        for attempt in range(self.max_retries + 1):
+            started = time.monotonic()
+            try:
+                async with self.semaphore:
+                    with await self.limiter.request_async() as slot:
+                        if sent is not None:
+                            sent.set()
+                        response = await self.client.post(url, json=payload, timeout=timeout)
+                        slot.error = response.status_code in RETRY_STATUS_CODES
+            except ASYNC_RETRY_EXCEPTIONS as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self._backoff_delay(attempt)
+                logger.warning(f"Addy {endpoint} request failed ({str(e)}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+
+            if response.status_code not in RETRY_STATUS_CODES:
+                self.latency[endpoint].add(time.monotonic() - started)
+                return response
+            if attempt == self.max_retries:
+                return response
+
+            delay = self._backoff_delay(attempt, response)
+            logger.warning(f"Addy {endpoint} returned {response.status_code}, retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    async def _hedged_post(self, endpoint: str, payload: Dict[str, Any], timeout: float = None) -> httpx.Response:
+        """POST, sending a duplicate if the first request is slower than the hedge delay and the limiter has room"""
+        sent = asyncio.Event()
+
+        async def primary() -> httpx.Response:
+            try:
+                return await self.post(endpoint, payload, timeout, sent)
+            finally:
+                sent.set()
+
+        delay = self.hedge_delay(endpoint)
+        pending = {asyncio.create_task(primary())}
+        response, error = None, None
+        try:
+            # Time the hedge from when the request goes out, not while it waits for a slot
+            await sent.wait()
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if not done and self.limiter.in_flight < self.limiter.limit:
+                logger.info(f"Addy {endpoint} still running after {delay:.1f}s, sending hedged request")
+                self.hedged_requests += 1
+                pending.add(asyncio.create_task(self.post(endpoint, payload, timeout)))
+
+            while done or pending:
+                for task in done:
+                    try:
+                        response = task.result()
+                    except Exception as e:
+                        error = e
+                        continue
+                    if response.status_code not in RETRY_STATUS_CODES:
+                        return response
+                if not pending:
+                    break
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in pending:
+                task.cancel()
+
+        if response is not None:
+            return response
+        raise error
+
+    async def classify(self, payload: Dict[str, Any], timeout: float = None) -> httpx.Response:
+        """POST to the document classification endpoint"""
+        return await self.post('classify', payload, timeout)
+
+    async def extract(self, payload: Dict[str, Any], timeout: float = None) -> httpx.Response:
+        """POST to the document extraction endpoint, hedged if enabled"""
+        if self.hedge_percentile:
+            return await self._hedged_post('extract', payload, timeout)
+        return await self.post('extract', payload, timeout)
+
+    async def aclose(self) -> None:
+        """Close the underlying connection pool"""
+        await self.client.aclose()
+
+    async def __aenter__(self) -> 'AsyncAddyClient':
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback) -> None:
+        await self.aclose()
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_addy_client(api_key: str, base_url: str = ADDY_API_BASE) -> AddyClient:
+    """Return the process-wide client for an API key, creating it on first use"""
+    with _clients_lock:
+        key = (api_key, base_url)
+        if key not in _clients:
+            _clients[key] = AddyClient(api_key, base_url)
+        return _clients[key]
@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from functools import wraps
 import jwt
 import os
@@ -7,6 +7,11 @@ from datetime import datetime, timedelta
 from dotenv import load_dotenv
 from document_processor import process_document
 from nlp_engine import MortgageNLPEngine
+from query_analysis import QueryContext
+from job_queue import JobQueue
+from upload_stream import UploadRequest, UploadRejected
+import threading
+import queue
 import json
 
 # Configure logging
@@ -20,11 +25,86 @@ logger = logging.getLogger(__name__)
 load_dotenv()
 
 app = Flask(__name__)
+app.request_class = UploadRequest
 app.config['SECRET_KEY'] = os.getenv('API_SECRET_KEY', 'your-secret-key')
 
 # Initialize NLP engine
 nlp_engine = MortgageNLPEngine()
 
+# Batch job queue, created on first use
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+def get_job_queue() -> JobQueue:
+    """Return the batch job queue, starting its workers on first use"""
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            upload_dir = os.getenv('PDF_UPLOAD_DIR', 'uploads')
+            _job_queue = JobQueue(
+                db_path=os.getenv('JOB_QUEUE_DB', os.path.join(upload_dir, 'jobs.db')),
+                storage_dir=os.path.join(upload_dir, 'jobs'),
+                processors={
+                    'document': lambda path, **options: process_document(path),
+                    'nlp': nlp_engine.process_document,
+                    'packet': nlp_engine.process_packet
+                },
+                max_workers=int(os.getenv('JOB_WORKERS', '4'))
+            )
+            _job_queue.start()
+        return _job_queue
+
+def get_uploaded_pdf():
+    """
+    Return the path the uploaded PDF was streamed to.
+
+    Returns:
+        (path, None) on success, or (None, error response) if the upload
+        is missing or was rejected
+    """
+    try:
+        if 'file' not in request.files:
+            return None, (jsonify({'error': 'No file provided'}), 400)
+        
+        file = request.files['file']
+        if file.filename == '':
+            return None, (jsonify({'error': 'No file selected'}), 400)
+        
+        if not file.filename.lower().endswith('.pdf'):
+            return None, (jsonify({'error': 'Only PDF files are supported'}), 400)
+        
+        return file.stream.validate(), None
+    
+    except UploadRejected as e:
+        return None, (jsonify({'error': str(e)}), e.status_code)
+
+def get_uploaded_pdfs(files):
+    """
+    Validate several uploaded PDFs.
+
+    Returns:
+        ([(filename, path), ...], None) on success, or (None, error response)
+        naming the first file that was rejected
+    """
+    uploads = []
+    for file in files:
+        if file.filename == '':
+            return None, (jsonify({'error': 'No file selected'}), 400)
+        if not file.filename.lower().endswith('.pdf'):
+            return None, (jsonify({'error': f'Only PDF files are supported: {file.filename}'}), 400)
+        try:
+            uploads.append((file.filename, file.stream.validate()))
+        except UploadRejected as e:
+            return None, (jsonify({'error': f'{str(e)}: {file.filename}'}), e.status_code)
+    return uploads, None
+
+# Seconds between keep-alive comments on an idle event stream
+SSE_KEEPALIVE_SECONDS = 15
+
+def sse_event(event: str, data) -> str:
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
@@ -73,7 +153,8 @@ def health_check():
     """API health check endpoint"""
     return jsonify({
         'status': 'healthy',
-        'timestamp': datetime.utcnow().isoformat()
+        'timestamp': datetime.utcnow().isoformat(),
+        'addy_limiter': nlp_engine.rate_limiter.state()
     })
 
 @app.route('/api/document/process', methods=['POST'])
@@ -81,30 +162,15 @@ def health_check():
 def process_document_api(current_user):
     """Process a document through the document processor"""
     try:
-        if 'file' not in request.files:
-            return jsonify({'error': 'No file provided'}), 400
-            
-        file = request.files['file']
-        if file.filename == '':
-            return jsonify({'error': 'No file selected'}), 400
-            
-        if not file.filename.lower().endswith('.pdf'):
-            return jsonify({'error': 'Only PDF files are supported'}), 400
+        # The upload was streamed to a unique temp file, removed with the request
+        upload_path, error = get_uploaded_pdf()
+        if error:
+            return error
         
-        # Save file temporarily
-        temp_path = f"/tmp/{file.filename}"
-        file.save(temp_path)
+        # Process the document
+        result = process_document(upload_path)
+        return jsonify(result)
         
-        try:
-            # Process the document
-            result = process_document(temp_path)
-            return jsonify(result)
-            
-        finally:
-            # Clean up temporary file
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-                
     except Exception as e:
         logger.error(f"Error processing document: {str(e)}")
         return jsonify({
@@ -113,6 +179,65 @@ def process_document_api(current_user):
             'error_type': type(e).__name__
         }), 500
 
+@app.route('/api/document/process/stream', methods=['POST'])
+@token_required
+def process_document_stream(current_user):
+    """
+    Process a document, streaming progress as Server-Sent Events.
+    
+    Emits 'preflight', 'classified', a 'chunk' event with the chunk's fields
+    and the merged result so far as each chunk is extracted (or
+    'chunk_failed'), and finally 'done' with the same body as
+    /api/document/process.
+    """
+    upload_path, error = get_uploaded_pdf()
+    if error:
+        return error
+    
+    # The request is closed before the stream is consumed, so the stream owns the upload
+    request.files['file'].stream.detach()
+    
+    # Set when the client goes away so the worker stops calling Addy
+    cancel = threading.Event()
+    
+    def generate():
+        events = queue.Queue()
+        
+        def run() -> None:
+            try:
+                result = process_document(upload_path, on_event=lambda event, data: events.put((event, data)),
+                                          cancel=cancel)
+            except Exception as e:
+                logger.error(f"Error processing document: {str(e)}")
+                result = {'success': False, 'error': str(e), 'error_type': type(e).__name__}
+            events.put(('done', result))
+        
+        worker = threading.Thread(target=run, daemon=True)
+        worker.start()
+        
+        while True:
+            try:
+                event, data = events.get(timeout=SSE_KEEPALIVE_SECONDS)
+            except queue.Empty:
+                # Keep proxies from closing the connection during slow chunks
+                yield ": keep-alive\n\n"
+                continue
+            yield sse_event(event, data)
+            if event == 'done':
+                break
+    
+    def stream():
+        try:
+            yield from generate()
+        finally:
+            # Also runs when the client disconnects early
+            cancel.set()
+            if os.path.exists(upload_path):
+                os.remove(upload_path)
+    
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/api/nlp/query', methods=['POST'])
 @token_required
 def process_query(current_user):
@@ -123,26 +248,18 @@ def process_query(current_user):
         if not data or 'query' not in data:
             return jsonify({'error': 'No query provided'}), 400
         
-        query = data['query']
-        
-        # Extract entities from query
-        entities = nlp_engine.extract_entities(query)
-        
-        # Detect intent
-        intent = nlp_engine.detect_intent(query)
-        
-        # Search guidelines based on intent and entities
-        guidelines = nlp_engine.search_guidelines(intent, entities)
-        
-        # Generate response
-        response = nlp_engine.generate_response(query, intent, entities, guidelines)
+        # Intent, entities and guidelines are computed once and shared by every stage
+        context = QueryContext(data['query'])
+        response, metadata = nlp_engine.answer_query(context)
         
         return jsonify({
             'success': True,
-            'intent': intent,
-            'entities': entities,
-            'guidelines': guidelines,
-            'response': response
+            'intent': context.intent,
+            'entities': context.entities,
+            'guidelines': context.guidelines,
+            'response': response,
+            'metadata': metadata,
+            'timings': context.timings
         })
         
     except Exception as e:
@@ -158,15 +275,10 @@ def process_query(current_user):
 def process_document_nlp(current_user):
     """Process a document through the NLP engine"""
     try:
-        if 'file' not in request.files:
-            return jsonify({'error': 'No file provided'}), 400
-            
-        file = request.files['file']
-        if file.filename == '':
-            return jsonify({'error': 'No file selected'}), 400
-            
-        if not file.filename.lower().endswith('.pdf'):
-            return jsonify({'error': 'Only PDF files are supported'}), 400
+        # The upload was streamed to a unique temp file, removed with the request
+        upload_path, error = get_uploaded_pdf()
+        if error:
+            return error
         
         # Get optional parameters
         borrower_stated_type = request.form.get('document_type')
@@ -177,24 +289,37 @@ def process_document_nlp(current_user):
             except:
                 return jsonify({'error': 'Invalid applicants data format'}), 400
         
-        # Save file temporarily
-        temp_path = f"/tmp/{file.filename}"
-        file.save(temp_path)
+        # Several files are classified concurrently, then extracted in parallel
+        files = request.files.getlist('file')
+        if len(files) > 1:
+            uploads, error = get_uploaded_pdfs(files)
+            if error:
+                return error
+            result = nlp_engine.process_documents(
+                [path for _, path in uploads],
+                borrower_stated_type=borrower_stated_type,
+                applicants=applicants
+            )
+            # Report the uploaded names rather than the temp files
+            for entry, (filename, _) in zip(result.get('documents', []), uploads):
+                entry['file'] = filename
+            return jsonify(result)
         
-        try:
-            # Process the document
+        # Multi-document packets are split by classified page range
+        if request.form.get('mode') == 'packet':
+            result = nlp_engine.process_packet(
+                upload_path,
+                borrower_stated_type=borrower_stated_type,
+                applicants=applicants
+            )
+        else:
             result = nlp_engine.process_document(
-                temp_path,
+                upload_path,
                 borrower_stated_type=borrower_stated_type,
                 applicants=applicants
             )
-            return jsonify(result)
-            
-        finally:
-            # Clean up temporary file
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-                
+        return jsonify(result)
+        
     except Exception as e:
         logger.error(f"Error processing document: {str(e)}")
         return jsonify({
@@ -203,5 +328,77 @@ def process_document_nlp(current_user):
             'error_type': type(e).__name__
         }), 500
 
+@app.route('/api/documents/batch', methods=['POST'])
+@token_required
+def process_documents_batch(current_user):
+    """Queue many documents for background processing"""
+    try:
+        try:
+            files = request.files.getlist('files') or request.files.getlist('file')
+        except UploadRejected as e:
+            return jsonify({'error': str(e)}), e.status_code
+        if not files:
+            return jsonify({'error': 'No files provided'}), 400
+        
+        for file in files:
+            if file.filename == '':
+                return jsonify({'error': 'No file selected'}), 400
+            if not file.filename.lower().endswith('.pdf'):
+                return jsonify({'error': f'Only PDF files are supported: {file.filename}'}), 400
+            try:
+                file.stream.validate()
+            except UploadRejected as e:
+                return jsonify({'error': f'{str(e)}: {file.filename}'}), e.status_code
+        
+        pipeline = request.form.get('pipeline', 'document')
+        if pipeline not in ('document', 'nlp', 'packet'):
+            return jsonify({'error': f'Unknown pipeline: {pipeline}'}), 400
+        
+        # Optional parameters for the NLP pipelines
+        options = {}
+        if pipeline in ('nlp', 'packet'):
+            if request.form.get('document_type'):
+                options['borrower_stated_type'] = request.form.get('document_type')
+            if request.form.get('applicants'):
+                try:
+                    options['applicants'] = json.loads(request.form.get('applicants'))
+                except:
+                    return jsonify({'error': 'Invalid applicants data format'}), 400
+        
+        job_queue = get_job_queue()
+        
+        # Move the streamed uploads into job storage until a worker picks them up
+        stored = []
+        for file in files:
+            stored.append((file.filename, file.stream.move_to(job_queue.storage_path(file.filename))))
+        
+        job_id = job_queue.submit(stored, pipeline=pipeline, options=options, owner=current_user)
+        
+        return jsonify({
+            'success': True,
+            'job_id': job_id,
+            'status': 'queued',
+            'files': len(stored),
+            'status_url': f'/api/jobs/{job_id}'
+        }), 202
+        
+    except Exception as e:
+        logger.error(f"Error queuing documents: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'error_type': type(e).__name__
+        }), 500
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+@token_required
+def get_job_status(current_user, job_id):
+    """Report per-file status and results for a batch job"""
+    job = get_job_queue().get_job(job_id)
+    if job is None or job['owner'] != current_user:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    return jsonify({'success': True, **job})
+
 if __name__ == '__main__':
     app.run(debug=os.getenv('FLASK_DEBUG', 'False').lower() == 'true') 
\ No newline at end of file
@@ -0,0 +1,119 @@
+import os
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Callable
+from dotenv import load_dotenv
+from addy_client import CircuitOpenError
+from document_buffer import DocumentBuffer
+from rate_limiter import get_rate_limiter
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+# Limits for one batched classify request: base64 payload bytes and file count.
+# Addy's classify response doesn't say which file each classification came
+# from, so files are sent one per request unless CLASSIFY_BATCH_FILES is raised
+# for a deployment that tags classifications with their `fileIndex`.
+CLASSIFY_BATCH_BYTES = int(os.getenv('CLASSIFY_BATCH_BYTES', str(20 * 1024 * 1024)))
+CLASSIFY_BATCH_FILES = int(os.getenv('CLASSIFY_BATCH_FILES', '1'))
+
+def encoded_size(document: DocumentBuffer) -> int:
+    """Size of the document's base64 payload, without encoding it"""
+    return (document.size + 2) // 3 * 4
+
+def pack_batches(sizes: List[int], max_bytes: int = None, max_files: int = None) -> List[List[int]]:
+    """
+    Greedily pack inputs, in order, into batches within the byte and count limits.
+
+    A single input larger than `max_bytes` gets a batch of its own.
+
+    Returns:
+        Input indexes for each batch
+    """
+    max_bytes = max_bytes or CLASSIFY_BATCH_BYTES
+    max_files = max_files or CLASSIFY_BATCH_FILES
+
+    batches = []
+    batch, batch_bytes = [], 0
+    for index, size in enumerate(sizes):
+        if batch and (len(batch) >= max_files or batch_bytes + size > max_bytes):
+            batches.append(batch)
+            batch, batch_bytes = [], 0
+        batch.append(index)
+        batch_bytes += size
+    if batch:
+        batches.append(batch)
+    return batches
+
+def map_classifications(classifications: List[Dict[str, Any]], count: int) -> List[Optional[List[Dict[str, Any]]]]:
+    """
+    Group the classifications of a batched request by input file.
+
+    Classifications that carry a `fileIndex` are grouped by it, and every
+    classification of a single-file batch belongs to that file. Without
+    indexes, several files can't be mapped reliably: a packet produces
+    several classifications and an unclassifiable file none, so even a
+    matching count may pair them with the wrong files. Those files come
+    back as None so the caller can classify them on their own.
+    """
+    if classifications and all(isinstance(c.get('fileIndex'), int) for c in classifications):
+        grouped = [[] for _ in range(count)]
+        for classification in classifications:
+            if 0 <= classification['fileIndex'] < count:
+                grouped[classification['fileIndex']].append(classification)
+        return [group or None for group in grouped]
+
+    if count == 1 and classifications:
+        return [list(classifications)]
+
+    logger.warning(f"Could not map {len(classifications)} classifications to {count} files")
+    return [None] * count
+
+def classify_batch(client, documents: List[DocumentBuffer], build_payload: Callable[[List[str]], Dict[str, Any]],
+                   max_bytes: int = None, max_files: int = None) -> List[Optional[List[Dict[str, Any]]]]:
+    """
+    Classify many documents with as few classify calls as the limits allow.
+
+    The requests are sent concurrently, within the rate limiter's current
+    concurrency, so one file per request still takes about one round trip.
+
+    Args:
+        client: AddyClient to send the requests with
+        documents: Documents to classify
+        build_payload: Builds a classify payload from a list of base64 files
+        max_bytes: Base64 bytes per request; defaults to CLASSIFY_BATCH_BYTES
+        max_files: Files per request; defaults to CLASSIFY_BATCH_FILES
+
+    Returns:
+        Per input, its classifications, or None if its batch failed or the
+        response could not be mapped back to it
+
+    Raises:
+        CircuitOpenError: If the Addy circuit breaker is open
+    """
+    def classify(batch: List[int]) -> List[Optional[List[Dict[str, Any]]]]:
+        try:
+            response = client.classify(build_payload([documents[index].data for index in batch]))
+            response.raise_for_status()
+
+            result = response.json()
+            if not result.get('success'):
+                raise ValueError(f"Classification failed: {result.get('reason', 'Unknown error')}")
+            return map_classifications(result.get('classifications', []), len(batch))
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            logger.error(f"Error classifying batch of {len(batch)} documents: {str(e)}")
+            return [None] * len(batch)
+
+    results = [None] * len(documents)
+    batches = pack_batches([encoded_size(document) for document in documents], max_bytes, max_files)
+    with ThreadPoolExecutor(max_workers=max(1, min(len(batches), get_rate_limiter().limit))) as executor:
+        for batch, grouped in zip(batches, executor.map(classify, batches)):
+            for index, classifications in zip(batch, grouped):
+                results[index] = classifications
+    return results
@@ -0,0 +1,94 @@
+import mmap
+import base64
+import hashlib
+import logging
+from typing import Union
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class DocumentBuffer:
+    """
+    A document read once and shared between every API call that needs it.
+
+    Files are memory-mapped instead of copied onto the heap, and the base64
+    payload and SHA-256 are computed lazily on first use and then reused, so
+    classification, extraction and cache lookups all share one encoding.
+    """
+
+    def __init__(self, file_path: str = None, content: bytes = None):
+        if file_path is None and content is None:
+            raise ValueError("DocumentBuffer requires a file path or content")
+
+        self.file_path = file_path
+        self._from_file = content is None
+        self._content = content
+        self._mapping = None
+        self._data = None
+        self._sha256 = None
+
+    @classmethod
+    def from_bytes(cls, content: bytes, name: str = None) -> 'DocumentBuffer':
+        """Wrap bytes that are already in memory, e.g. a PDF chunk"""
+        buffer = cls(content=content)
+        buffer.file_path = name
+        return buffer
+
+    @property
+    def content(self) -> Union[bytes, mmap.mmap]:
+        """The raw document bytes, memory-mapped when read from disk"""
+        if self._content is None:
+            with open(self.file_path, 'rb') as f:
+                try:
+                    self._mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                    self._content = self._mapping
+                except Exception:
+                    # Empty files and non-file streams cannot be mapped
+                    self._content = f.read()
+        return self._content
+
+    @property
+    def from_file(self) -> bool:
+        """True if the buffer is backed by a file on disk"""
+        return self._from_file
+
+    @property
+    def size(self) -> int:
+        """Size of the raw document in bytes"""
+        return len(self.content)
+
+    @property
+    def data(self) -> str:
+        """Base64 payload for the Addy API, encoded once"""
+        if self._data is None:
+            self._data = base64.b64encode(self.content).decode('ascii')
+        return self._data
+
+    @property
+    def sha256(self) -> str:
+        """SHA-256 of the raw document, used as the content address"""
+        if self._sha256 is None:
+            self._sha256 = hashlib.sha256(self.content).hexdigest()
+        return self._sha256
+
+    def release(self) -> None:
+        """Unmap the file and drop the encoded payload"""
+        if self._mapping is not None:
+            self._mapping.close()
+            self._mapping = None
+        if self._from_file:
+            self._content = None
+        self._data = None
+
+    def __enter__(self) -> 'DocumentBuffer':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.release()
+
+def as_document_buffer(document: Union[str, DocumentBuffer]) -> DocumentBuffer:
+    """Accept either a file path or an existing DocumentBuffer"""
+    if isinstance(document, DocumentBuffer):
+        return document
+    return DocumentBuffer(document)
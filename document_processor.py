@@ -1,15 +1,26 @@
 import requests
+import httpx
+import asyncio
+import hashlib
 import uuid
 import os
 import logging
+import threading
 import PyPDF2
-import tempfile
-from tqdm import tqdm
 from dotenv import load_dotenv
 from supabase import create_client
-from typing import Dict, Any, List
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import base64
+from typing import Dict, Any, List, Union, Iterable, Iterator, Tuple, Callable, Awaitable
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from extraction_cache import ExtractionCache, get_extraction_cache
+from document_buffer import DocumentBuffer, as_document_buffer
+from addy_client import AsyncAddyClient, CircuitOpenError, get_addy_client
+from rate_limiter import get_rate_limiter
+from pdf_utils import page_hashes, page_weights, outline_starts, write_pages
+from local_extractor import extract_local, MIN_CONFIDENCE as LOCAL_MIN_CONFIDENCE
+from preflight import preflight, PreflightError, ROUTE_LOCAL, ROUTE_SINGLE, ROUTE_CHUNKED, ROUTE_REJECT
+from pdf_slimming import slim_pdf, SLIMMING_ENABLED
+from memory_budget import (MemoryBudget, MEMORY_BUDGET_BYTES, FILE_DATA_PLACEHOLDER, payload_body, spill_document,
+                           release_document)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -18,74 +29,166 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
-def split_pdf(pdf_path: str, chunk_size: int = 50) -> List[str]:
+# Chunked extraction settings
+DEFAULT_CHUNK_SIZE = 50
+CHUNK_TARGET_BYTES = int(os.getenv('CHUNK_TARGET_BYTES', str(5 * 1024 * 1024)))
+DEFAULT_MAX_WORKERS = int(os.getenv('ADDY_MAX_WORKERS', '4'))
+DEFAULT_MAX_CONCURRENCY = int(os.getenv('ADDY_MAX_CONCURRENCY', '100'))
+
+# Pages sent to classify a chunked document once, instead of per chunk
+CLASSIFY_SAMPLE_PAGES = int(os.getenv('CLASSIFY_SAMPLE_PAGES', '3'))
+
+# Previously extracted page ranges remembered per starting page
+MAX_RANGES_PER_PAGE = 8
+
+# Fields map_chunk_fields fills for each document type. Unless EARLY_EXIT_FIELDS
+# names fields explicitly, chunked extraction stops once the classified type's
+# fields are all found.
+CHUNK_FIELDS = {
+    'w2': ('income',),
+    'w-2': ('income',),
+    'paystub': ('income',),
+    'paystubs': ('income',)
+}
+
+# How often a cancellable chunked run checks for cancellation while chunks are in flight
+CANCEL_POLL_SECONDS = 0.5
+
+# Source of chunk results extracted locally while the Addy circuit is open
+DEGRADED_SOURCE = 'local_degraded'
+
+class ProcessingCancelled(Exception):
+    """Raised when the caller cancels processing, e.g. because the client went away"""
+
+def check_cancelled(cancel: Union[threading.Event, None]) -> None:
+    """Raise ProcessingCancelled if `cancel` has been set"""
+    if cancel is not None and cancel.is_set():
+        raise ProcessingCancelled("Processing cancelled by the caller")
+
+def iter_page_ranges(pdf_path: str, page_ranges: Iterable[Tuple[int, int]]) -> Iterator[DocumentBuffer]:
     """
-    Split a large PDF into smaller chunks for processing
+    Lazily write the given [start, end) page ranges of a PDF as in-memory chunks
     
     Args:
         pdf_path: Path to the PDF file
-        chunk_size: Number of pages per chunk
+        page_ranges: Page ranges to extract, in order
+        
+    Yields:
+        DocumentBuffer for each page range
+    """
+    with open(pdf_path, 'rb') as file:
+        pdf_reader = PyPDF2.PdfReader(file)
+        
+        for start, end in page_ranges:
+            yield DocumentBuffer.from_bytes(
+                write_pages(pdf_reader, range(start, end)),
+                name=f"{pdf_path}[{start}:{end}]"
+            )
+
+def plan_chunks(weights: List[int], chunk_size: int = DEFAULT_CHUNK_SIZE, target_chunks: int = 1,
+                target_bytes: int = CHUNK_TARGET_BYTES, boundaries: Iterable[int] = (),
+                runs: Iterable[Tuple[int, int]] = None) -> List[Tuple[int, int]]:
+    """
+    Choose chunk boundaries that balance the bytes each chunk carries.
+    
+    The number of chunks is the largest of `target_chunks`, the count that
+    keeps chunks under `target_bytes`, and the count that keeps them under
+    `chunk_size` pages, so a few heavy scanned pages no longer end up in one
+    chunk that sets the total latency. Pages are then packed in order until
+    a chunk holds its share of the bytes. Documents starting at
+    `boundaries` are kept in one chunk unless they outweigh a chunk
+    themselves.
+    
+    Args:
+        weights: Bytes per page, e.g. from pdf_utils.page_weights
+        chunk_size: Maximum pages per chunk
+        target_chunks: Chunks to aim for, usually the available concurrency
+        target_bytes: Maximum bytes per chunk to aim for
+        boundaries: Pages where a classified document starts
+        runs: [start, end) page runs to cover; chunks never cross a run.
+            Defaults to every page.
         
     Returns:
-        List of temporary PDF file paths
+        [start, end) page range of each chunk, in order
     """
-    temp_files = []
-    try:
-        with open(pdf_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            total_pages = len(pdf_reader.pages)
-            
-            for start in range(0, total_pages, chunk_size):
-                end = min(start + chunk_size, total_pages)
-                
-                # Create a temporary file for this chunk
-                temp_pdf = tempfile.NamedTemporaryFile(suffix='.pdf', delete=False)
-                pdf_writer = PyPDF2.PdfWriter()
-                
-                # Add pages to this chunk
-                for page_num in range(start, end):
-                    pdf_writer.add_page(pdf_reader.pages[page_num])
-                
-                # Save the chunk
-                with open(temp_pdf.name, 'wb') as chunk_file:
-                    pdf_writer.write(chunk_file)
-                
-                temp_files.append(temp_pdf.name)
-                
-        return temp_files
-    except Exception as e:
-        # Clean up temp files if something goes wrong
-        for temp_file in temp_files:
-            try:
-                os.remove(temp_file)
-            except:
-                pass
-        raise e
-
-def classify_document(file_data: str, addy_api_key: str) -> str:
-    """Classify the document using Addy AI's classification API"""
-    headers = {
-        'api-key': addy_api_key,
-        'Content-Type': 'application/json',
-        'Accept': 'application/json'
-    }
+    runs = [(0, len(weights))] if runs is None else [(start, end) for start, end in runs if end > start]
+    pages = sum(end - start for start, end in runs)
+    if not pages:
+        return []
+    
+    total = sum(sum(weights[start:end]) for start, end in runs)
+    if not total:
+        # Without measurable content (e.g. blank pages) balance by page count
+        weights, total = [1] * len(weights), pages
+    count = min(pages, max(target_chunks, -(-total // max(1, target_bytes)), -(-pages // chunk_size)))
+    share = total / count
+    
+    ranges = []
+    for run_start, run_end in runs:
+        # Keep classified documents whole unless one is heavier than a chunk
+        cuts = sorted({run_start, run_end, *(page for page in boundaries if run_start < page < run_end)})
+        units = []
+        for start, end in zip(cuts, cuts[1:]):
+            weight = sum(weights[start:end])
+            if end - start > chunk_size or weight > share:
+                units.extend((page, page + 1, weights[page]) for page in range(start, end))
+            else:
+                units.append((start, end, weight))
+        
+        chunk_start, size = run_start, 0
+        for start, end, weight in units:
+            # Close the chunk where its size is nearest its share
+            if start > chunk_start and (end - chunk_start > chunk_size or size + weight / 2 > share):
+                ranges.append((chunk_start, start))
+                chunk_start, size = start, 0
+            size += weight
+        ranges.append((chunk_start, run_end))
+    return ranges
+
+def split_pdf(pdf_path: str, chunk_size: int = DEFAULT_CHUNK_SIZE, target_chunks: int = 1,
+              boundaries: Iterable[int] = None) -> Iterator[DocumentBuffer]:
+    """
+    Lazily split a large PDF into smaller in-memory chunks for processing
+    
+    Chunk boundaries come from plan_chunks using each page's measured
+    weight, so chunks carry similar byte counts instead of a fixed number
+    of pages. Each chunk is only written when the consumer asks for it, so
+    at most the chunks currently being uploaded are held in memory and
+    nothing touches the disk. The source file is closed when the generator
+    finishes or is closed early.
     
-    payload = {
+    Args:
+        pdf_path: Path to the PDF file
+        chunk_size: Maximum number of pages per chunk
+        target_chunks: Chunks to aim for, usually the available concurrency
+        boundaries: Pages where a document starts; defaults to the PDF's
+            top-level bookmarks
+        
+    Yields:
+        DocumentBuffer for each chunk
+    """
+    with open(pdf_path, 'rb') as file:
+        pdf_reader = PyPDF2.PdfReader(file)
+        if boundaries is None:
+            boundaries = outline_starts(pdf_reader)
+        chunk_ranges = plan_chunks(page_weights(pdf_reader), chunk_size, target_chunks, boundaries=boundaries)
+        
+        for start, end in chunk_ranges:
+            yield DocumentBuffer.from_bytes(
+                write_pages(pdf_reader, range(start, end)),
+                name=f"{pdf_path}[{start}:{end}]"
+            )
+
+def build_classify_payload(file_data: str) -> Dict[str, Any]:
+    """Build a classification request for a single document"""
+    return {
         "fileData": [file_data],
         "contentType": "application/pdf",
         "modelDetail": "high"
     }
-    
-    response = requests.post(
-        'https://addy-ai-external-api-dev.firebaseapp.com/document/classify',
-        headers=headers,
-        json=payload,
-        timeout=300
-    )
-    
-    response.raise_for_status()
-    result = response.json()
-    
+
+def parse_classification(result: Dict[str, Any]) -> str:
+    """Return the document type from a classify response"""
     if not result.get('success'):
         raise ValueError(f"Classification failed: {result.get('reason', 'Unknown error')}")
     
@@ -95,82 +198,251 @@ def classify_document(file_data: str, addy_api_key: str) -> str:
     
     return classifications[0].get('documentType', 'w2')  # Default to w2 if type not found
 
-def process_chunk(chunk_path: str, addy_api_key: str) -> Dict:
-    """Process a single PDF chunk"""
-    with open(chunk_path, 'rb') as file:
-        # Read file as base64
-        file_content = file.read()
-        file_data = base64.b64encode(file_content).decode('utf-8')
-        
-        # First classify the document
-        try:
-            doc_type = classify_document(file_data, addy_api_key)
-            logger.info(f"Document classified as: {doc_type}")
-        except Exception as e:
-            logger.warning(f"Classification failed, using default type: {str(e)}")
-            doc_type = "w2"  # Default to W2 as it's a supported type
-        
-        # Prepare request payload
-        payload = {
+def classify_document(file_data: str, addy_api_key: str, document: DocumentBuffer = None,
+                      budget: MemoryBudget = None) -> str:
+    """
+    Classify the document using Addy AI's classification API
+    
+    With a memory budget, pass FILE_DATA_PLACEHOLDER as `file_data` and the
+    document to stream into the request body.
+    """
+    with payload_body(build_classify_payload(file_data), document, budget) as body:
+        response = get_addy_client(addy_api_key).classify(body)
+    
+    response.raise_for_status()
+    return parse_classification(response.json())
+
+def sample_document(pdf_path: str, sample_pages: int = CLASSIFY_SAMPLE_PAGES) -> DocumentBuffer:
+    """Write the first `sample_pages` pages of a PDF as an in-memory document"""
+    with open(pdf_path, 'rb') as file:
+        pdf_reader = PyPDF2.PdfReader(file)
+        end = min(sample_pages, len(pdf_reader.pages))
+        return DocumentBuffer.from_bytes(write_pages(pdf_reader, range(end)), name=f"{pdf_path}[0:{end}]")
+
+def classify_sample(pdf_path: str, addy_api_key: str, sample_pages: int = CLASSIFY_SAMPLE_PAGES,
+                    budget: MemoryBudget = None) -> str:
+    """
+    Classify a chunked document once from its first pages.
+    
+    Falls back to the default type like per-chunk classification does, so a
+    failed classify call never fails the document.
+    """
+    try:
+        sample = sample_document(pdf_path, sample_pages)
+        file_data = FILE_DATA_PLACEHOLDER if budget else sample.data
+        doc_type = classify_document(file_data, addy_api_key, sample, budget)
+        logger.info(f"Document classified as: {doc_type}")
+        return doc_type
+    except Exception as e:
+        logger.warning(f"Classification failed, using default type: {str(e)}")
+        return "w2"  # Default to W2 as it's a supported type
+
+def build_chunk_payload(doc_type: str, file_data: str) -> Dict[str, Any]:
+    """Build an extraction request for a classified chunk"""
+    return {
+        "documentType": doc_type,
+        "contentType": "application/pdf",
+        "fileData": file_data,
+        "classification": {
             "documentType": doc_type,
-            "contentType": "application/pdf",
-            "fileData": file_data,
-            "classification": {
-                "documentType": doc_type,
-                "levelOfConfidence": 1.0
-            }
+            "levelOfConfidence": 1.0
         }
+    }
+
+def map_chunk_fields(doc_type: str, result: Dict[str, Any]) -> Dict[str, Any]:
+    """Map an extract response for a chunk to our required fields"""
+    # Check if extraction was successful
+    if not result.get('success'):
+        raise ValueError(f"API returned error: {result.get('errorMessage', 'Unknown error')}")
         
-        headers = {
-            'api-key': addy_api_key,
-            'Content-Type': 'application/json',
-            'Accept': 'application/json'
-        }
+    # Extract document data
+    document_data = result.get('document', {})
+    
+    # Map different document types to our required fields
+    extracted = {
+        'income': 0.0,
+        'credit_score': 0,
+        'debt': 0.0,
+        'property_value': 0.0
+    }
+    
+    if doc_type.lower() in ['w2', 'w-2']:
+        extracted['income'] = float(document_data.get('wages', 0))
+    elif doc_type.lower() in ['paystub', 'paystubs']:
+        extracted['income'] = float(document_data.get('grossPay', 0)) * 12  # Annualize monthly income
+    
+    return extracted
+
+def chunk_fields(doc_type: Union[str, None]) -> Tuple[str, ...]:
+    """Fields chunk extraction can produce for a document type"""
+    return CHUNK_FIELDS.get(str(doc_type or '').lower(), ())
+
+def raise_api_error(status_code: int, text: str) -> None:
+    """Translate an HTTP error status from the extract API into an exception"""
+    logger.error(f"API Response: {text}")
+    if status_code == 404:
+        raise ConnectionError("Invalid API endpoint. Please check the API documentation.")
+    elif status_code == 400:
+        raise ValueError(f"Bad request: {text}")
+    elif status_code == 401:
+        raise ConnectionError("Invalid API key. Please check your credentials.")
+    else:
+        raise ConnectionError(f"API Error ({status_code}): {text}")
+
+def extract_local_fields(document: DocumentBuffer, min_confidence: float = None) -> Union[Dict[str, Any], None]:
+    """
+    Extract a W-2 or paystub from its text layer without calling Addy.
+
+    Returns:
+        {'data', 'documentType', 'confidence'}, or None if the local match
+        is not confident enough and the document should go to Addy
+    """
+    if min_confidence is None:
+        min_confidence = LOCAL_MIN_CONFIDENCE
+    
+    local = extract_local(document)
+    if local is None or not local['document'] or local['confidence'] < min_confidence:
+        return None
+    
+    logger.info(f"Extracted {local['documentType']} locally (confidence {local['confidence']})")
+    return {
+        'data': map_chunk_fields(local['documentType'], {'success': True, 'document': local['document']}),
+        'documentType': local['documentType'],
+        'confidence': local['confidence']
+    }
+
+def degraded_local_fields(document: DocumentBuffer) -> Dict:
+    """
+    Best-effort local result while the Addy circuit breaker is open.
+
+    Any local match is used regardless of confidence; without one the chunk
+    fails immediately instead of waiting on a degraded upstream. The result
+    is tagged with source 'local_degraded' so it is never cached.
+    """
+    local = extract_local_fields(document, min_confidence=0.0)
+    if not local:
+        raise CircuitOpenError("Addy API is unavailable and the document has no usable text layer")
+    
+    logger.warning(f"Addy API unavailable, using local result (confidence {local['confidence']})")
+    return {**local['data'], 'confidence': local['confidence'], 'documentType': local['documentType'],
+            'source': DEGRADED_SOURCE}
+
+def is_degraded(result: Dict) -> bool:
+    """True for a chunk result that came from degraded_local_fields"""
+    return result.get('source') == DEGRADED_SOURCE
+
+def slim_for_upload(document: DocumentBuffer) -> Tuple[DocumentBuffer, Union[Dict[str, Any], None]]:
+    """
+    Run the optional slimming stage on a document about to be uploaded.
+
+    Returns the document to encode and the slimming report, or the original
+    document and None when slimming is disabled or the PDF can't be rewritten.
+    """
+    if not SLIMMING_ENABLED:
+        return document, None
+    try:
+        return slim_pdf(document)
+    except Exception as e:
+        logger.warning(f"PDF slimming failed, uploading the original: {str(e)}")
+        return document, None
+
+def add_slimming(totals: Dict[str, int], result: Dict) -> None:
+    """Add a chunk's slimming byte counts to the running totals"""
+    slimming = result.get('slimming')
+    if slimming:
+        totals['bytes_before'] = totals.get('bytes_before', 0) + slimming['bytes_before']
+        totals['bytes_after'] = totals.get('bytes_after', 0) + slimming['bytes_after']
+
+class DeferredClassification:
+    """
+    A document's classification, requested the first time a chunk needs it.
+    
+    Chunks extracted locally, or never extracted after an early exit, don't
+    trigger the classify call. `start()` submits it without waiting so the
+    chunk can be encoded meanwhile; `result()` waits for the type.
+    """
+    
+    def __init__(self, executor: ThreadPoolExecutor, classifier: Callable[[], str]):
+        self.executor = executor
+        self.classifier = classifier
+        self.future = None
+        self._lock = threading.Lock()
+    
+    def start(self) -> Future:
+        """Submit the classification unless it already has been"""
+        with self._lock:
+            if self.future is None:
+                self.future = self.executor.submit(self.classifier)
+            return self.future
+    
+    def result(self) -> str:
+        """Wait for the document type"""
+        return self.start().result()
+    
+    def close(self) -> None:
+        """Cancel the classification if it hasn't started, or wait for it to finish"""
+        with self._lock:
+            future = self.future
+        if future is not None and not future.cancel():
+            wait([future])
+
+def process_chunk(chunk: Union[str, DocumentBuffer], addy_api_key: str,
+                  doc_type: Union[str, Future, DeferredClassification, None] = None,
+                  budget: MemoryBudget = None) -> Dict:
+    """
+    Process a single PDF chunk
+    
+    `doc_type` is the document's classification, or a future or
+    DeferredClassification that resolves to it; the chunk is only
+    classified on its own when it is None. With a memory `budget`, request
+    bodies are encoded in place and spilled to disk when they don't fit.
+    """
+    with as_document_buffer(chunk) as document:
+        # Digital W-2s and paystubs don't need a remote call
+        local = extract_local_fields(document)
+        if local:
+            return {**local['data'], 'confidence': local['confidence'], 'documentType': local['documentType']}
+        
+        client = get_addy_client(addy_api_key)
+        if client.breaker.is_open:
+            return degraded_local_fields(document)
+        
+        # This chunk needs Addy, so classify the document while it is encoded
+        if isinstance(doc_type, DeferredClassification):
+            doc_type.start()
+        
+        # Encode once and share the payload between classify and extract
+        upload, slimming = slim_for_upload(document)
+        file_data = upload.data if budget is None else FILE_DATA_PLACEHOLDER
+        
+        # Wait for the document's classification only once the chunk is ready to send
+        if isinstance(doc_type, (Future, DeferredClassification)):
+            doc_type = doc_type.result()
+        elif doc_type is None:
+            try:
+                doc_type = classify_document(file_data, addy_api_key, upload, budget)
+                logger.info(f"Document classified as: {doc_type}")
+            except Exception as e:
+                logger.warning(f"Classification failed, using default type: {str(e)}")
+                doc_type = "w2"  # Default to W2 as it's a supported type
         
         # Make API request
-        response = requests.post(
-            'https://addy-ai-external-api-dev.firebaseapp.com/document/extract',
-            headers=headers,
-            json=payload,
-            timeout=300
-        )
+        try:
+            with payload_body(build_chunk_payload(doc_type, file_data), upload, budget) as body:
+                response = client.extract(body)
+        except CircuitOpenError:
+            return degraded_local_fields(document)
         
         try:
             response.raise_for_status()
-            result = response.json()
-            
-            # Check if extraction was successful
-            if not result.get('success'):
-                raise ValueError(f"API returned error: {result.get('errorMessage', 'Unknown error')}")
-                
-            # Extract document data
-            document_data = result.get('document', {})
-            
-            # Map different document types to our required fields
-            extracted = {
-                'income': 0.0,
-                'credit_score': 0,
-                'debt': 0.0,
-                'property_value': 0.0
-            }
-            
-            if doc_type.lower() in ['w2', 'w-2']:
-                extracted['income'] = float(document_data.get('wages', 0))
-            elif doc_type.lower() in ['paystub', 'paystubs']:
-                extracted['income'] = float(document_data.get('grossPay', 0)) * 12  # Annualize monthly income
-            
-            return extracted
+            result = map_chunk_fields(doc_type, response.json())
+            result['documentType'] = doc_type
+            if slimming:
+                result['slimming'] = slimming
+            return result
             
         except requests.exceptions.HTTPError as e:
-            logger.error(f"API Response: {response.text}")
-            if response.status_code == 404:
-                raise ConnectionError("Invalid API endpoint. Please check the API documentation.")
-            elif response.status_code == 400:
-                raise ValueError(f"Bad request: {response.text}")
-            elif response.status_code == 401:
-                raise ConnectionError("Invalid API key. Please check your credentials.")
-            else:
-                raise ConnectionError(f"API Error ({response.status_code}): {response.text}")
+            raise_api_error(response.status_code, response.text)
         except requests.exceptions.RequestException as e:
             raise ConnectionError(f"Request failed: {str(e)}")
         except ValueError as e:
@@ -193,12 +465,420 @@ def merge_results(results: List[Dict]) -> Dict:
     
     return merged
 
-def process_document(pdf_file_path: str) -> Dict[str, Any]:
+class MergePolicy:
+    """
+    When chunked extraction has found enough to stop early.
+    
+    Once every required field has a non-zero value extracted with at least
+    `min_confidence`, the remaining chunks are cancelled. By default the
+    required fields are the ones extraction can produce for the classified
+    document type (CHUNK_FIELDS), e.g. income once a W-2 is found; set
+    `required_fields` or EARLY_EXIT_FIELDS to wait for specific fields. An
+    empty `required_fields` disables early exit.
+    """
+    
+    def __init__(self, required_fields: Iterable[str] = None, min_confidence: float = None):
+        if required_fields is None and os.getenv('EARLY_EXIT_FIELDS') is not None:
+            required_fields = os.getenv('EARLY_EXIT_FIELDS').split(',')
+        # None means the fields of the classified document type
+        self.required_fields = (None if required_fields is None
+                                else tuple(field.strip() for field in required_fields if field.strip()))
+        self.min_confidence = (min_confidence if min_confidence is not None
+                               else float(os.getenv('EARLY_EXIT_MIN_CONFIDENCE', '0.8')))
+    
+    def fields_for(self, doc_type: Union[str, None]) -> Tuple[str, ...]:
+        """Fields that must be found before a document of `doc_type` can stop early"""
+        if self.required_fields is not None:
+            return self.required_fields
+        return chunk_fields(doc_type)
+
+class IncrementalMerger:
+    """
+    Merge chunk results one at a time as they complete.
+    
+    Fields are merged with the same field-wise max as merge_results. Each
+    field also keeps the best confidence it was extracted with, taken from
+    the chunk's 'confidence' (Addy results count as 1.0), so the merger can
+    tell when the policy is satisfied. The document type is taken from the
+    first result that carries a 'documentType'.
+    """
+    
+    def __init__(self, policy: MergePolicy = None):
+        self.policy = policy if policy is not None else MergePolicy()
+        self.data = merge_results([])
+        self.confidence = {field: 0.0 for field in self.data}
+        self.doc_type = None
+    
+    def add(self, result: Dict) -> bool:
+        """Merge one chunk result and return whether the policy is now satisfied"""
+        confidence = float(result.get('confidence', 1.0))
+        if self.doc_type is None:
+            self.doc_type = result.get('documentType')
+        for field in self.confidence:
+            if float(result.get(field, 0)) > 0:
+                self.confidence[field] = max(self.confidence[field], confidence)
+        self.data = merge_results([self.data, result])
+        return self.complete
+    
+    @property
+    def complete(self) -> bool:
+        """True once every required field is populated with enough confidence"""
+        required_fields = self.policy.fields_for(self.doc_type)
+        return bool(required_fields) and all(
+            self.data.get(field, 0) > 0 and self.confidence.get(field, 0.0) >= self.policy.min_confidence
+            for field in required_fields
+        )
+
+def process_chunks(chunks: Iterable[Union[str, DocumentBuffer]], addy_api_key: str,
+                   max_workers: int = DEFAULT_MAX_WORKERS,
+                   on_result: Callable[[int, Dict], None] = None,
+                   merger: IncrementalMerger = None,
+                   classifier: Callable[[], str] = None,
+                   on_event: Callable[[str, Dict], None] = None,
+                   budget: MemoryBudget = None,
+                   cancel: threading.Event = None) -> Dict[str, Any]:
+    """
+    Extract PDF chunks concurrently and merge the results as they complete.
+    
+    Chunks are pulled from the iterable only when a worker is free, so a
+    lazy split_pdf generator never has more than `max_workers` chunks in memory.
+    Fewer are kept in flight while the Addy rate limiter has backed off.
+    Once the merger's policy is satisfied no further chunks are read, and
+    chunks that have not started are cancelled.
+    
+    With a `classifier`, the document is classified once on its own worker
+    when the first chunk needs the remote extractor, and every chunk is
+    extracted with that type. Chunks are written and encoded while
+    classification runs and only wait for it right before their extract
+    call.
+    
+    Args:
+        chunks: Chunk buffers (or paths), typically from split_pdf
+        addy_api_key: Addy AI API key
+        max_workers: Maximum number of chunks extracted at the same time
+        on_result: Called with the chunk's position and its result as each
+            chunk is extracted successfully
+        merger: Merger to add results to, e.g. pre-seeded with cached
+            results; defaults to one with the environment's MergePolicy
+        classifier: Returns the document type, e.g. classify_sample; by
+            default each chunk is classified separately
+        on_event: Progress callback, called with 'chunk' (the chunk's
+            fields and the merged result so far) or 'chunk_failed'
+        budget: Memory budget for bounded-memory mode. In-flight chunks are
+            counted against it, no new chunk is pulled while it is used up,
+            and chunks that don't fit are spilled to disk.
+        cancel: Once set, no further chunks are started and the run raises
+            ProcessingCancelled without waiting for requests in flight
+        
+    Returns:
+        Dict with the merged data and per-chunk statistics
+    """
+    merger = merger if merger is not None else IncrementalMerger()
+    errors = []
+    slimming = {}
+    degraded = 0
+    chunk_iter = iter(chunks)
+    total = 0
+    pending = {}
+    held = {}
+    # One extra worker lets classification overlap the first chunks
+    executor = ThreadPoolExecutor(max_workers=max(1, max_workers) + (1 if classifier else 0))
+    classification = DeferredClassification(executor, classifier) if classifier else None
+    limiter = get_rate_limiter()
+    
+    def fill() -> None:
+        """Keep as many chunks in flight as the rate limiter currently allows"""
+        nonlocal total
+        while not merger.complete and len(pending) < max(1, min(max_workers, limiter.limit)):
+            if cancel is not None and cancel.is_set():
+                return
+            # Slide the window only as far as the memory budget allows
+            if budget and pending and budget.exhausted:
+                return
+            chunk = next(chunk_iter, None)
+            if chunk is None:
+                return
+            if budget and isinstance(chunk, DocumentBuffer):
+                chunk = spill_document(chunk, budget)
+            future = executor.submit(process_chunk, chunk, addy_api_key, classification, budget)
+            pending[future] = total
+            if budget and isinstance(chunk, DocumentBuffer):
+                held[future] = chunk
+            total += 1
+    
+    try:
+        fill()
+        
+        while pending and not merger.complete:
+            check_cancelled(cancel)
+            done, _ = wait(pending, timeout=CANCEL_POLL_SECONDS if cancel else None, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = pending.pop(future)
+                if future in held:
+                    release_document(held.pop(future), budget)
+                try:
+                    chunk_result = future.result()
+                    merger.add(chunk_result)
+                    add_slimming(slimming, chunk_result)
+                    degraded += is_degraded(chunk_result)
+                    logger.info(f"Chunk {index + 1} extracted")
+                    if on_result:
+                        on_result(index, chunk_result)
+                    if on_event:
+                        on_event('chunk', {'index': index, 'fields': chunk_result, 'merged': merger.data})
+                except Exception as e:
+                    logger.error(f"Chunk {index + 1} failed: {str(e)}")
+                    errors.append(e)
+                    if on_event:
+                        on_event('chunk_failed', {'index': index, 'error': str(e)})
+            fill()
+    finally:
+        # A classify call already sent is waited for rather than left running
+        if classification is not None:
+            classification.close()
+        # Requests already in flight finish in the background; their results are dropped
+        executor.shutdown(wait=False, cancel_futures=True)
+        for chunk in held.values():
+            release_document(chunk, budget)
+        # Release the source PDF if we stopped before the last chunk
+        if hasattr(chunk_iter, 'close'):
+            chunk_iter.close()
+    
+    check_cancelled(cancel)
+    if pending:
+        logger.info(f"Required fields found, cancelled {len(pending)} outstanding chunks")
+    
+    # Only fail the document if no chunk could be extracted
+    if errors and len(errors) == total:
+        raise errors[0]
+    
+    stats = {
+        'total': total,
+        'failed': len(errors),
+        'cancelled': len(pending)
+    }
+    if degraded:
+        stats['degraded'] = degraded
+    if slimming:
+        stats['slimming'] = slimming
+    
+    return {
+        'data': merger.data,
+        'chunks': stats
+    }
+
+def _find_cached_range(page_hashes: List[str], start: int, cache: ExtractionCache):
+    """Return (length, result) for a cached page range beginning at `start`, if any"""
+    index = cache.get(ExtractionCache.make_key(page_hashes[start], pipeline='page_index'))
+    if not index:
+        return None
+    
+    # Prefer the longest previously extracted range that still matches
+    for range_hashes in sorted(index['ranges'], key=len, reverse=True):
+        if page_hashes[start:start + len(range_hashes)] != range_hashes:
+            continue
+        result = cache.get(_page_range_key(range_hashes))
+        if result is not None:
+            return len(range_hashes), result
+    return None
+
+def _document_key(content_hash: str, chunked: Union[bool, None], chunk_size: int,
+                  merge_policy: Union[MergePolicy, None]) -> str:
+    """Cache key for a whole document's result under the settings that shaped it"""
+    policy = merge_policy if merge_policy is not None else MergePolicy()
+    return ExtractionCache.make_key(content_hash, pipeline='document_processor', chunked=chunked,
+                                    chunk_size=chunk_size, required_fields=policy.required_fields,
+                                    min_confidence=policy.min_confidence)
+
+def _page_range_key(range_hashes: List[str]) -> str:
+    """Cache key for the extraction result of a run of pages"""
+    return ExtractionCache.make_key(hashlib.sha256(''.join(range_hashes).encode()).hexdigest(), pipeline='page_range')
+
+def _store_page_range(cache: ExtractionCache, range_hashes: List[str], result: Dict) -> None:
+    """Cache a page range result and index it under its first page"""
+    cache.set(_page_range_key(range_hashes), result)
+    
+    index_key = ExtractionCache.make_key(range_hashes[0], pipeline='page_index')
+    index = cache.get(index_key) or {'ranges': []}
+    if range_hashes not in index['ranges']:
+        index['ranges'] = (index['ranges'] + [range_hashes])[-MAX_RANGES_PER_PAGE:]
+        cache.set(index_key, index)
+
+def process_pages_incremental(pdf_file_path: str, addy_api_key: str, cache: ExtractionCache,
+                              chunk_size: int = DEFAULT_CHUNK_SIZE,
+                              max_workers: int = DEFAULT_MAX_WORKERS,
+                              policy: MergePolicy = None,
+                              classifier: Callable[[], str] = None,
+                              on_event: Callable[[str, Dict], None] = None,
+                              budget: MemoryBudget = None, target_chunks: int = 1,
+                              cancel: threading.Event = None) -> Dict[str, Any]:
+    """
+    Extract only the pages that have not been extracted before.
+    
+    Every page is hashed by its content streams and resources. Runs of pages
+    that match a previously extracted page range reuse its cached result;
+    the remaining pages are chunked by weight with plan_chunks and sent to
+    Addy, and their results are cached per page range for the next upload.
+    
+    Returns:
+        Dict with the merged data, per-chunk statistics and page reuse counts
+    """
+    with open(pdf_file_path, 'rb') as file:
+        pdf_reader = PyPDF2.PdfReader(file)
+        hashes = page_hashes(pdf_reader)
+        weights = page_weights(pdf_reader)
+        boundaries = outline_starts(pdf_reader)
+    
+    reused = []
+    missing_ranges = []
+    run_start = None
+    page = 0
+    while page < len(hashes):
+        match = _find_cached_range(hashes, page, cache)
+        if match:
+            length, result = match
+            reused.append(result)
+            if run_start is not None:
+                missing_ranges.append((run_start, page))
+                run_start = None
+            page += length
+        else:
+            if run_start is None:
+                run_start = page
+            page += 1
+    if run_start is not None:
+        missing_ranges.append((run_start, len(hashes)))
+    
+    # Split runs of changed pages into balanced chunks of at most chunk_size pages
+    chunk_ranges = plan_chunks(weights, chunk_size, target_chunks, boundaries=boundaries, runs=missing_ranges)
+    
+    def store_result(index: int, result: Dict) -> None:
+        # Pages extracted while Addy was unavailable are extracted again next time
+        if is_degraded(result):
+            return
+        start, end = chunk_ranges[index]
+        _store_page_range(cache, hashes[start:end], result)
+    
+    # Cached results count towards the early-exit policy
+    merger = IncrementalMerger(policy)
+    for result in reused:
+        merger.add(result)
+    
+    chunk_result = process_chunks(
+        iter_page_ranges(pdf_file_path, chunk_ranges),
+        addy_api_key,
+        max_workers,
+        on_result=store_result,
+        merger=merger,
+        classifier=classifier,
+        on_event=on_event,
+        budget=budget,
+        cancel=cancel
+    )
+    
+    extracted_pages = sum(end - start for start, end in chunk_ranges)
+    logger.info(f"Reused cached results for {len(hashes) - extracted_pages}/{len(hashes)} pages")
+    
+    return {
+        'data': chunk_result['data'],
+        'chunks': chunk_result['chunks'],
+        'pages': {
+            'total': len(hashes),
+            'reused': len(hashes) - extracted_pages,
+            'extracted': extracted_pages
+        }
+    }
+
+def build_document_payload(file_data: str) -> Dict[str, Any]:
+    """Build a single-shot extraction request for a whole document"""
+    return {
+        "fileData": file_data,
+        "contentType": "application/pdf",
+        "documentType": "w2",  # Default to W2
+        "modelDetail": "high"
+    }
+
+def map_document_fields(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Map a single-shot extract response to our required fields"""
+    # Check if extraction was successful
+    if not result.get('success'):
+        raise ValueError(f"API returned error: {result.get('errorMessage', 'Unknown error')}")
+    
+    # Extract and format the data
+    document_data = result.get('document', {})
+    return {
+        'income': float(document_data.get('wages', 0)),
+        'credit_score': int(document_data.get('credit_score', 0)),
+        'debt': float(document_data.get('debt', 0)),
+        'property_value': float(document_data.get('property_value', 0))
+    }
+
+def extract_document(document: Union[str, DocumentBuffer], addy_api_key: str,
+                     budget: MemoryBudget = None) -> Dict[str, Any]:
+    """Extract a whole PDF in a single Addy AI request"""
+    document = as_document_buffer(document)
+    file_data = document.data if budget is None else FILE_DATA_PLACEHOLDER
+    
+    # Make API request
+    with payload_body(build_document_payload(file_data), document, budget) as body:
+        response = get_addy_client(addy_api_key).extract(body)
+    
+    # Check response
+    response.raise_for_status()
+    return map_document_fields(response.json())
+
+def route_document(document: DocumentBuffer, chunked: bool = None, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict[str, Any]:
+    """
+    Preflight a document and settle its route.
+
+    An explicit `chunked` choice from the caller overrides the chunked or
+    single-shot decision, but not a rejection.
+    
+    Raises:
+        PreflightError: If the document should not be sent to Addy
+    """
+    report = preflight(document, chunk_size)
+    if report['route'] == ROUTE_REJECT:
+        raise PreflightError(report)
+    
+    if chunked is not None and (report['route'] == ROUTE_CHUNKED) != chunked:
+        report['route'] = ROUTE_CHUNKED if chunked else ROUTE_SINGLE
+        report['reason'] = 'requested by caller'
+    return report
+
+def process_document(pdf_file_path: str, chunked: bool = None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                     max_workers: int = DEFAULT_MAX_WORKERS, merge_policy: MergePolicy = None,
+                     on_event: Callable[[str, Dict], None] = None, memory_budget: int = None,
+                     cancel: threading.Event = None) -> Dict[str, Any]:
     """
     Process a PDF document through Addy AI's Document Extraction API.
     
+    A local preflight first rejects files Addy cannot handle and routes the
+    rest; the decision is returned under 'preflight'. Large PDFs are split
+    into chunks of similar byte weight, one per request that can run at
+    once, and extracted concurrently, so the total time is bounded by the
+    slowest chunk. With PDF_SLIMMING
+    enabled, whatever is uploaded is slimmed first and the before/after byte
+    counts are returned under 'slimming' (per chunk totals under 'chunks').
+    
     Args:
         pdf_file_path: Path to the PDF file
+        chunked: Force (True) or disable (False) chunked mode. By default
+            the preflight route decides.
+        chunk_size: Maximum number of pages per chunk
+        max_workers: Maximum number of chunks extracted concurrently
+        merge_policy: When chunked extraction may stop early; defaults to
+            the EARLY_EXIT_* environment settings
+        on_event: Progress callback for streaming clients, called with
+            ('preflight', report), ('classified', {'documentType'}) and,
+            for chunked documents, per-chunk events from process_chunks
+        memory_budget: Per-request memory budget in bytes for chunk buffers
+            and request bodies; defaults to MEMORY_BUDGET_BYTES, and 0
+            disables bounded-memory mode. Peak usage is returned under
+            'memory'.
+        cancel: Event the caller sets to stop processing, e.g. when a
+            streaming client disconnects; no further Addy calls are started
+            and the error type is ProcessingCancelled
     
     Returns:
         Dict containing the extracted data or error information
@@ -215,55 +895,95 @@ def process_document(pdf_file_path: str) -> Dict[str, Any]:
         if not os.path.exists(pdf_file_path):
             raise FileNotFoundError(f"PDF file not found: {pdf_file_path}")
         
-        # Read the PDF file
-        with open(pdf_file_path, 'rb') as file:
-            file_content = file.read()
-            file_data = base64.b64encode(file_content).decode('utf-8')
+        # Read the file once; it is only encoded if sent in a single request
+        document = DocumentBuffer(pdf_file_path)
         
-        # Prepare request headers
-        headers = {
-            'api-key': addy_api_key,
-            'Content-Type': 'application/json',
-            'Accept': 'application/json'
-        }
+        # Return cached results for documents we have already processed
+        cache = get_extraction_cache()
+        cache_key = None
+        if cache:
+            cache_key = _document_key(document.sha256, chunked, chunk_size, merge_policy)
+            cached = cache.get(cache_key)
+            if cached:
+                logger.info(f"Extraction cache hit for {pdf_file_path}")
+                document.release()
+                return {**cached, 'cached': True}
         
-        # Prepare request payload
-        payload = {
-            "fileData": file_data,
-            "contentType": "application/pdf",
-            "documentType": "w2",  # Default to W2
-            "modelDetail": "high"
-        }
+        # Check the file locally before anything is sent to Addy
+        report = route_document(document, chunked, chunk_size)
+        if on_event:
+            on_event('preflight', report)
         
-        # Make API request
-        response = requests.post(
-            'https://addy-ai-external-api-dev.firebaseapp.com/document/extract',
-            headers=headers,
-            json=payload,
-            timeout=300
-        )
+        if memory_budget is None:
+            memory_budget = MEMORY_BUDGET_BYTES
+        budget = MemoryBudget(memory_budget) if memory_budget else None
         
-        # Check response
-        response.raise_for_status()
-        result = response.json()
-        
-        # Check if extraction was successful
-        if not result.get('success'):
-            raise ValueError(f"API returned error: {result.get('errorMessage', 'Unknown error')}")
-        
-        # Extract and format the data
-        document_data = result.get('document', {})
-        extracted_data = {
-            'income': float(document_data.get('wages', 0)),
-            'credit_score': int(document_data.get('credit_score', 0)),
-            'debt': float(document_data.get('debt', 0)),
-            'property_value': float(document_data.get('property_value', 0))
-        }
+        if report['route'] == ROUTE_CHUNKED:
+            document.release()
+            
+            def classifier() -> str:
+                """Classify once from the first pages rather than once per chunk"""
+                doc_type = classify_sample(pdf_file_path, addy_api_key, budget=budget)
+                if on_event:
+                    on_event('classified', {'documentType': doc_type})
+                return doc_type
+            
+            # One balanced chunk per request that can run at once. The configured
+            # ceiling is used rather than the current AIMD limit so a document is
+            # cut the same way on every upload and unchanged pages can be reused.
+            target_chunks = max(1, min(max_workers, get_rate_limiter().max_limit))
+            if cache:
+                # Only send pages that changed since a previous upload
+                chunk_result = process_pages_incremental(pdf_file_path, addy_api_key, cache, chunk_size, max_workers,
+                                                         merge_policy, classifier, on_event, budget, target_chunks,
+                                                         cancel)
+            else:
+                chunk_result = process_chunks(split_pdf(pdf_file_path, chunk_size, target_chunks), addy_api_key,
+                                              max_workers, merger=IncrementalMerger(merge_policy),
+                                              classifier=classifier, on_event=on_event, budget=budget,
+                                              cancel=cancel)
+            
+            result = {
+                'success': True,
+                'data': chunk_result['data'],
+                'chunks': chunk_result['chunks']
+            }
+            if 'pages' in chunk_result:
+                result['pages'] = chunk_result['pages']
+        else:
+            with document:
+                local = extract_local_fields(document) if report['route'] == ROUTE_LOCAL else None
+                if report['route'] == ROUTE_LOCAL and not local:
+                    report['fallback'] = ROUTE_SINGLE
+                if local:
+                    result = {
+                        'success': True,
+                        'data': local['data'],
+                        'extraction': {
+                            'source': 'local',
+                            'documentType': local['documentType'],
+                            'confidence': local['confidence']
+                        }
+                    }
+                else:
+                    upload, slimming = slim_for_upload(document)
+                    check_cancelled(cancel)
+                    result = {
+                        'success': True,
+                        'data': extract_document(upload, addy_api_key, budget)
+                    }
+                    if slimming:
+                        result['slimming'] = slimming
+        result['preflight'] = report
         
-        return {
-            'success': True,
-            'data': extracted_data
-        }
+        # Only fully extracted documents are cached, not fallbacks from a degraded upstream
+        chunks = result.get('chunks', {})
+        if cache and not chunks.get('failed') and not chunks.get('degraded'):
+            cache.set(cache_key, result)
+        
+        if budget:
+            result['memory'] = budget.report()
+        return result
         
     except FileNotFoundError as e:
         logger.error(f"Error processing document: {str(e)}")
@@ -272,6 +992,14 @@ def process_document(pdf_file_path: str) -> Dict[str, Any]:
             'error': str(e),
             'error_type': 'FileNotFoundError'
         }
+    except PreflightError as e:
+        logger.error(f"Error processing document: {str(e)}")
+        return {
+            'success': False,
+            'error': str(e),
+            'error_type': 'PreflightError',
+            'preflight': e.report
+        }
     except ValueError as e:
         logger.error(f"Error processing document: {str(e)}")
         return {
@@ -292,4 +1020,312 @@ def process_document(pdf_file_path: str) -> Dict[str, Any]:
             'success': False,
             'error': str(e),
             'error_type': type(e).__name__
-        } 
\ No newline at end of file
+        } 
+
+async def classify_document_async(file_data: str, client: AsyncAddyClient) -> str:
+    """Classify the document using the async Addy AI client"""
+    response = await client.classify(build_classify_payload(file_data))
+    
+    response.raise_for_status()
+    return parse_classification(response.json())
+
+async def classify_sample_async(pdf_path: str, client: AsyncAddyClient,
+                                sample_pages: int = CLASSIFY_SAMPLE_PAGES) -> str:
+    """Async variant of classify_sample"""
+    try:
+        sample = await asyncio.to_thread(sample_document, pdf_path, sample_pages)
+        doc_type = await classify_document_async(await asyncio.to_thread(lambda: sample.data), client)
+        logger.info(f"Document classified as: {doc_type}")
+        return doc_type
+    except Exception as e:
+        logger.warning(f"Classification failed, using default type: {str(e)}")
+        return "w2"  # Default to W2 as it's a supported type
+
+async def process_chunk_async(chunk: Union[str, DocumentBuffer], client: AsyncAddyClient,
+                              doc_type: Union[str, asyncio.Future, Callable[[], asyncio.Future], None] = None) -> Dict:
+    """
+    Process a single PDF chunk without blocking a thread on the API calls
+    
+    `doc_type` may also be a callable that starts the shared classification
+    and returns its future; it is only called once the chunk needs Addy.
+    """
+    with as_document_buffer(chunk) as document:
+        # Digital W-2s and paystubs don't need a remote call
+        local = await asyncio.to_thread(extract_local_fields, document)
+        if local:
+            return {**local['data'], 'confidence': local['confidence'], 'documentType': local['documentType']}
+        
+        if client.breaker.is_open:
+            return await asyncio.to_thread(degraded_local_fields, document)
+        
+        # This chunk needs Addy, so classify the document while it is encoded
+        if callable(doc_type):
+            doc_type = doc_type()
+        
+        # Slim and encode off the event loop so large chunks don't stall other requests
+        upload, slimming = await asyncio.to_thread(slim_for_upload, document)
+        file_data = await asyncio.to_thread(lambda: upload.data)
+        
+        # Wait for the document's classification only once the chunk is ready to send
+        if isinstance(doc_type, asyncio.Future):
+            # Shielded so a cancelled chunk doesn't cancel the shared classification
+            doc_type = await asyncio.shield(doc_type)
+        elif doc_type is None:
+            try:
+                doc_type = await classify_document_async(file_data, client)
+                logger.info(f"Document classified as: {doc_type}")
+            except Exception as e:
+                logger.warning(f"Classification failed, using default type: {str(e)}")
+                doc_type = "w2"  # Default to W2 as it's a supported type
+        
+        # Make API request
+        try:
+            response = await client.extract(build_chunk_payload(doc_type, file_data))
+        except CircuitOpenError:
+            return await asyncio.to_thread(degraded_local_fields, document)
+        
+        try:
+            response.raise_for_status()
+            result = map_chunk_fields(doc_type, response.json())
+            result['documentType'] = doc_type
+            if slimming:
+                result['slimming'] = slimming
+            return result
+            
+        except httpx.HTTPStatusError as e:
+            raise_api_error(response.status_code, response.text)
+        except ValueError as e:
+            raise ValueError(f"Failed to parse API response: {str(e)}")
+
+async def process_chunks_async(chunks: Iterable[Union[str, DocumentBuffer]], client: AsyncAddyClient,
+                               max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                               merger: IncrementalMerger = None,
+                               classifier: Callable[[], Awaitable[str]] = None,
+                               on_event: Callable[[str, Dict], None] = None) -> Dict[str, Any]:
+    """
+    Extract PDF chunks on the event loop and merge the results as they complete.
+    
+    Like process_chunks, chunks are pulled lazily so at most
+    `max_concurrency` (or the rate limiter's current limit, if lower) of them
+    are materialized at once, and outstanding
+    requests are cancelled once the merger's policy is satisfied. A
+    `classifier` is run once as its own task when the first chunk needs
+    Addy, as in process_chunks.
+    
+    Args:
+        chunks: Chunk buffers (or paths), typically from split_pdf
+        client: Async Addy AI client shared by every chunk
+        max_concurrency: Maximum number of chunks extracted at the same time
+        merger: Merger to add results to; defaults to one with the
+            environment's MergePolicy
+        classifier: Coroutine function returning the document type, e.g.
+            classify_sample_async; by default each chunk is classified
+        on_event: Progress callback, as in process_chunks
+        
+    Returns:
+        Dict with the merged data and per-chunk statistics
+    """
+    merger = merger if merger is not None else IncrementalMerger()
+    errors = []
+    slimming = {}
+    degraded = 0
+    chunk_iter = iter(chunks)
+    pending = {}
+    total = 0
+    classification = None
+    
+    limiter = get_rate_limiter()
+    
+    def classify() -> asyncio.Task:
+        """Start the shared classification on first use"""
+        nonlocal classification
+        if classification is None:
+            classification = asyncio.create_task(classifier())
+        return classification
+    
+    async def fill() -> None:
+        """Keep as many chunks in flight as the rate limiter currently allows"""
+        nonlocal total
+        while not merger.complete and len(pending) < max(1, min(max_concurrency, limiter.limit)):
+            # Writing the next chunk is blocking PDF work, so keep it off the loop
+            chunk = await asyncio.to_thread(next, chunk_iter, None)
+            if chunk is None:
+                return
+            task = asyncio.create_task(process_chunk_async(chunk, client, classify if classifier else None))
+            pending[task] = total
+            total += 1
+    
+    try:
+        await fill()
+        
+        while pending and not merger.complete:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                index = pending.pop(task)
+                try:
+                    chunk_result = task.result()
+                    merger.add(chunk_result)
+                    add_slimming(slimming, chunk_result)
+                    degraded += is_degraded(chunk_result)
+                    if on_event:
+                        on_event('chunk', {'index': index, 'fields': chunk_result, 'merged': merger.data})
+                except Exception as e:
+                    logger.error(f"Chunk {index + 1} failed: {str(e)}")
+                    errors.append(e)
+                    if on_event:
+                        on_event('chunk_failed', {'index': index, 'error': str(e)})
+            await fill()
+    finally:
+        for task in pending:
+            task.cancel()
+        if classification is not None:
+            classification.cancel()
+        if hasattr(chunk_iter, 'close'):
+            chunk_iter.close()
+    
+    if pending:
+        logger.info(f"Required fields found, cancelled {len(pending)} outstanding chunks")
+    
+    # Only fail the document if no chunk could be extracted
+    if errors and len(errors) == total:
+        raise errors[0]
+    
+    stats = {
+        'total': total,
+        'failed': len(errors),
+        'cancelled': len(pending)
+    }
+    if degraded:
+        stats['degraded'] = degraded
+    if slimming:
+        stats['slimming'] = slimming
+    
+    return {
+        'data': merger.data,
+        'chunks': stats
+    }
+
+async def process_document_async(pdf_file_path: str, chunked: bool = None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                                 max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                                 client: AsyncAddyClient = None, merge_policy: MergePolicy = None,
+                                 on_event: Callable[[str, Dict], None] = None) -> Dict[str, Any]:
+    """
+    Async variant of process_document.
+    
+    Chunks are extracted as coroutines bounded by `max_concurrency` instead
+    of on a thread pool, so one process can keep many extractions in flight.
+    Pass a shared AsyncAddyClient to bound requests across documents.
+    
+    Returns:
+        Dict containing the extracted data or error information
+    """
+    try:
+        # Get environment variables
+        addy_api_key = os.getenv('ADDY_API_KEY')
+        
+        # Validate environment variables
+        if not addy_api_key:
+            raise ValueError("Missing required environment variable: ADDY_API_KEY")
+        
+        if client is None:
+            async with AsyncAddyClient(addy_api_key) as client:
+                return await process_document_async(pdf_file_path, chunked, chunk_size, max_concurrency, client,
+                                                    merge_policy, on_event)
+        
+        # Verify PDF file exists
+        if not os.path.exists(pdf_file_path):
+            raise FileNotFoundError(f"PDF file not found: {pdf_file_path}")
+        
+        document = DocumentBuffer(pdf_file_path)
+        
+        # Return cached results for documents we have already processed
+        cache = get_extraction_cache()
+        cache_key = None
+        if cache:
+            content_hash = await asyncio.to_thread(lambda: document.sha256)
+            cache_key = _document_key(content_hash, chunked, chunk_size, merge_policy)
+            cached = cache.get(cache_key)
+            if cached:
+                logger.info(f"Extraction cache hit for {pdf_file_path}")
+                document.release()
+                return {**cached, 'cached': True}
+        
+        # Check the file locally before anything is sent to Addy
+        report = await asyncio.to_thread(route_document, document, chunked, chunk_size)
+        if on_event:
+            on_event('preflight', report)
+        
+        if report['route'] == ROUTE_CHUNKED:
+            document.release()
+            
+            async def classifier() -> str:
+                doc_type = await classify_sample_async(pdf_file_path, client)
+                if on_event:
+                    on_event('classified', {'documentType': doc_type})
+                return doc_type
+            
+            target_chunks = max(1, min(max_concurrency, get_rate_limiter().max_limit))
+            chunk_result = await process_chunks_async(
+                split_pdf(pdf_file_path, chunk_size, target_chunks), client, max_concurrency,
+                merger=IncrementalMerger(merge_policy),
+                classifier=classifier,
+                on_event=on_event
+            )
+            
+            result = {
+                'success': True,
+                'data': chunk_result['data'],
+                'chunks': chunk_result['chunks']
+            }
+        else:
+            with document:
+                local = None
+                if report['route'] == ROUTE_LOCAL:
+                    local = await asyncio.to_thread(extract_local_fields, document)
+                    if not local:
+                        report['fallback'] = ROUTE_SINGLE
+                if local:
+                    result = {
+                        'success': True,
+                        'data': local['data'],
+                        'extraction': {
+                            'source': 'local',
+                            'documentType': local['documentType'],
+                            'confidence': local['confidence']
+                        }
+                    }
+                else:
+                    upload, slimming = await asyncio.to_thread(slim_for_upload, document)
+                    file_data = await asyncio.to_thread(lambda: upload.data)
+                    response = await client.extract(build_document_payload(file_data))
+                    response.raise_for_status()
+                    result = {
+                        'success': True,
+                        'data': map_document_fields(response.json())
+                    }
+                    if slimming:
+                        result['slimming'] = slimming
+        result['preflight'] = report
+        
+        # Only fully extracted documents are cached, not fallbacks from a degraded upstream
+        chunks = result.get('chunks', {})
+        if cache and not chunks.get('failed') and not chunks.get('degraded'):
+            cache.set(cache_key, result)
+        
+        return result
+        
+    except PreflightError as e:
+        logger.error(f"Error processing document: {str(e)}")
+        return {
+            'success': False,
+            'error': str(e),
+            'error_type': 'PreflightError',
+            'preflight': e.report
+        }
+    except Exception as e:
+        logger.error(f"Error processing document: {str(e)}")
+        return {
+            'success': False,
+            'error': str(e),
+            'error_type': type(e).__name__
+        }
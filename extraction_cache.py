@@ -0,0 +1,194 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Dict, Any, Optional
+from dotenv import load_dotenv
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+# Cache defaults
+DEFAULT_MAX_ENTRIES = 1000
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024  # 256MB
+DEFAULT_TTL_SECONDS = 7 * 24 * 60 * 60  # 7 days
+
+def hash_file(file_path: str, block_size: int = 1024 * 1024) -> str:
+    """Compute the SHA-256 of a file without loading it into memory at once"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+class ExtractionCache:
+    """
+    Disk-backed LRU cache for Addy classify/extract results.
+
+    Entries are keyed by the SHA-256 of the document bytes combined with the
+    request parameters, and stored in a SQLite database so they survive
+    restarts and are shared between processes on the same host. Access is
+    best-effort: a locked or full database is logged and treated as a miss
+    or a skipped write, so it never fails the extraction using the cache.
+    """
+
+    def __init__(self, cache_dir: str, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 max_bytes: int = DEFAULT_MAX_BYTES, ttl_seconds: float = DEFAULT_TTL_SECONDS):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.db_path = os.path.join(cache_dir, 'extraction_cache.db')
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS entries ('
+            'key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, '
+            'created_at REAL NOT NULL, accessed_at REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at)')
+        self._conn.commit()
+
+        self.counters = {
+            'hits': 0,
+            'misses': 0,
+            'expired': 0,
+            'evictions': 0
+        }
+
+    @staticmethod
+    def make_key(content_hash: str, **params) -> str:
+        """Build a cache key from a document hash and the request parameters"""
+        key_data = json.dumps({'content': content_hash, 'params': params}, sort_keys=True, default=str)
+        return hashlib.sha256(key_data.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the cached value for a key, or None on a miss or if the cache can't be read"""
+        now = time.time()
+        with self._lock:
+            try:
+                row = self._conn.execute(
+                    'SELECT value, created_at FROM entries WHERE key = ?', (key,)
+                ).fetchone()
+
+                if row is None:
+                    self.counters['misses'] += 1
+                    return None
+
+                value, created_at = row
+                if self.ttl_seconds and now - created_at > self.ttl_seconds:
+                    self._conn.execute('DELETE FROM entries WHERE key = ?', (key,))
+                    self._conn.commit()
+                    self.counters['expired'] += 1
+                    self.counters['misses'] += 1
+                    return None
+
+                self._conn.execute('UPDATE entries SET accessed_at = ? WHERE key = ?', (now, key))
+                self._conn.commit()
+                self.counters['hits'] += 1
+            except sqlite3.Error as e:
+                self._conn.rollback()
+                self.counters['misses'] += 1
+                logger.error(f"Error reading extraction cache: {str(e)}")
+                return None
+
+        return json.loads(value)
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        """Store a value and evict least recently used entries over the limits"""
+        serialized = json.dumps(value, default=str)
+        size = len(serialized.encode())
+        if size > self.max_bytes:
+            logger.warning(f"Not caching entry of {size} bytes (limit {self.max_bytes})")
+            return
+
+        now = time.time()
+        with self._lock:
+            try:
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO entries (key, value, size, created_at, accessed_at) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    (key, serialized, size, now, now)
+                )
+                self._evict()
+                self._conn.commit()
+            except sqlite3.Error as e:
+                self._conn.rollback()
+                logger.error(f"Error writing extraction cache: {str(e)}")
+
+    def _evict(self) -> None:
+        """Drop least recently used entries until the cache is within its limits"""
+        count, total_bytes = self._conn.execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries'
+        ).fetchone()
+
+        if count <= self.max_entries and total_bytes <= self.max_bytes:
+            return
+
+        rows = self._conn.execute('SELECT key, size FROM entries ORDER BY accessed_at ASC').fetchall()
+        for key, size in rows:
+            if count <= self.max_entries and total_bytes <= self.max_bytes:
+                break
+            self._conn.execute('DELETE FROM entries WHERE key = ?', (key,))
+            count -= 1
+            total_bytes -= size
+            self.counters['evictions'] += 1
+
+    def clear(self) -> None:
+        """Remove every entry from the cache"""
+        with self._lock:
+            self._conn.execute('DELETE FROM entries')
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and current cache size"""
+        with self._lock:
+            count, total_bytes = self._conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries'
+            ).fetchone()
+            lookups = self.counters['hits'] + self.counters['misses']
+            return {
+                **self.counters,
+                'entries': count,
+                'bytes': total_bytes,
+                'hit_rate': round(self.counters['hits'] / lookups, 4) if lookups else 0.0
+            }
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+def get_extraction_cache() -> Optional[ExtractionCache]:
+    """
+    Return the process-wide extraction cache.
+
+    The cache is enabled by setting EXTRACTION_CACHE_DIR. Limits can be tuned
+    with EXTRACTION_CACHE_MAX_ENTRIES, EXTRACTION_CACHE_MAX_BYTES and
+    EXTRACTION_CACHE_TTL_SECONDS. Returns None while the cache can't be opened.
+    """
+    global _default_cache
+
+    cache_dir = os.getenv('EXTRACTION_CACHE_DIR')
+    if not cache_dir:
+        return None
+
+    with _default_cache_lock:
+        if _default_cache is None:
+            try:
+                _default_cache = ExtractionCache(
+                    cache_dir,
+                    max_entries=int(os.getenv('EXTRACTION_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES)),
+                    max_bytes=int(os.getenv('EXTRACTION_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES)),
+                    ttl_seconds=float(os.getenv('EXTRACTION_CACHE_TTL_SECONDS', DEFAULT_TTL_SECONDS))
+                )
+            except (OSError, sqlite3.Error) as e:
+                # Run uncached rather than fail; the next call tries again
+                logger.error(f"Error opening extraction cache: {str(e)}")
+        return _default_cache
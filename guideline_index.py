@@ -0,0 +1,234 @@
+import os
+import logging
+import threading
+from typing import Dict, Any, List, Iterable, Optional
+from dotenv import load_dotenv
+from query_analysis import LOAN_TYPES
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+# Seconds between polls of the guidelines table; 0 disables background refresh
+GUIDELINE_REFRESH_SECONDS = float(os.getenv('GUIDELINE_REFRESH_SECONDS', '60'))
+
+# Columns polled to notice added, changed and removed guidelines
+VERSION_COLUMNS = 'id, version_hash, last_updated'
+
+def json_guideline(section: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert a section of a JSON guidelines file to the guideline format"""
+    return {
+        'rule_name': section.get('title', 'Unnamed Rule'),
+        'rule_text': section.get('content', ''),
+        'source': section.get('source', 'JSON Guidelines'),
+        'category': section.get('category', 'general'),
+        'state': section.get('state'),
+        'version': section.get('version')
+    }
+
+def guideline_loan_type(guideline: Dict[str, Any]) -> Optional[str]:
+    """Loan type a guideline applies to, from a category like FHA_LTV or a rule name like FHA-LTV-2024"""
+    for name in (guideline.get('category'), guideline.get('rule_name')):
+        prefix = str(name or '').replace('-', '_').split('_')[0].lower()
+        if prefix in LOAN_TYPES:
+            return prefix
+    return None
+
+class GuidelineIndex:
+    """
+    In-memory inverted index over the guidelines table and JSON guidelines.
+
+    Supabase rows are posted by category, state, loan type and source so a
+    search is a few set lookups with no network I/O. A background thread
+    polls the table's `id`, `version_hash` and `last_updated` columns and
+    fetches only rows that were added or changed, dropping rows that were
+    removed. The rows and their postings are published together as one
+    snapshot, so a search never pairs one refresh's postings with another's
+    rows. The JSON guidelines are converted once, keyed by source and
+    section.
+    """
+
+    def __init__(self, supabase, json_guidelines: Dict[str, Dict] = None,
+                 refresh_seconds: float = GUIDELINE_REFRESH_SECONDS):
+        """
+        Args:
+            supabase: Supabase client to read the guidelines table with
+            json_guidelines: Source name -> parsed JSON guidelines file
+            refresh_seconds: Seconds between polls; 0 disables background refresh
+        """
+        self.supabase = supabase
+        self.refresh_seconds = refresh_seconds
+        self.ready = False
+
+        # (row ID -> row, postings), replaced as a whole by each refresh
+        self._snapshot = ({}, self._build_postings({}))
+        self._versions: Dict[Any, tuple] = {}
+        self._refresh_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._worker = None
+
+        # Source -> section key (e.g. 'ltv', 'fha') -> guidelines, plus state-specific sections
+        self._json_sections: Dict[str, Dict[str, List[Dict]]] = {}
+        self._json_states: Dict[str, Dict[str, List[Dict]]] = {}
+        for source, guidelines in (json_guidelines or {}).items():
+            if not guidelines:
+                continue
+            self._json_sections[source] = {
+                key: [json_guideline(section) for section in sections]
+                for key, sections in guidelines.items() if isinstance(sections, list)
+            }
+            self._json_states[source] = {
+                state: [json_guideline(section) for section in sections]
+                for state, sections in guidelines.get('state_specific', {}).items()
+            }
+
+    @property
+    def json_sources(self) -> List[str]:
+        """Sources of the indexed JSON guidelines, in the order they were given"""
+        return list(self._json_sections)
+
+    @staticmethod
+    def _build_postings(rows: Dict[Any, Dict[str, Any]]) -> Dict[str, Any]:
+        """Build posting lists of row IDs, in load order, for every indexed field of `rows`"""
+        postings = {
+            'position': {row_id: position for position, row_id in enumerate(rows)},
+            'category': {},
+            'state': {},
+            'loan_type': {},
+            'source': {}
+        }
+        for row_id, row in rows.items():
+            postings['category'].setdefault(row.get('category'), []).append(row_id)
+            postings['state'].setdefault(row.get('state'), []).append(row_id)
+            postings['loan_type'].setdefault(guideline_loan_type(row), []).append(row_id)
+            postings['source'].setdefault(row.get('source'), []).append(row_id)
+        return postings
+
+    def _fetch(self, columns: str, ids: List[Any] = None) -> List[Dict[str, Any]]:
+        """Read guideline rows from Supabase"""
+        query = self.supabase.table('guidelines').select(columns)
+        if ids is not None:
+            query = query.in_('id', ids)
+        data = getattr(query.execute(), 'data', None)
+        if not isinstance(data, list):
+            raise ValueError("Unexpected response reading the guidelines table")
+        return data
+
+    def refresh(self) -> Dict[str, int]:
+        """
+        Bring the index up to date with the guidelines table.
+
+        The first refresh loads every row; later ones only fetch rows whose
+        version changed. Searches keep reading the previous snapshot until
+        the new one is swapped in.
+
+        Returns:
+            Counts of added, updated and removed rows
+        """
+        stats = {'added': 0, 'updated': 0, 'removed': 0}
+        with self._refresh_lock:
+            try:
+                current = self._snapshot[0]
+                if self.ready:
+                    versions = {row['id']: (row.get('version_hash'), row.get('last_updated'))
+                                for row in self._fetch(VERSION_COLUMNS)}
+                    changed = [row_id for row_id, version in versions.items() if self._versions.get(row_id) != version]
+                    removed = [row_id for row_id in current if row_id not in versions]
+                    fetched = self._fetch('*', changed) if changed else []
+                else:
+                    fetched = self._fetch('*')
+                    removed = []
+
+                if not fetched and not removed and self.ready:
+                    return stats
+
+                rows = dict(current)
+                for row_id in removed:
+                    rows.pop(row_id, None)
+                    self._versions.pop(row_id, None)
+                    stats['removed'] += 1
+                for row in fetched:
+                    stats['updated' if row['id'] in rows else 'added'] += 1
+                    rows[row['id']] = row
+                    self._versions[row['id']] = (row.get('version_hash'), row.get('last_updated'))
+
+                self._snapshot = (rows, self._build_postings(rows))
+                self.ready = True
+                logger.info(f"Guideline index refreshed: {stats}, {len(rows)} guidelines")
+            except Exception as e:
+                logger.error(f"Error refreshing guideline index: {str(e)}")
+        return stats
+
+    def start(self) -> None:
+        """
+        Load the index and keep refreshing it, both in a background thread.
+
+        Returns immediately. Safe to call on every search: a thread is only
+        started if none is running and there is still something to do, so a
+        failed first load is retried on the next call.
+        """
+        with self._start_lock:
+            if self._worker is not None and self._worker.is_alive():
+                return
+            if self.ready and self.refresh_seconds <= 0:
+                return
+            # Each worker gets its own event so a stopped one can't be revived
+            self._stopped = threading.Event()
+            self._worker = threading.Thread(target=self._run, args=(self._stopped,), name='guideline-index',
+                                            daemon=True)
+            self._worker.start()
+
+    def stop(self) -> None:
+        """Stop background refreshes"""
+        with self._start_lock:
+            self._stopped.set()
+            self._worker = None
+
+    def _run(self, stopped: threading.Event) -> None:
+        if not self.ready:
+            self.refresh()
+        if self.refresh_seconds <= 0:
+            return
+        while not stopped.wait(self.refresh_seconds):
+            self.refresh()
+
+    def search(self, categories: Iterable[str] = None, state: str = None, loan_type: str = None,
+               source: str = None) -> List[Dict[str, Any]]:
+        """
+        Find guidelines without touching the network.
+
+        Matches the filters search_guidelines used to send to Supabase: any
+        of `categories`, and for a `state`, that state's guidelines plus the
+        general ones without a state. Omitted filters match everything.
+
+        Returns:
+            Copies of the matching rows, in load order
+        """
+        rows, postings = self._snapshot
+        categories = list(categories or [])
+
+        if categories:
+            matched = {row_id for category in categories for row_id in postings['category'].get(category, [])}
+        else:
+            matched = set(postings['position'])
+        if state:
+            matched &= set(postings['state'].get(state, [])) | set(postings['state'].get(None, []))
+        if loan_type:
+            matched &= set(postings['loan_type'].get(loan_type.lower(), []))
+        if source:
+            matched &= set(postings['source'].get(source, []))
+
+        return [dict(rows[row_id]) for row_id in sorted(matched, key=postings['position'].get)]
+
+    def json_guidelines(self, source: str, sections: Iterable[str], state: str = None) -> List[Dict[str, Any]]:
+        """Guidelines from the given sections of a JSON source, then its sections for `state`"""
+        matches = []
+        for key in sections:
+            matches.extend(dict(guideline) for guideline in self._json_sections.get(source, {}).get(key, []))
+        if state:
+            matches.extend(dict(guideline) for guideline in self._json_states.get(source, {}).get(state, []))
+        return matches
@@ -0,0 +1,214 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from typing import Dict, Any, List, Tuple, Callable, Optional
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# File states
+QUEUED = 'queued'
+PROCESSING = 'processing'
+COMPLETED = 'completed'
+FAILED = 'failed'
+
+class JobQueue:
+    """
+    Persistent document job queue backed by SQLite.
+
+    Uploaded files are written to `storage_dir` and recorded as queued rows,
+    then picked up by a bounded pool of worker threads. Files that were
+    being processed when the process stopped are re-queued on start.
+
+    `processors` maps a pipeline name to a callable taking the stored file
+    path and the job options and returning the pipeline's result dict.
+    """
+
+    def __init__(self, db_path: str, storage_dir: str, processors: Dict[str, Callable[..., Dict[str, Any]]],
+                 max_workers: int = 4):
+        os.makedirs(storage_dir, exist_ok=True)
+        self.storage_dir = storage_dir
+        self.processors = processors
+        self.max_workers = max(1, max_workers)
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._workers = []
+        self._stopping = False
+
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS jobs ('
+            'id TEXT PRIMARY KEY, owner TEXT, pipeline TEXT NOT NULL, options TEXT, created_at REAL NOT NULL)'
+        )
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS job_files ('
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, job_id TEXT NOT NULL, filename TEXT NOT NULL, '
+            'path TEXT NOT NULL, status TEXT NOT NULL, result TEXT, error TEXT, '
+            'started_at REAL, finished_at REAL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS job_files_status ON job_files (status, id)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS job_files_job_id ON job_files (job_id)')
+
+        # Recover files interrupted by a restart
+        self._conn.execute('UPDATE job_files SET status = ? WHERE status = ?', (QUEUED, PROCESSING))
+        self._conn.commit()
+
+    def storage_path(self, filename: str) -> str:
+        """Return a unique path in the job storage directory for an upload"""
+        extension = os.path.splitext(filename)[1].lower() or '.pdf'
+        return os.path.join(self.storage_dir, f"{uuid.uuid4().hex}{extension}")
+
+    def submit(self, files: List[Tuple[str, str]], pipeline: str = 'document',
+               options: Dict[str, Any] = None, owner: str = None) -> str:
+        """
+        Enqueue stored files for processing.
+
+        Args:
+            files: (original filename, stored path) pairs
+            pipeline: Name of the processor to run on each file
+            options: Keyword arguments passed to the processor
+            owner: User that submitted the job
+
+        Returns:
+            The new job ID
+        """
+        if pipeline not in self.processors:
+            raise ValueError(f"Unknown pipeline: {pipeline}")
+
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute(
+                'INSERT INTO jobs (id, owner, pipeline, options, created_at) VALUES (?, ?, ?, ?, ?)',
+                (job_id, owner, pipeline, json.dumps(options or {}), time.time())
+            )
+            self._conn.executemany(
+                'INSERT INTO job_files (job_id, filename, path, status) VALUES (?, ?, ?, ?)',
+                [(job_id, filename, path, QUEUED) for filename, path in files]
+            )
+            self._conn.commit()
+            self._wakeup.notify_all()
+
+        self.start()
+        return job_id
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Return a job with per-file status and results, or None if unknown"""
+        with self._lock:
+            job = self._conn.execute(
+                'SELECT id, owner, pipeline, created_at FROM jobs WHERE id = ?', (job_id,)
+            ).fetchone()
+            if job is None:
+                return None
+
+            rows = self._conn.execute(
+                'SELECT id, filename, status, result, error, started_at, finished_at '
+                'FROM job_files WHERE job_id = ? ORDER BY id', (job_id,)
+            ).fetchall()
+
+        files = [{
+            'file_id': file_id,
+            'filename': filename,
+            'status': status,
+            'result': json.loads(result) if result else None,
+            'error': error,
+            'started_at': started_at,
+            'finished_at': finished_at
+        } for file_id, filename, status, result, error, started_at, finished_at in rows]
+
+        counts = {state: sum(1 for f in files if f['status'] == state)
+                  for state in (QUEUED, PROCESSING, COMPLETED, FAILED)}
+
+        if counts[QUEUED] == len(files):
+            status = QUEUED
+        elif counts[QUEUED] or counts[PROCESSING]:
+            status = PROCESSING
+        elif counts[FAILED] == len(files):
+            status = FAILED
+        elif counts[FAILED]:
+            status = 'partial'
+        else:
+            status = COMPLETED
+
+        return {
+            'job_id': job[0],
+            'owner': job[1],
+            'pipeline': job[2],
+            'created_at': job[3],
+            'status': status,
+            'counts': counts,
+            'files': files
+        }
+
+    def start(self) -> None:
+        """Start the worker pool if it is not already running"""
+        with self._lock:
+            self._stopping = False
+            self._workers = [worker for worker in self._workers if worker.is_alive()]
+            while len(self._workers) < self.max_workers:
+                worker = threading.Thread(target=self._work, name=f"job-worker-{len(self._workers)}", daemon=True)
+                worker.start()
+                self._workers.append(worker)
+
+    def stop(self, timeout: float = None) -> None:
+        """Stop the workers after their current file"""
+        with self._lock:
+            self._stopping = True
+            self._wakeup.notify_all()
+        for worker in self._workers:
+            worker.join(timeout)
+        self._workers = []
+
+    def _claim_next(self) -> Optional[Tuple[int, str, str, str, Dict[str, Any]]]:
+        """Wait for a queued file and mark it as processing"""
+        with self._lock:
+            while not self._stopping:
+                row = self._conn.execute(
+                    'SELECT f.id, f.path, f.filename, j.pipeline, j.options FROM job_files f '
+                    'JOIN jobs j ON j.id = f.job_id WHERE f.status = ? ORDER BY f.id LIMIT 1', (QUEUED,)
+                ).fetchone()
+                if row:
+                    self._conn.execute(
+                        'UPDATE job_files SET status = ?, started_at = ? WHERE id = ?',
+                        (PROCESSING, time.time(), row[0])
+                    )
+                    self._conn.commit()
+                    file_id, path, filename, pipeline, options = row
+                    return file_id, path, filename, pipeline, json.loads(options or '{}')
+                self._wakeup.wait()
+        return None
+
+    def _finish(self, file_id: int, status: str, result: Dict[str, Any] = None, error: str = None) -> None:
+        """Record the outcome of a file"""
+        with self._lock:
+            self._conn.execute(
+                'UPDATE job_files SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ?',
+                (status, json.dumps(result, default=str) if result is not None else None, error, time.time(), file_id)
+            )
+            self._conn.commit()
+
+    def _work(self) -> None:
+        """Worker loop: process queued files until stopped"""
+        while True:
+            claimed = self._claim_next()
+            if claimed is None:
+                return
+
+            file_id, path, filename, pipeline, options = claimed
+            try:
+                result = self.processors[pipeline](path, **options)
+                status, error = (COMPLETED if result.get('success', True) else FAILED), result.get('error')
+            except Exception as e:
+                logger.error(f"Error processing {filename}: {str(e)}")
+                status, result, error = FAILED, None, str(e)
+            finally:
+                # Stored uploads are only needed until they are processed; remove
+                # them before the file is reported finished
+                if os.path.exists(path):
+                    os.remove(path)
+            self._finish(file_id, status, result=result, error=error)
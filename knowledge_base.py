@@ -10,7 +10,9 @@ import hashlib
 import requests
 from bs4 import BeautifulSoup
 import pandas as pd
-import base64
+from document_buffer import as_document_buffer
+from addy_client import get_addy_client
+from batch_classify import classify_batch
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -67,6 +69,7 @@ class KnowledgeBaseManager:
                 'extract': '/document/extract'
             }
         }
+        self.addy_client = get_addy_client(self.api_config['api_key'], self.api_config['base_url'])
     
     def _generate_content_hash(self, content: str) -> str:
         """Generate a hash of the content for version tracking"""
@@ -275,14 +278,8 @@ class KnowledgeBaseManager:
         """Classify a document using Addy AI API"""
         try:
             # Read file as base64
-            with open(file_path, 'rb') as f:
-                file_data = base64.b64encode(f.read()).decode('utf-8')
-            
-            # Prepare request
-            headers = {
-                'api-key': self.api_config['api_key'],
-                'Content-Type': 'application/json'
-            }
+            with as_document_buffer(file_path) as document:
+                file_data = document.data
             
             payload = {
                 'fileData': [file_data],
@@ -291,12 +288,7 @@ class KnowledgeBaseManager:
             }
             
             # Make API request
-            response = requests.post(
-                f"{self.api_config['base_url']}{self.api_config['endpoints']['classify']}",
-                headers=headers,
-                json=payload,
-                timeout=300
-            )
+            response = self.addy_client.classify(payload)
             response.raise_for_status()
             
             result = response.json()
@@ -307,4 +299,25 @@ class KnowledgeBaseManager:
             
         except Exception as e:
             logger.error(f"Error classifying document: {str(e)}")
-            return {} 
\ No newline at end of file
+            return {}
+
+    def classify_documents(self, file_paths: List[str]) -> List[Dict[str, Any]]:
+        """Classify several documents concurrently with classify_batch, falling back to one call per unmapped file"""
+        documents = [as_document_buffer(file_path) for file_path in file_paths]
+        try:
+            batched = classify_batch(self.addy_client, documents, lambda file_data: {
+                'fileData': file_data,
+                'contentType': 'application/pdf',
+                'modelDetail': 'high'
+            })
+        except Exception as e:
+            logger.error(f"Error classifying documents: {str(e)}")
+            batched = [None] * len(documents)
+        finally:
+            for document in documents:
+                document.release()
+        
+        return [
+            classifications[0] if classifications else self.classify_document(file_path)
+            for file_path, classifications in zip(file_paths, batched)
+        ] 
\ No newline at end of file
@@ -0,0 +1,100 @@
+import os
+import re
+import logging
+from typing import Dict, Any, Optional, Union
+from dotenv import load_dotenv
+from document_buffer import DocumentBuffer, as_document_buffer
+from pdf_utils import open_pdf
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+# Below this confidence the document is sent to Addy instead
+MIN_CONFIDENCE = float(os.getenv('LOCAL_EXTRACT_MIN_CONFIDENCE', '0.8'))
+
+# W-2s and paystubs are short; longer files are packets and go to Addy
+MAX_PAGES = int(os.getenv('LOCAL_EXTRACT_MAX_PAGES', '4'))
+
+AMOUNT = r'\$?\s*([0-9]{1,3}(?:,?[0-9]{3})*\.[0-9]{2})'
+
+# Per document type: the phrases that identify it and the Addy field we
+# extract, with the pattern that finds its value
+DOCUMENT_PATTERNS = {
+    'w2': {
+        'identifiers': [
+            re.compile(r'\bW-?2\b', re.IGNORECASE),
+            re.compile(r'wage\s+and\s+tax\s+statement', re.IGNORECASE)
+        ],
+        'field': 'wages',
+        'value': re.compile(r'wages,?\s*tips,?\s*other\s+comp(?:ensation|\.)?[\s:]*' + AMOUNT, re.IGNORECASE)
+    },
+    'paystub': {
+        'identifiers': [
+            re.compile(r'earnings\s+statement', re.IGNORECASE),
+            re.compile(r'pay\s*stub', re.IGNORECASE),
+            re.compile(r'pay\s+(?:period|date)', re.IGNORECASE),
+            re.compile(r'net\s+pay', re.IGNORECASE)
+        ],
+        'field': 'grossPay',
+        'value': re.compile(r'gross\s+(?:pay|earnings)[\s:]*' + AMOUNT, re.IGNORECASE)
+    }
+}
+
+def extract_text(document: Union[str, DocumentBuffer], max_pages: int = MAX_PAGES) -> Optional[str]:
+    """
+    Pull the text layer out of a short PDF.
+
+    Returns None for documents longer than `max_pages`, documents that
+    cannot be read locally (e.g. encrypted) and scans without a text layer.
+    """
+    try:
+        reader = open_pdf(as_document_buffer(document))
+        if reader.is_encrypted or len(reader.pages) > max_pages:
+            return None
+        text = '\n'.join(page.extract_text() or '' for page in reader.pages)
+    except Exception as e:
+        logger.debug(f"No local text layer: {str(e)}")
+        return None
+    return text if text.strip() else None
+
+def extract_fields(text: str) -> Optional[Dict[str, Any]]:
+    """
+    Match the document patterns against extracted text.
+
+    Confidence combines how many identifying phrases matched (up to 0.4),
+    whether the field was found (0.4) and whether every occurrence of it
+    agrees (0.2) - W-2s repeat box 1 on each copy.
+
+    Returns:
+        {'documentType', 'document', 'confidence'} for the best match, or
+        None if no document type was recognised
+    """
+    best = None
+    for doc_type, patterns in DOCUMENT_PATTERNS.items():
+        hits = sum(1 for pattern in patterns['identifiers'] if pattern.search(text))
+        if not hits:
+            continue
+
+        confidence = 0.4 * min(hits, 2) / 2
+        document = {}
+        values = [float(match.replace(',', '')) for match in patterns['value'].findall(text)]
+        values = [value for value in values if value]
+        if values:
+            # The first occurrence is the current-period amount on paystubs
+            document[patterns['field']] = values[0]
+            confidence += 0.4 + (0.2 if len(set(values)) == 1 else 0.1)
+
+        if best is None or confidence > best['confidence']:
+            best = {'documentType': doc_type, 'document': document, 'confidence': round(confidence, 2)}
+    return best
+
+def extract_local(document: Union[str, DocumentBuffer], max_pages: int = MAX_PAGES) -> Optional[Dict[str, Any]]:
+    """Extract a W-2 or paystub from its text layer, or None if there is nothing to go on"""
+    text = extract_text(document, max_pages)
+    if text is None:
+        return None
+    return extract_fields(text)
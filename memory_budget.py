@@ -0,0 +1,181 @@
+import io
+import os
+import json
+import base64
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator, Union, BinaryIO
+from dotenv import load_dotenv
+from document_buffer import DocumentBuffer
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+# Per-request memory budget in bytes; 0 disables bounded-memory mode
+MEMORY_BUDGET_BYTES = int(os.getenv('MEMORY_BUDGET_BYTES', '0'))
+
+# Raw bytes base64-encoded per step; a multiple of 3 so blocks concatenate cleanly
+ENCODE_BLOCK_BYTES = 3 * 256 * 1024
+
+# Stands in for the document's base64 when a payload is built for a RequestBody
+FILE_DATA_PLACEHOLDER = '__FILE_DATA__'
+
+class MemoryBudget:
+    """
+    Byte accounting for one document request.
+
+    Callers reserve the bytes they are about to hold in memory (chunk
+    buffers, request bodies) and release them when done. Anything that does
+    not fit is spilled to a temp file instead, so `peak_bytes` stays within
+    `limit` apart from a single item larger than the whole budget.
+    """
+
+    def __init__(self, limit: int = None):
+        self.limit = limit if limit is not None else MEMORY_BUDGET_BYTES
+        self.in_use = 0
+        self.peak_bytes = 0
+        self.spilled_bytes = 0
+        self.spill_files = set()
+        self._lock = threading.Lock()
+
+    def fits(self, size: int) -> bool:
+        """True if `size` more bytes can be held in memory"""
+        with self._lock:
+            return self.in_use + size <= self.limit
+
+    @property
+    def exhausted(self) -> bool:
+        with self._lock:
+            return self.in_use >= self.limit
+
+    def reserve(self, size: int) -> None:
+        with self._lock:
+            self.in_use += size
+            self.peak_bytes = max(self.peak_bytes, self.in_use)
+
+    def release(self, size: int) -> None:
+        with self._lock:
+            self.in_use -= size
+
+    def spill(self, size: int) -> None:
+        with self._lock:
+            self.spilled_bytes += size
+
+    def report(self) -> Dict[str, int]:
+        """Budget and peak usage, returned with the extraction result"""
+        with self._lock:
+            return {
+                'budget_bytes': self.limit,
+                'peak_bytes': self.peak_bytes,
+                'spilled_bytes': self.spilled_bytes
+            }
+
+def spill_document(document: DocumentBuffer, budget: MemoryBudget) -> DocumentBuffer:
+    """
+    Move an in-memory document to a temp file if it does not fit the budget.
+
+    Returns the document unchanged (with its bytes reserved) if it fits, or a
+    file-backed buffer whose pages the OS can evict. The caller releases the
+    reservation with release_document.
+    """
+    if document.from_file:
+        return document
+    if budget.fits(document.size):
+        budget.reserve(document.size)
+        return document
+
+    with tempfile.NamedTemporaryFile(prefix='spill-', suffix='.pdf', delete=False,
+                                     dir=os.getenv('UPLOAD_TMP_DIR') or None) as file:
+        file.write(document.content)
+    budget.spill(document.size)
+    budget.spill_files.add(file.name)
+    spilled = DocumentBuffer(file.name)
+    logger.info(f"Spilled {document.file_path} ({document.size} bytes) to disk")
+    return spilled
+
+def release_document(document: DocumentBuffer, budget: MemoryBudget) -> None:
+    """Release a document returned by spill_document, deleting any spill file"""
+    if document.from_file:
+        document.release()
+        if document.file_path in budget.spill_files:
+            budget.spill_files.discard(document.file_path)
+            os.remove(document.file_path)
+    else:
+        budget.release(document.size)
+
+class RequestBody:
+    """
+    JSON request body with a document's base64 written straight into it.
+
+    The payload is serialized around FILE_DATA_PLACEHOLDER and the document
+    is encoded block by block into the gap, so the base64 string and the
+    JSON text are never held separately. The body is kept in memory if it
+    fits the budget and written to a temp file otherwise; requests streams
+    either from the file object.
+    """
+
+    def __init__(self, payload: Dict[str, Any], document: DocumentBuffer, budget: MemoryBudget):
+        placeholder = json.dumps(FILE_DATA_PLACEHOLDER).encode()
+        prefix, suffix = json.dumps(payload).encode().split(placeholder, 1)
+        encoded_size = (document.size + 2) // 3 * 4
+        self.size = len(prefix) + 2 + encoded_size + len(suffix)
+        self.budget = budget
+
+        self.in_memory = budget.fits(self.size)
+        if self.in_memory:
+            budget.reserve(self.size)
+            self.file: BinaryIO = io.BytesIO()
+        else:
+            budget.spill(self.size)
+            self.file = tempfile.TemporaryFile(dir=os.getenv('UPLOAD_TMP_DIR') or None)
+
+        content = document.content
+        self.file.write(prefix + b'"')
+        for start in range(0, len(content), ENCODE_BLOCK_BYTES):
+            self.file.write(base64.b64encode(content[start:start + ENCODE_BLOCK_BYTES]))
+        self.file.write(b'"' + suffix)
+        self.file.seek(0)
+
+    def read(self, size: int = -1) -> bytes:
+        return self.file.read(size)
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        return self.file.seek(offset, whence)
+
+    def tell(self) -> int:
+        return self.file.tell()
+
+    def __len__(self) -> int:
+        return self.size
+
+    def close(self) -> None:
+        if not self.file.closed:
+            self.file.close()
+            if self.in_memory:
+                self.budget.release(self.size)
+
+@contextmanager
+def payload_body(payload: Dict[str, Any], document: DocumentBuffer = None,
+                 budget: MemoryBudget = None) -> Iterator[Union[Dict[str, Any], RequestBody]]:
+    """
+    The body to send for an Addy payload.
+
+    Without a budget the payload dict is sent as-is. With one, the payload
+    must carry FILE_DATA_PLACEHOLDER in place of the file data and a
+    streamed RequestBody is yielded, closed when the block exits.
+    """
+    if budget is None:
+        yield payload
+        return
+
+    body = RequestBody(payload, document, budget)
+    try:
+        yield body
+    finally:
+        body.close()
@@ -1,14 +1,22 @@
 import os
-from typing import Dict, List, Any, Tuple
+from typing import Dict, List, Any, Tuple, Union
 from dotenv import load_dotenv
 import openai
 from supabase import create_client
 import logging
 import json
-import re
+import asyncio
 from unittest.mock import MagicMock
-import base64
-import requests
+from addy_client import ADDY_API_BASE, AsyncAddyClient, CircuitOpenError, get_addy_client
+from local_extractor import extract_local
+from rate_limiter import get_rate_limiter
+from extraction_cache import ExtractionCache, get_extraction_cache
+from document_buffer import DocumentBuffer, as_document_buffer
+from pdf_utils import open_pdf, write_pages
+from batch_classify import classify_batch
+from query_analysis import IntentScorer, QueryContext, _normalize, build_entity_gazetteer
+from guideline_index import GuidelineIndex
+from concurrent.futures import ThreadPoolExecutor
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -33,9 +41,24 @@ class MortgageNLPEngine:
         self.fannie_mae_guidelines = self._load_json_guidelines('fannie_mae_guidelines.json')
         self.freddie_mac_guidelines = self._load_json_guidelines('freddie_mac_guidelines.json')
         
+        # In-memory index of the guidelines, loaded and kept up to date in the
+        # background from the first search unless GUIDELINE_INDEX is false
+        self.guideline_index = GuidelineIndex(self.supabase, {
+            'Fannie Mae': self.fannie_mae_guidelines,
+            'Freddie Mac': self.freddie_mac_guidelines
+        })
+        self.guideline_index_enabled = os.getenv('GUIDELINE_INDEX', 'true').lower() == 'true'
+        
         # Initialize document API client
         self.addy_api_key = os.getenv('ADDY_API_KEY', 'external_document_api.zlm._w5NA+I2ekGSvB9I/WA/~')
-        self.addy_api_base = 'https://addy-ai-external-api-dev.firebaseapp.com'
+        self.addy_api_base = ADDY_API_BASE
+        self.addy_client = get_addy_client(self.addy_api_key, self.addy_api_base)
+        
+        # Process-wide limiter every Addy call goes through
+        self.rate_limiter = get_rate_limiter()
+        
+        # Cache of classify/extract results for repeat uploads (None if disabled)
+        self.extraction_cache = get_extraction_cache()
         
         # Define expanded categories
         self.categories = {
@@ -71,6 +94,24 @@ class MortgageNLPEngine:
             'alternative_inquiry': r'(?i)(crypto|blockchain|alternative|private|bridge|hard money)',
             'document_type': r'(?i)(W2|1099|bank statement|tax return|paystub)'
         }
+        
+        # Context phrases that add to an intent's score
+        self.intent_boosts = [
+            ('ltv_inquiry', r'(?i)(how\s+much|down\s+payment|qualify)'),
+            ('dti_inquiry', r'(?i)(income|afford|payment)'),
+            ('credit_inquiry', r'(?i)(qualify|requirements)')
+        ]
+        
+        # Compile the intent patterns once per engine rather than per query
+        self.intent_scorer = IntentScorer(
+            {intent: pattern for intent, pattern in self.intents.items()
+             if intent not in ['state_specific', 'property_type', 'loan_type']},
+            self.intent_boosts,
+            priority=['ltv_inquiry', 'dti_inquiry', 'credit_inquiry']
+        )
+        
+        # States, loan, property and document types matched in one pass over the query
+        self.entity_gazetteer = build_entity_gazetteer(self.categories['documents'])
     
     def _load_json_guidelines(self, filename: str) -> Dict:
         """Load and parse JSON guidelines file"""
@@ -81,109 +122,141 @@ class MortgageNLPEngine:
             logger.error(f"Error loading {filename}: {str(e)}")
             return {}
             
-    def _classify_document(self, file_path: str, borrower_stated_type: str = None, applicants: List[Dict] = None) -> Dict[str, Any]:
+    def _build_classify_payload(self, file_data: Union[str, List[str]], borrower_stated_type: str = None, applicants: List[Dict] = None) -> Dict[str, Any]:
+        """Build a classification request according to the API spec; a list of files is classified in one request"""
+        payload = {
+            'fileData': file_data if isinstance(file_data, list) else [file_data],
+            'contentType': 'application/pdf',
+            'modelDetail': 'high'
+        }
+        
+        # Add optional parameters if provided
+        if borrower_stated_type:
+            payload['borrowerStatedDocumentType'] = borrower_stated_type
+        
+        if applicants:
+            payload['applicants'] = applicants
+        
+        return payload
+    
+    def _parse_classifications(self, result: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Return every classification from a classify response"""
+        if not result.get('success'):
+            raise ValueError(f"Classification failed: {result.get('reason', 'Unknown error')}")
+        
+        return result.get('classifications', [])
+    
+    def _parse_classify_result(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """Return the first classification from a classify response"""
+        return self._parse_classifications(result)[0]
+    
+    def _build_extract_payload(self, file_data: str, classification: Dict = None) -> Dict[str, Any]:
+        """Build an extraction request according to the API spec"""
+        payload = {
+            'fileData': file_data,
+            'contentType': 'application/pdf'
+        }
+        
+        # Add classification if provided
+        if classification:
+            payload['classification'] = {
+                'documentType': classification.get('documentType'),
+                'accountNumber': classification.get('accountNumber'),
+                'startPage': classification.get('startPage', 0),
+                'pages': classification.get('pages', 0),
+                'timePeriodStart': classification.get('timePeriodStart'),
+                'timePeriodEnd': classification.get('timePeriodEnd'),
+                'year': classification.get('year'),
+                'statementDate': classification.get('statementDate'),
+                'individuals': classification.get('individuals', []),
+                'applicantIds': classification.get('applicantIds', []),
+                'issuingEntity': classification.get('issuingEntity'),
+                'levelOfConfidence': classification.get('levelOfConfidence', 0),
+                'levelOfConfidenceExplanation': classification.get('levelOfConfidenceExplanation', '')
+            }
+        
+        return payload
+    
+    def _parse_extract_result(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """Format an extract response"""
+        if not result.get('success'):
+            raise ValueError(f"Extraction failed: {result.get('errorMessage', 'Unknown error')}")
+        
+        return {
+            'document_type': result.get('documentType'),
+            'confidence': result.get('levelOfConfidence'),
+            'confidence_explanation': result.get('levelOfConfidenceExplanation'),
+            'data': result.get('document', {})
+        }
+    
+    def _document_cache_key(self, document: DocumentBuffer, borrower_stated_type: str = None, applicants: List[Dict] = None) -> str:
+        """Cache key for a document and the request parameters that affect its results"""
+        return ExtractionCache.make_key(
+            document.sha256,
+            pipeline='nlp_engine',
+            borrower_stated_type=borrower_stated_type,
+            applicants=applicants
+        )
+            
+    def _classify_document(self, document: Union[str, DocumentBuffer], borrower_stated_type: str = None, applicants: List[Dict] = None) -> Dict[str, Any]:
         """Classify a document using Addy AI API"""
         try:
-            # Read file as base64
-            with open(file_path, 'rb') as f:
-                file_data = base64.b64encode(f.read()).decode('utf-8')
-            
-            # Prepare request
-            headers = {
-                'api-key': self.addy_api_key,
-                'Content-Type': 'application/json'
-            }
-            
-            # Build payload according to API spec
-            payload = {
-                'fileData': [file_data],
-                'contentType': 'application/pdf',
-                'modelDetail': 'high'
-            }
-            
-            # Add optional parameters if provided
-            if borrower_stated_type:
-                payload['borrowerStatedDocumentType'] = borrower_stated_type
-            
-            if applicants:
-                payload['applicants'] = applicants
+            # Reuse the base64 payload if the document was already encoded
+            file_data = as_document_buffer(document).data
+            payload = self._build_classify_payload(file_data, borrower_stated_type, applicants)
             
             # Make API request
-            response = requests.post(
-                f"{self.addy_api_base}/document/classify",
-                headers=headers,
-                json=payload,
-                timeout=300
-            )
+            response = self.addy_client.classify(payload)
             response.raise_for_status()
             
-            result = response.json()
-            if not result.get('success'):
-                raise ValueError(f"Classification failed: {result.get('reason', 'Unknown error')}")
-            
-            return result.get('classifications', [])[0]
+            return self._parse_classify_result(response.json())
             
+        except CircuitOpenError as e:
+            logger.warning(f"Classifying document locally: {str(e)}")
+            local = self._extract_locally(document)
+            if not local:
+                return {}
+            return {
+                'documentType': local['documentType'],
+                'startPage': 0,
+                'levelOfConfidence': local['confidence'],
+                'levelOfConfidenceExplanation': 'Classified from the PDF text layer while the Addy API is unavailable',
+                'source': 'local'
+            }
         except Exception as e:
             logger.error(f"Error classifying document: {str(e)}")
             return {}
+    
+    def _extract_locally(self, document: Union[str, DocumentBuffer]) -> Dict[str, Any]:
+        """Local text-layer result for W-2s and paystubs, used while the Addy circuit is open"""
+        local = extract_local(as_document_buffer(document))
+        return local if local and local['document'] else {}
             
-    def _extract_document_data(self, file_path: str, classification: Dict = None) -> Dict[str, Any]:
+    def _extract_document_data(self, document: Union[str, DocumentBuffer], classification: Dict = None) -> Dict[str, Any]:
         """Extract data from a document using Addy AI API"""
         try:
-            # Read file as base64
-            with open(file_path, 'rb') as f:
-                file_data = base64.b64encode(f.read()).decode('utf-8')
-            
-            # Prepare request
-            headers = {
-                'api-key': self.addy_api_key,
-                'Content-Type': 'application/json'
-            }
-            
-            # Build payload according to API spec
-            payload = {
-                'fileData': file_data,
-                'contentType': 'application/pdf'
-            }
-            
-            # Add classification if provided
-            if classification:
-                payload['classification'] = {
-                    'documentType': classification.get('documentType'),
-                    'accountNumber': classification.get('accountNumber'),
-                    'startPage': classification.get('startPage', 0),
-                    'pages': classification.get('pages', 0),
-                    'timePeriodStart': classification.get('timePeriodStart'),
-                    'timePeriodEnd': classification.get('timePeriodEnd'),
-                    'year': classification.get('year'),
-                    'statementDate': classification.get('statementDate'),
-                    'individuals': classification.get('individuals', []),
-                    'applicantIds': classification.get('applicantIds', []),
-                    'issuingEntity': classification.get('issuingEntity'),
-                    'levelOfConfidence': classification.get('levelOfConfidence', 0),
-                    'levelOfConfidenceExplanation': classification.get('levelOfConfidenceExplanation', '')
-                }
+            # Reuse the base64 payload if the document was already encoded
+            file_data = as_document_buffer(document).data
+            payload = self._build_extract_payload(file_data, classification)
             
             # Make API request
-            response = requests.post(
-                f"{self.addy_api_base}/document/extract",
-                headers=headers,
-                json=payload,
-                timeout=300
-            )
+            response = self.addy_client.extract(payload)
             response.raise_for_status()
             
-            result = response.json()
-            if not result.get('success'):
-                raise ValueError(f"Extraction failed: {result.get('errorMessage', 'Unknown error')}")
+            return self._parse_extract_result(response.json())
             
+        except CircuitOpenError as e:
+            logger.warning(f"Extracting document locally: {str(e)}")
+            local = self._extract_locally(document)
+            if not local:
+                return {}
             return {
-                'document_type': result.get('documentType'),
-                'confidence': result.get('levelOfConfidence'),
-                'confidence_explanation': result.get('levelOfConfidenceExplanation'),
-                'data': result.get('document', {})
+                'document_type': local['documentType'],
+                'confidence': local['confidence'],
+                'confidence_explanation': 'Extracted from the PDF text layer while the Addy API is unavailable',
+                'data': local['document'],
+                'source': 'local'
             }
-            
         except Exception as e:
             logger.error(f"Error extracting document data: {str(e)}")
             return {}
@@ -191,22 +264,39 @@ class MortgageNLPEngine:
     def process_document(self, file_path: str, borrower_stated_type: str = None, applicants: List[Dict] = None) -> Dict[str, Any]:
         """Process a document through classification and extraction"""
         try:
-            # First classify the document
-            classification = self._classify_document(file_path, borrower_stated_type, applicants)
-            if not classification:
-                raise ValueError("Document classification failed")
-            
-            # Then extract data based on classification
-            extraction = self._extract_document_data(file_path, classification)
-            if not extraction:
-                raise ValueError("Document extraction failed")
+            # Read and encode the file once for every API call below
+            with DocumentBuffer(file_path) as document:
+                # Return cached results for documents we have already processed
+                cache_key = None
+                if self.extraction_cache:
+                    cache_key = self._document_cache_key(document, borrower_stated_type, applicants)
+                    cached = self.extraction_cache.get(cache_key)
+                    if cached:
+                        logger.info(f"Extraction cache hit for {file_path}")
+                        return {**cached, 'cached': True}
+                
+                # First classify the document
+                classification = self._classify_document(document, borrower_stated_type, applicants)
+                if not classification:
+                    raise ValueError("Document classification failed")
+                
+                # Then extract data based on classification
+                extraction = self._extract_document_data(document, classification)
+                if not extraction:
+                    raise ValueError("Document extraction failed")
             
-            return {
+            result = {
                 'success': True,
                 'classification': classification,
                 'extraction': extraction
             }
             
+            # Fallback results from a degraded upstream are not cached
+            if self.extraction_cache and extraction.get('source') != 'local':
+                self.extraction_cache.set(cache_key, result)
+            
+            return result
+            
         except Exception as e:
             logger.error(f"Error processing document: {str(e)}")
             return {
@@ -215,69 +305,350 @@ class MortgageNLPEngine:
                 'error_type': type(e).__name__
             }
     
-    def extract_entities(self, query: str) -> Dict[str, Any]:
-        """Extract relevant entities from the query"""
-        entities = {}
+    def classify_documents(self, documents: List[Union[str, DocumentBuffer]], borrower_stated_type: str = None,
+                           applicants: List[Dict] = None) -> List[Dict[str, Any]]:
+        """
+        Classify several documents with concurrent classify calls (see classify_batch).
         
-        # Extract state if present
-        state_match = re.search(self.intents['state_specific'], query)
-        if state_match and len(state_match.group(1)) <= 20:  # Reasonable state name length
-            entities['state'] = state_match.group(1).strip()
+        Returns the first classification for each input, in order. Inputs the
+        response can't be mapped back to are classified on their own, and {}
+        marks a document that could not be classified.
+        """
+        documents = [as_document_buffer(document) for document in documents]
+        try:
+            batched = classify_batch(
+                self.addy_client,
+                documents,
+                lambda file_data: self._build_classify_payload(file_data, borrower_stated_type, applicants)
+            )
+        except CircuitOpenError as e:
+            logger.warning(f"Batch classification unavailable: {str(e)}")
+            batched = [None] * len(documents)
+        
+        return [
+            classifications[0] if classifications
+            else self._classify_document(document, borrower_stated_type, applicants)
+            for document, classifications in zip(documents, batched)
+        ]
+    
+    def process_documents(self, file_paths: List[str], borrower_stated_type: str = None, applicants: List[Dict] = None,
+                          max_workers: int = 4) -> Dict[str, Any]:
+        """
+        Process several separate documents, e.g. a multi-file upload.
         
-        # Extract property type if present
-        property_match = re.search(self.intents['property_type'], query)
-        if property_match:
-            entities['property_type'] = property_match.group(1).lower()
+        Documents not in the extraction cache are classified with
+        concurrent requests, then extracted concurrently. Each entry in
+        'documents' has the same shape as a process_document result.
+        """
+        documents = [DocumentBuffer(file_path) for file_path in file_paths]
+        try:
+            results = [None] * len(documents)
+            cache_keys = [None] * len(documents)
+            if self.extraction_cache:
+                for index, document in enumerate(documents):
+                    cache_keys[index] = self._document_cache_key(document, borrower_stated_type, applicants)
+                    cached = self.extraction_cache.get(cache_keys[index])
+                    if cached:
+                        logger.info(f"Extraction cache hit for {file_paths[index]}")
+                        results[index] = {**cached, 'cached': True}
+            
+            pending = [index for index, result in enumerate(results) if result is None]
+            classifications = self.classify_documents([documents[index] for index in pending],
+                                                      borrower_stated_type, applicants)
+            
+            def extract(index: int, classification: Dict) -> Dict[str, Any]:
+                if not classification:
+                    return {'success': False, 'error': 'Document classification failed', 'error_type': 'ValueError'}
+                extraction = self._extract_document_data(documents[index], classification)
+                if not extraction:
+                    return {'success': False, 'error': 'Document extraction failed', 'error_type': 'ValueError'}
+                
+                result = {'success': True, 'classification': classification, 'extraction': extraction}
+                if self.extraction_cache and extraction.get('source') != 'local':
+                    self.extraction_cache.set(cache_keys[index], result)
+                return result
+            
+            # Extract concurrently, within the limiter's current concurrency
+            with ThreadPoolExecutor(max_workers=max(1, min(max_workers, self.rate_limiter.limit))) as executor:
+                for index, result in zip(pending, executor.map(extract, pending, classifications)):
+                    results[index] = result
+            
+            failed = sum(1 for result in results if not result['success'])
+            return {
+                'success': failed < len(results),
+                'documents': [{'file': file_path, **result} for file_path, result in zip(file_paths, results)],
+                'failed_documents': failed
+            }
             
-        # Extract loan type if present
-        loan_match = re.search(self.intents['loan_type'], query)
-        if loan_match:
-            entities['loan_type'] = loan_match.group(1).lower()
+        except Exception as e:
+            logger.error(f"Error processing documents: {str(e)}")
+            return {
+                'success': False,
+                'error': str(e),
+                'error_type': type(e).__name__
+            }
+        finally:
+            for document in documents:
+                document.release()
+    
+    def _classify_packet(self, document: DocumentBuffer, borrower_stated_type: str = None, applicants: List[Dict] = None) -> List[Dict[str, Any]]:
+        """Classify a multi-document packet, returning every detected document"""
+        payload = self._build_classify_payload(document.data, borrower_stated_type, applicants)
+        
+        response = self.addy_client.classify(payload)
+        response.raise_for_status()
+        
+        return self._parse_classifications(response.json())
+    
+    def _split_packet(self, document: DocumentBuffer, classifications: List[Dict]) -> List[Tuple[Dict, DocumentBuffer, Tuple[int, int]]]:
+        """
+        Cut a packet into one sub-document per classified page range.
+        
+        Addy doesn't state how it numbers pages. The first detected document
+        starts on the packet's first page, so a lowest `startPage` of 1 is read
+        as 1-based numbering and anything else as 0-based. A classification
+        without `pages` runs up to the next document's first page.
+        """
+        reader = open_pdf(document)
+        total_pages = len(reader.pages)
+        parts = []
+        
+        given = [int(c['startPage']) for c in classifications if c.get('startPage') is not None]
+        base = 1 if given and min(given) == 1 else 0
+        starts = [
+            min(max(int(c['startPage']) - base if c.get('startPage') is not None else 0, 0), max(total_pages - 1, 0))
+            for c in classifications
+        ]
+        
+        for classification, start in zip(classifications, starts):
+            pages = int(classification.get('pages') or 0)
+            if pages > 0:
+                end = min(start + pages, total_pages)
+            else:
+                end = min([other for other in starts if other > start], default=total_pages)
+            
+            # Page numbers in the sub-document start from zero
+            sub_classification = {**classification, 'startPage': 0, 'pages': end - start}
+            sub_document = DocumentBuffer.from_bytes(
+                write_pages(reader, range(start, end)),
+                name=f"{document.file_path}[{start}:{end}]"
+            )
+            parts.append((sub_classification, sub_document, (start, end)))
         
-        return entities
+        return parts
+    
+    def process_packet(self, file_path: str, borrower_stated_type: str = None, applicants: List[Dict] = None,
+                       max_workers: int = 4) -> Dict[str, Any]:
+        """
+        Process a multi-document loan packet.
+        
+        The packet is classified once, cut into the classified page ranges, and
+        every sub-document is extracted concurrently so each extract call only
+        uploads its own pages. Results are grouped by applicant.
+        """
+        try:
+            with DocumentBuffer(file_path) as document:
+                # Return cached results for packets we have already processed
+                cache_key = None
+                if self.extraction_cache:
+                    cache_key = ExtractionCache.make_key(
+                        document.sha256,
+                        pipeline='nlp_engine_packet',
+                        borrower_stated_type=borrower_stated_type,
+                        applicants=applicants
+                    )
+                    cached = self.extraction_cache.get(cache_key)
+                    if cached:
+                        logger.info(f"Extraction cache hit for {file_path}")
+                        return {**cached, 'cached': True}
+                
+                classifications = self._classify_packet(document, borrower_stated_type, applicants)
+                if not classifications:
+                    raise ValueError("Document classification failed")
+                
+                parts = self._split_packet(document, classifications)
+            
+            # Extract every sub-document concurrently, within the limiter's current concurrency
+            with ThreadPoolExecutor(max_workers=max(1, min(max_workers, self.rate_limiter.limit))) as executor:
+                extractions = list(executor.map(
+                    lambda part: self._extract_document_data(part[1], part[0]),
+                    parts
+                ))
+            
+            documents = []
+            borrowers = {}
+            for (classification, sub_document, (start, end)), extraction in zip(parts, extractions):
+                sub_document.release()
+                entry = {
+                    'document_type': classification.get('documentType'),
+                    'page_range': [start, end],
+                    'classification': classification,
+                    'extraction': extraction,
+                    'success': bool(extraction)
+                }
+                documents.append(entry)
+                
+                # Group by applicant; documents with no applicant are kept together
+                for applicant_id in classification.get('applicantIds') or ['unassigned']:
+                    borrowers.setdefault(str(applicant_id), []).append(entry)
+            
+            failed = sum(1 for entry in documents if not entry['success'])
+            if failed == len(documents):
+                raise ValueError("Document extraction failed")
+            
+            result = {
+                'success': True,
+                'documents': documents,
+                'borrowers': borrowers,
+                'failed_documents': failed
+            }
+            
+            # Fallback results from a degraded upstream are not cached
+            degraded = any(extraction and extraction.get('source') == 'local' for extraction in extractions)
+            if self.extraction_cache and not failed and not degraded:
+                self.extraction_cache.set(cache_key, result)
+            
+            return result
+            
+        except Exception as e:
+            logger.error(f"Error processing packet: {str(e)}")
+            return {
+                'success': False,
+                'error': str(e),
+                'error_type': type(e).__name__
+            }
+    
+    async def _classify_document_async(self, client: AsyncAddyClient, document: DocumentBuffer, borrower_stated_type: str = None, applicants: List[Dict] = None) -> Dict[str, Any]:
+        """Classify a document using the async Addy AI client"""
+        try:
+            # Encode off the event loop so large files don't stall other requests
+            file_data = await asyncio.to_thread(lambda: document.data)
+            payload = self._build_classify_payload(file_data, borrower_stated_type, applicants)
+            
+            response = await client.classify(payload)
+            response.raise_for_status()
+            
+            return self._parse_classify_result(response.json())
+            
+        except Exception as e:
+            logger.error(f"Error classifying document: {str(e)}")
+            return {}
+    
+    async def _extract_document_data_async(self, client: AsyncAddyClient, document: DocumentBuffer, classification: Dict = None) -> Dict[str, Any]:
+        """Extract data from a document using the async Addy AI client"""
+        try:
+            file_data = await asyncio.to_thread(lambda: document.data)
+            payload = self._build_extract_payload(file_data, classification)
+            
+            response = await client.extract(payload)
+            response.raise_for_status()
+            
+            return self._parse_extract_result(response.json())
+            
+        except Exception as e:
+            logger.error(f"Error extracting document data: {str(e)}")
+            return {}
+    
+    async def process_document_async(self, file_path: str, borrower_stated_type: str = None, applicants: List[Dict] = None,
+                                     client: AsyncAddyClient = None) -> Dict[str, Any]:
+        """
+        Async variant of process_document for high-concurrency callers.
+        
+        Pass a shared AsyncAddyClient to bound the number of in-flight Addy
+        requests across many documents; otherwise one is created for this call.
+        """
+        if client is None:
+            async with AsyncAddyClient(self.addy_api_key, self.addy_api_base) as client:
+                return await self.process_document_async(file_path, borrower_stated_type, applicants, client)
+        
+        try:
+            with DocumentBuffer(file_path) as document:
+                # Return cached results for documents we have already processed
+                cache_key = None
+                if self.extraction_cache:
+                    cache_key = await asyncio.to_thread(self._document_cache_key, document, borrower_stated_type, applicants)
+                    cached = self.extraction_cache.get(cache_key)
+                    if cached:
+                        logger.info(f"Extraction cache hit for {file_path}")
+                        return {**cached, 'cached': True}
+                
+                classification = await self._classify_document_async(client, document, borrower_stated_type, applicants)
+                if not classification:
+                    raise ValueError("Document classification failed")
+                
+                extraction = await self._extract_document_data_async(client, document, classification)
+                if not extraction:
+                    raise ValueError("Document extraction failed")
+            
+            result = {
+                'success': True,
+                'classification': classification,
+                'extraction': extraction
+            }
+            
+            if self.extraction_cache:
+                self.extraction_cache.set(cache_key, result)
+            
+            return result
+            
+        except Exception as e:
+            logger.error(f"Error processing document: {str(e)}")
+            return {
+                'success': False,
+                'error': str(e),
+                'error_type': type(e).__name__
+            }
+    
+    def extract_entities(self, query: str) -> Dict[str, Any]:
+        """Extract the state, property, loan and document types mentioned in the query"""
+        return self.entity_gazetteer.extract(query)
     
     def detect_intent(self, query: str) -> str:
         """Detect the primary intent of the query"""
-        # Initialize scores for each intent
-        scores = {
-            'ltv_inquiry': 0,
-            'dti_inquiry': 0,
-            'credit_inquiry': 0,
-            'general_inquiry': 0
-        }
+        return self.intent_scorer.detect(query)
+    
+    def detect_intents(self, queries: List[str]) -> List[str]:
+        """Detect the primary intent of many queries"""
+        return self.intent_scorer.detect_many(queries)
+    
+    def analyze_query(self, query: Union[str, QueryContext]) -> QueryContext:
+        """Detect the intent and entities of a query, skipping whatever the context already holds"""
+        context = query if isinstance(query, QueryContext) else QueryContext(query)
         
-        # Check for intent-specific keywords
-        for intent, pattern in self.intents.items():
-            if intent not in ['state_specific', 'property_type', 'loan_type']:
-                matches = re.findall(pattern, query, re.IGNORECASE)
-                if matches:
-                    scores[intent] = len(matches)
-        
-        # Additional context-based scoring
-        if re.search(r'(?i)(how\s+much|down\s+payment|qualify)', query):
-            scores['ltv_inquiry'] += 1
-        if re.search(r'(?i)(income|afford|payment)', query):
-            scores['dti_inquiry'] += 1
-        if re.search(r'(?i)(qualify|requirements)', query):
-            scores['credit_inquiry'] += 1
-        
-        # Get the intent with the highest score
-        max_score = max(scores.values())
-        if max_score > 0:
-            for intent, score in scores.items():
-                if score == max_score:
-                    return intent
-        
-        return 'general_inquiry'
+        if context.intent is None:
+            with context.stage('intent'):
+                context.intent = self.detect_intent(context.normalized_query)
+        if context.entities is None:
+            with context.stage('entities'):
+                context.entities = self.extract_entities(context.normalized_query)
+        return context
+    
+    def answer_query(self, context: QueryContext) -> Tuple[str, Dict[str, Any]]:
+        """
+        Run a query through every stage once: analysis, guideline search and response generation.
+        
+        Stages already completed on the context are reused, and each stage's
+        result and timing is left on the context.
+        
+        Returns:
+            The answer and its metadata, as from generate_response
+        """
+        self.analyze_query(context)
+        logger.info(f"Detected intent: {context.intent}, entities: {context.entities}")
+        
+        if context.guidelines is None:
+            with context.stage('search'):
+                context.guidelines = self.search_guidelines(context.intent, context.entities)
+            logger.info(f"Found {len(context.guidelines)} relevant guidelines")
+        
+        with context.stage('response'):
+            return self.generate_response(context.query, context.guidelines, context)
     
     def search_guidelines(self, intent: str, entities: Dict[str, Any]) -> List[Dict]:
         """Search for relevant guidelines based on intent and entities"""
         guidelines = []
         
         try:
-            # Search Supabase guidelines
-            query = self.supabase.table('guidelines').select('*')
-            
             # Build category filters based on intent and entities
             categories = []
             if intent == 'ltv_inquiry':
@@ -299,42 +670,18 @@ class MortgageNLPEngine:
                 if loan_type in ['FHA', 'VA', 'USDA', 'CONVENTIONAL']:
                     categories.extend([f"{loan_type}_LTV", f"{loan_type}_DTI", f"{loan_type}_CREDIT"])
             
-            # Apply category filter if we have categories
-            if categories:
-                category_filter = ",".join([f"category.eq.{cat}" for cat in categories])
-                query = query.or_(category_filter)
-            
-            # Add state filter if present
-            if 'state' in entities:
-                query = query.or_(f"state.eq.{entities['state']},state.is.null")
-            
-            # Execute Supabase query
-            try:
-                result = query.execute()
-                guidelines.extend(getattr(result, 'data', []))
-            except Exception as e:
-                logger.error(f"Error executing Supabase query: {str(e)}")
+            # Answer from the in-memory index; query Supabase only until it has loaded
+            if self.guideline_index_enabled and not self.guideline_index.ready:
+                self.guideline_index.start()
+            if self.guideline_index.ready:
+                guidelines.extend(self.guideline_index.search(categories, entities.get('state')))
+            else:
+                guidelines.extend(self._query_supabase_guidelines(categories, entities))
             
             # Search JSON guidelines
             json_results = []
-            
-            # Search Fannie Mae guidelines
-            if self.fannie_mae_guidelines:
-                fannie_matches = self._search_json_guidelines(
-                    self.fannie_mae_guidelines,
-                    intent,
-                    entities
-                )
-                json_results.extend(fannie_matches)
-            
-            # Search Freddie Mac guidelines
-            if self.freddie_mac_guidelines:
-                freddie_matches = self._search_json_guidelines(
-                    self.freddie_mac_guidelines,
-                    intent,
-                    entities
-                )
-                json_results.extend(freddie_matches)
+            for source in self.guideline_index.json_sources:
+                json_results.extend(self._search_json_guidelines(source, intent, entities))
             
             # Add document requirements if relevant
             if intent == 'document_inquiry' or 'document_type' in entities:
@@ -356,43 +703,46 @@ class MortgageNLPEngine:
             logger.error(f"Error searching guidelines: {str(e)}")
             return []
     
-    def _search_json_guidelines(self, guidelines: Dict, intent: str, entities: Dict[str, Any]) -> List[Dict]:
-        """Search through JSON guidelines for relevant matches"""
-        matches = []
+    def _query_supabase_guidelines(self, categories: List[str], entities: Dict[str, Any]) -> List[Dict]:
+        """Query the guidelines table directly, for use before the index has loaded"""
+        query = self.supabase.table('guidelines').select('*')
+        
+        # Apply category filter if we have categories
+        if categories:
+            category_filter = ",".join([f"category.eq.{cat}" for cat in categories])
+            query = query.or_(category_filter)
         
+        # Add state filter if present
+        if 'state' in entities:
+            query = query.or_(f"state.eq.{entities['state']},state.is.null")
+        
+        # Execute Supabase query
         try:
-            # Extract relevant sections based on intent and entities
-            relevant_sections = []
+            result = query.execute()
+            return list(getattr(result, 'data', []))
+        except Exception as e:
+            logger.error(f"Error executing Supabase query: {str(e)}")
+            return []
+    
+    def _search_json_guidelines(self, source: str, intent: str, entities: Dict[str, Any]) -> List[Dict]:
+        """Search the indexed JSON guidelines of one source for relevant matches"""
+        try:
+            # Pick relevant sections based on intent and entities
+            sections = []
             
             if intent == 'ltv_inquiry':
-                relevant_sections.extend(guidelines.get('ltv', []))
+                sections.append('ltv')
             elif intent == 'dti_inquiry':
-                relevant_sections.extend(guidelines.get('dti', []))
+                sections.append('dti')
             elif intent == 'credit_inquiry':
-                relevant_sections.extend(guidelines.get('credit', []))
+                sections.append('credit')
             
             # Add loan type specific sections
             if 'loan_type' in entities:
-                loan_sections = guidelines.get(entities['loan_type'].lower(), [])
-                relevant_sections.extend(loan_sections)
+                sections.append(entities['loan_type'].lower())
             
-            # Add state specific sections
-            if 'state' in entities:
-                state_sections = guidelines.get('state_specific', {}).get(entities['state'], [])
-                relevant_sections.extend(state_sections)
-            
-            # Convert sections to guideline format
-            for section in relevant_sections:
-                matches.append({
-                    'rule_name': section.get('title', 'Unnamed Rule'),
-                    'rule_text': section.get('content', ''),
-                    'source': section.get('source', 'JSON Guidelines'),
-                    'category': section.get('category', 'general'),
-                    'state': section.get('state'),
-                    'version': section.get('version')
-                })
-            
-            return matches
+            # State specific sections are added by the index
+            return self.guideline_index.json_guidelines(source, sections, entities.get('state'))
             
         except Exception as e:
             logger.error(f"Error searching JSON guidelines: {str(e)}")
@@ -470,9 +820,9 @@ class MortgageNLPEngine:
                 if loan_type in guideline.get('rule_name', ''):
                     score += 1.0
             
-            # Property type match
+            # Property type match, with "single family" and "single-family" alike
             if 'property_type' in entities:
-                if entities['property_type'] in guideline.get('rule_text', '').lower():
+                if _normalize(entities['property_type']) in _normalize(guideline.get('rule_text', '')):
                     score += 0.5
             
             return score
@@ -502,8 +852,8 @@ class MortgageNLPEngine:
             
         return round(min(base_score, 1.0), 2)  # Cap at 1.0
 
-    def generate_response(self, query: str, guidelines: List[Dict]) -> Tuple[str, Dict[str, Any]]:
-        """Generate a response using OpenAI GPT"""
+    def generate_response(self, query: str, guidelines: List[Dict], query_context: QueryContext = None) -> Tuple[str, Dict[str, Any]]:
+        """Generate a response using OpenAI GPT, reusing the intent and entities in `query_context` if given"""
         # Prepare context from guidelines
         context = "\n".join([
             f"Rule: {g['rule_name']}\n{g['rule_text']}\n"
@@ -511,9 +861,10 @@ class MortgageNLPEngine:
             for g in guidelines
         ])
         
-        # Extract entities and intent
-        intent = self.detect_intent(query)
-        entities = self.extract_entities(query)
+        # Intent and entities are only computed here if no earlier stage did
+        query_context = self.analyze_query(query_context or query)
+        intent = query_context.intent
+        entities = query_context.entities
         
         # Prepare system prompt with context
         system_prompt = """You are a mortgage guideline expert. Your role is to:
@@ -582,31 +933,23 @@ Please provide a structured response that directly addresses the question."""
                 }
             )
     
-    def process_query(self, query: str, borrower_id: str = None) -> Dict[str, Any]:
-        """Process a user query and return a response"""
+    def process_query(self, query: Union[str, QueryContext], borrower_id: str = None) -> Dict[str, Any]:
+        """Process a user query (or a QueryContext carrying one) and return a response with per-stage timings"""
         try:
-            # Extract intent and entities
-            intent = self.detect_intent(query)
-            entities = self.extract_entities(query)
-            logger.info(f"Detected intent: {intent}, entities: {entities}")
-            
-            # Search relevant guidelines
-            guidelines = self.search_guidelines(intent, entities)
-            logger.info(f"Found {len(guidelines)} relevant guidelines")
-            
-            # Generate response
-            answer, metadata = self.generate_response(query, guidelines)
+            # Analyse, search and answer, each stage running once
+            context = query if isinstance(query, QueryContext) else QueryContext(query)
+            answer, metadata = self.answer_query(context)
             
             # Store the decision if borrower_id is provided
             if borrower_id:
                 decision_data = {
                     'borrower_id': borrower_id,
-                    'question': query,
+                    'question': context.query,
                     'answer': answer,
                     'metadata': {
                         **metadata,
-                        'intent': intent,
-                        'entities': entities
+                        'intent': context.intent,
+                        'entities': context.entities
                     }
                 }
                 self.supabase.table('loan_decisions').insert(decision_data).execute()
@@ -614,10 +957,11 @@ Please provide a structured response that directly addresses the question."""
             return {
                 'success': True,
                 'answer': answer,
-                'intent': intent,
-                'entities': entities,
+                'intent': context.intent,
+                'entities': context.entities,
                 'metadata': metadata,
-                'guidelines_used': guidelines
+                'guidelines_used': context.guidelines,
+                'timings': context.timings
             }
             
         except Exception as e:
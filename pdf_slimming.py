@@ -0,0 +1,140 @@
+import io
+import os
+import re
+import logging
+import PyPDF2
+from PIL import Image
+from PyPDF2.generic import NameObject, NumberObject, StreamObject
+from typing import Dict, Any, Tuple, Union
+from dotenv import load_dotenv
+from document_buffer import DocumentBuffer, as_document_buffer
+from pdf_utils import open_pdf
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+# Slimming is opt-in: it rewrites the PDF before upload
+SLIMMING_ENABLED = os.getenv('PDF_SLIMMING', 'false').lower() == 'true'
+
+# Images sharper than this (relative to the page width) are downsampled
+MAX_IMAGE_DPI = int(os.getenv('PDF_SLIM_MAX_DPI', '150'))
+JPEG_QUALITY = 75
+
+# Instruction pages printed on the back of tax forms and paystubs
+BOILERPLATE_PATTERNS = [
+    re.compile(r'instructions\s+for\s+(?:employee|employer|recipient)', re.IGNORECASE),
+    re.compile(r'notice\s+to\s+employee', re.IGNORECASE),
+    re.compile(r'paperwork\s+reduction\s+act\s+notice', re.IGNORECASE),
+    re.compile(r'this\s+page\s+(?:is\s+)?intentionally\s+(?:left\s+)?blank', re.IGNORECASE)
+]
+
+# Amounts with cents are what we extract; pages that have them are kept
+AMOUNT = re.compile(r'\d\.\d{2}\b')
+
+def is_boilerplate(text: str) -> bool:
+    """True for instruction-only pages: a boilerplate heading and no amounts"""
+    return any(pattern.search(text) for pattern in BOILERPLATE_PATTERNS) and not AMOUNT.search(text)
+
+def _downsample_image(image: StreamObject, page_width_inches: float, max_dpi: int) -> bool:
+    """Re-encode an over-resolved image XObject as a smaller JPEG in place"""
+    width, height = int(image['/Width']), int(image['/Height'])
+    dpi = width / page_width_inches if page_width_inches else 0
+    if dpi <= max_dpi or '/SMask' in image or '/Mask' in image:
+        return False
+
+    filters = image.get('/Filter')
+    color_space = image.get('/ColorSpace')
+    if filters == '/DCTDecode':
+        picture = Image.open(io.BytesIO(image._data))
+    elif filters == '/FlateDecode' and image.get('/BitsPerComponent') == 8 and \
+            color_space in ('/DeviceRGB', '/DeviceGray'):
+        mode = 'RGB' if color_space == '/DeviceRGB' else 'L'
+        picture = Image.frombytes(mode, (width, height), image.get_data())
+    else:
+        # CMYK, indexed and masked images are left alone
+        return False
+
+    if picture.mode not in ('RGB', 'L'):
+        picture = picture.convert('RGB')
+    scale = max_dpi / dpi
+    picture = picture.resize((max(1, int(width * scale)), max(1, int(height * scale))))
+
+    output = io.BytesIO()
+    picture.save(output, format='JPEG', quality=JPEG_QUALITY)
+    if len(output.getvalue()) >= len(image._data):
+        return False
+
+    image._data = output.getvalue()
+    image[NameObject('/Filter')] = NameObject('/DCTDecode')
+    image[NameObject('/Width')] = NumberObject(picture.width)
+    image[NameObject('/Height')] = NumberObject(picture.height)
+    image[NameObject('/ColorSpace')] = NameObject('/DeviceRGB' if picture.mode == 'RGB' else '/DeviceGray')
+    image[NameObject('/BitsPerComponent')] = NumberObject(8)
+    if '/DecodeParms' in image:
+        del image['/DecodeParms']
+    return True
+
+def slim_pdf(document: Union[str, DocumentBuffer], max_dpi: int = MAX_IMAGE_DPI,
+             drop_boilerplate: bool = True) -> Tuple[DocumentBuffer, Dict[str, Any]]:
+    """
+    Shrink a PDF before it is base64-encoded and uploaded.
+
+    Only the pages are copied into a new file, which leaves behind objects
+    nothing references (outlines, form fields, unused fonts). Content
+    streams are Flate-compressed, images above `max_dpi` are downsampled to
+    JPEG, and instruction-only pages are dropped. If the result is not
+    smaller the original document is returned.
+
+    Returns:
+        (document to upload, report with before/after byte and page counts)
+    """
+    document = as_document_buffer(document)
+    reader = open_pdf(document)
+    report = {
+        'bytes_before': document.size,
+        'bytes_after': document.size,
+        'pages_before': len(reader.pages),
+        'pages_dropped': 0,
+        'images_downsampled': 0,
+        'applied': False
+    }
+
+    keep = list(range(len(reader.pages)))
+    if drop_boilerplate:
+        content_pages = [num for num in keep if not is_boilerplate(reader.pages[num].extract_text() or '')]
+        # Never drop every page
+        if content_pages:
+            keep = content_pages
+    report['pages_dropped'] = report['pages_before'] - len(keep)
+
+    writer = PyPDF2.PdfWriter()
+    for page_num in keep:
+        page = writer.add_page(reader.pages[page_num])
+        page.compress_content_streams()
+
+        page_width_inches = float(page.mediabox.width) / 72
+        x_objects = page.get('/Resources', {}).get('/XObject', {})
+        for name in x_objects:
+            image = x_objects[name].get_object()
+            if isinstance(image, StreamObject) and image.get('/Subtype') == '/Image':
+                try:
+                    if _downsample_image(image, page_width_inches, max_dpi):
+                        report['images_downsampled'] += 1
+                except Exception as e:
+                    logger.warning(f"Could not downsample image {name}: {str(e)}")
+
+    output = io.BytesIO()
+    writer.write(output)
+    slimmed = output.getvalue()
+
+    if len(slimmed) >= report['bytes_before']:
+        return document, {**report, 'pages_dropped': 0, 'images_downsampled': 0}
+
+    report['bytes_after'] = len(slimmed)
+    report['applied'] = True
+    logger.info(f"Slimmed {document.file_path} from {report['bytes_before']} to {report['bytes_after']} bytes")
+    return DocumentBuffer.from_bytes(slimmed, name=document.file_path), report
@@ -0,0 +1,124 @@
+import io
+import hashlib
+import logging
+import PyPDF2
+from PyPDF2.generic import ArrayObject, DictionaryObject, IndirectObject, StreamObject
+from typing import Dict, Iterable, List, Tuple
+from document_buffer import DocumentBuffer
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def open_pdf(document: DocumentBuffer) -> PyPDF2.PdfReader:
+    """Open a PDF reader over a document buffer"""
+    if document.from_file:
+        return PyPDF2.PdfReader(document.file_path)
+    return PyPDF2.PdfReader(io.BytesIO(document.content))
+
+def write_pages(reader: PyPDF2.PdfReader, page_numbers: Iterable[int]) -> bytes:
+    """Write the given pages of a PDF into a new in-memory PDF"""
+    pdf_writer = PyPDF2.PdfWriter()
+    for page_num in page_numbers:
+        pdf_writer.add_page(reader.pages[page_num])
+
+    output = io.BytesIO()
+    pdf_writer.write(output)
+    return output.getvalue()
+
+def _object_digest(obj, memo: Dict[Tuple[int, int], bytes]) -> bytes:
+    """
+    Digest a PDF object by value, following indirect references.
+
+    Object numbers differ between files that render identically, so
+    references are resolved and hashed by content. Shared objects such as
+    fonts are hashed once per document through `memo`.
+    """
+    if isinstance(obj, IndirectObject):
+        key = (obj.idnum, obj.generation)
+        if key not in memo:
+            memo[key] = b''  # Guard against reference cycles
+            memo[key] = _object_digest(obj.get_object(), memo)
+        return memo[key]
+
+    digest = hashlib.sha256()
+    if isinstance(obj, DictionaryObject):
+        digest.update(b'<<')
+        for key in sorted(obj.keys()):
+            if key == '/Parent':
+                continue
+            digest.update(key.encode())
+            digest.update(_object_digest(obj.raw_get(key), memo))
+        digest.update(b'>>')
+        if isinstance(obj, StreamObject):
+            # Raw (still encoded) stream bytes; decoding is not needed to compare
+            digest.update(obj._data)
+    elif isinstance(obj, ArrayObject):
+        digest.update(b'[')
+        for item in obj:
+            digest.update(_object_digest(item, memo))
+        digest.update(b']')
+    else:
+        digest.update(repr(obj).encode())
+    return digest.digest()
+
+def page_hashes(reader: PyPDF2.PdfReader) -> List[str]:
+    """Hash every page by its content streams and resources"""
+    memo = {}
+    hashes = []
+    for page in reader.pages:
+        digest = hashlib.sha256()
+        for key in ('/Contents', '/Resources'):
+            if key in page:
+                digest.update(_object_digest(page.raw_get(key), memo))
+        hashes.append(digest.hexdigest())
+    return hashes
+
+def _stream_bytes(obj, seen: set) -> int:
+    """Sum the raw sizes of the streams reachable from a PDF object"""
+    if isinstance(obj, IndirectObject):
+        key = (obj.idnum, obj.generation)
+        if key in seen:
+            return 0
+        seen.add(key)
+        obj = obj.get_object()
+
+    total = 0
+    if isinstance(obj, DictionaryObject):
+        if isinstance(obj, StreamObject):
+            total += len(obj._data)
+        for key in obj.keys():
+            if key != '/Parent':
+                total += _stream_bytes(obj.raw_get(key), seen)
+    elif isinstance(obj, ArrayObject):
+        for item in obj:
+            total += _stream_bytes(item, seen)
+    return total
+
+def page_weights(reader: PyPDF2.PdfReader) -> List[int]:
+    """Raw bytes of the content streams and resources (fonts, images) each page uses"""
+    weights = []
+    for page in reader.pages:
+        seen = set()
+        weights.append(sum(_stream_bytes(page.raw_get(key), seen)
+                           for key in ('/Contents', '/Resources') if key in page))
+    return weights
+
+def outline_starts(reader: PyPDF2.PdfReader) -> List[int]:
+    """First page of each top-level bookmark, which in merged loan packets marks where each document starts"""
+    try:
+        outline = reader.outline
+    except Exception as e:
+        logger.warning(f"Could not read PDF outline: {str(e)}")
+        return []
+
+    starts = set()
+    for item in outline:
+        # Nested lists hold the children of the previous bookmark
+        if isinstance(item, list):
+            continue
+        try:
+            starts.add(reader.get_destination_page_number(item))
+        except Exception:
+            continue
+    return sorted(start for start in starts if start >= 0)
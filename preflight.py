@@ -0,0 +1,111 @@
+import os
+import logging
+from typing import Dict, Any, Union
+from dotenv import load_dotenv
+from document_buffer import DocumentBuffer, as_document_buffer
+from pdf_utils import open_pdf, page_weights
+from local_extractor import MAX_PAGES as LOCAL_MAX_PAGES
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+# Routes a document can take through the pipeline
+ROUTE_LOCAL = 'local'
+ROUTE_SINGLE = 'single'
+ROUTE_CHUNKED = 'chunked'
+ROUTE_REJECT = 'reject'
+
+MAX_PAGES = int(os.getenv('PREFLIGHT_MAX_PAGES', '1000'))
+MAX_BYTES = int(os.getenv('PREFLIGHT_MAX_BYTES', str(200 * 1024 * 1024)))
+
+# Documents heavier than this are split even if they have few pages
+CHUNK_BYTES = int(os.getenv('PREFLIGHT_CHUNK_BYTES', str(20 * 1024 * 1024)))
+
+# Multi-page documents with a page heavier than this are split so the heavy
+# page (typically a high-resolution scan) is sent on its own
+HEAVY_PAGE_BYTES = int(os.getenv('PREFLIGHT_HEAVY_PAGE_BYTES', str(5 * 1024 * 1024)))
+
+# Pages sampled to decide whether a document has a text layer
+TEXT_SAMPLE_PAGES = 3
+
+class PreflightError(ValueError):
+    """Raised when preflight rejects a document; carries the preflight report"""
+
+    def __init__(self, report: Dict[str, Any]):
+        super().__init__(f"PDF rejected by preflight: {report['reason']}")
+        self.report = report
+
+def preflight(document: Union[str, DocumentBuffer], chunk_size: int) -> Dict[str, Any]:
+    """
+    Inspect a PDF locally and decide how it should be processed.
+
+    Checks byte size, page count, encryption, whether the first pages have
+    a text layer and how heavy each page is, then picks a route: the local
+    text-layer extractor, a single Addy request, chunked parallel requests,
+    or rejection before any remote call is made.
+
+    Args:
+        document: Path or buffer of the PDF
+        chunk_size: Pages per chunk in the chunked route
+
+    Returns:
+        The preflight report, including 'route' and the 'reason' for it
+    """
+    document = as_document_buffer(document)
+    report = {
+        'bytes': document.size,
+        'pages': 0,
+        'encrypted': False,
+        'text_layer': False,
+        'bytes_per_page': 0,
+        'max_page_bytes': 0
+    }
+
+    def route(name: str, reason: str) -> Dict[str, Any]:
+        report['route'] = name
+        report['reason'] = reason
+        logger.info(f"Preflight routed {document.file_path} to {name}: {reason}")
+        return report
+
+    if report['bytes'] == 0:
+        return route(ROUTE_REJECT, 'empty file')
+    if report['bytes'] > MAX_BYTES:
+        return route(ROUTE_REJECT, f"{report['bytes']} bytes exceeds the {MAX_BYTES} byte limit")
+
+    try:
+        reader = open_pdf(document)
+        report['encrypted'] = reader.is_encrypted
+        if reader.is_encrypted:
+            return route(ROUTE_REJECT, 'encrypted')
+        report['pages'] = len(reader.pages)
+    except Exception as e:
+        return route(ROUTE_REJECT, f"unreadable PDF: {str(e)}")
+
+    if report['pages'] == 0:
+        return route(ROUTE_REJECT, 'no pages')
+    if report['pages'] > MAX_PAGES:
+        return route(ROUTE_REJECT, f"{report['pages']} pages exceeds the {MAX_PAGES} page limit")
+
+    report['bytes_per_page'] = report['bytes'] // report['pages']
+    try:
+        report['max_page_bytes'] = max(page_weights(reader))
+        report['text_layer'] = any(
+            (reader.pages[page_num].extract_text() or '').strip()
+            for page_num in range(min(TEXT_SAMPLE_PAGES, report['pages']))
+        )
+    except Exception as e:
+        return route(ROUTE_REJECT, f"unreadable PDF: {str(e)}")
+
+    if report['pages'] > chunk_size:
+        return route(ROUTE_CHUNKED, f"{report['pages']} pages exceeds the {chunk_size} page chunk size")
+    if report['pages'] > 1 and report['bytes'] > CHUNK_BYTES:
+        return route(ROUTE_CHUNKED, f"{report['bytes']} bytes exceeds the {CHUNK_BYTES} byte single-request size")
+    if report['pages'] > 1 and report['max_page_bytes'] > HEAVY_PAGE_BYTES:
+        return route(ROUTE_CHUNKED, f"a {report['max_page_bytes']} byte page exceeds the {HEAVY_PAGE_BYTES} byte page size")
+    if report['text_layer'] and report['pages'] <= LOCAL_MAX_PAGES:
+        return route(ROUTE_LOCAL, 'short document with a text layer')
+    return route(ROUTE_SINGLE, 'no text layer' if not report['text_layer'] else 'too long for local extraction')
@@ -0,0 +1,282 @@
+import re
+import time
+import logging
+from contextlib import contextmanager
+from typing import Any, Dict, List, Iterable, Iterator, Tuple
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Leading inline flags such as (?i); queries are lower-cased instead
+INLINE_FLAGS = re.compile(r'^\(\?[aiLmsux]+\)')
+
+# Escape sequences, which keep their case, or runs of plain pattern text
+PATTERN_TOKENS = re.compile(r'\\.|[^\\]+', re.DOTALL)
+
+def fold_case(pattern: str) -> str:
+    """
+    Rewrite a case-insensitive pattern to match lower-cased text.
+
+    Matching a lower-cased query with a case-sensitive pattern lets the
+    regex engine scan for the pattern's literal prefix, which it cannot do
+    under IGNORECASE.
+    """
+    pattern = INLINE_FLAGS.sub('', pattern)
+    return PATTERN_TOKENS.sub(
+        lambda token: token.group() if token.group().startswith('\\') else token.group().lower(),
+        pattern
+    )
+
+class IntentScorer:
+    """
+    Scores every intent against a query with patterns compiled once.
+
+    Each keyword and context pattern is compiled when the scorer is built
+    and matched case-sensitively against the query lower-cased once, so a
+    query costs one scan per pattern with no regex cache lookups.
+    """
+
+    def __init__(self, keywords: Dict[str, str], boosts: Iterable[Tuple[str, str]] = (),
+                 priority: Iterable[str] = (), default_intent: str = 'general_inquiry'):
+        """
+        Args:
+            keywords: Intent -> pattern; each non-overlapping match scores 1
+            boosts: (intent, pattern) pairs; a query matching the pattern
+                anywhere adds 1 to the intent
+            priority: Intents that win ties, in order, ahead of the default
+                and the keyword intents
+            default_intent: Returned when nothing scores
+        """
+        self.default_intent = default_intent
+        self.intents = list(dict.fromkeys([*priority, default_intent, *keywords]))
+        self._keywords = [(intent, re.compile(fold_case(pattern))) for intent, pattern in keywords.items()]
+        self._boosts = [(intent, re.compile(fold_case(pattern))) for intent, pattern in boosts]
+
+    def scores(self, query: str) -> Dict[str, int]:
+        """Score every intent against the query"""
+        text = query.lower()
+        scores = dict.fromkeys(self.intents, 0)
+        for intent, pattern in self._keywords:
+            scores[intent] += sum(1 for _ in pattern.finditer(text))
+        for intent, pattern in self._boosts:
+            if pattern.search(text):
+                scores[intent] += 1
+        return scores
+
+    def detect(self, query: str) -> str:
+        """Return the highest scoring intent, earlier intents winning ties"""
+        scores = self.scores(query)
+        max_score = max(scores.values())
+        if max_score > 0:
+            for intent, score in scores.items():
+                if score == max_score:
+                    return intent
+        return self.default_intent
+
+    def scores_many(self, queries: Iterable[str]) -> List[Dict[str, int]]:
+        """Score many queries with the same compiled patterns"""
+        return [self.scores(query) for query in queries]
+
+    def detect_many(self, queries: Iterable[str]) -> List[str]:
+        """Detect the intent of many queries with the same compiled patterns"""
+        return [self.detect(query) for query in queries]
+
+# US states and their postal abbreviations
+US_STATES = {
+    'Alabama': 'AL', 'Alaska': 'AK', 'Arizona': 'AZ', 'Arkansas': 'AR', 'California': 'CA',
+    'Colorado': 'CO', 'Connecticut': 'CT', 'Delaware': 'DE', 'Florida': 'FL', 'Georgia': 'GA',
+    'Hawaii': 'HI', 'Idaho': 'ID', 'Illinois': 'IL', 'Indiana': 'IN', 'Iowa': 'IA',
+    'Kansas': 'KS', 'Kentucky': 'KY', 'Louisiana': 'LA', 'Maine': 'ME', 'Maryland': 'MD',
+    'Massachusetts': 'MA', 'Michigan': 'MI', 'Minnesota': 'MN', 'Mississippi': 'MS', 'Missouri': 'MO',
+    'Montana': 'MT', 'Nebraska': 'NE', 'Nevada': 'NV', 'New Hampshire': 'NH', 'New Jersey': 'NJ',
+    'New Mexico': 'NM', 'New York': 'NY', 'North Carolina': 'NC', 'North Dakota': 'ND', 'Ohio': 'OH',
+    'Oklahoma': 'OK', 'Oregon': 'OR', 'Pennsylvania': 'PA', 'Rhode Island': 'RI', 'South Carolina': 'SC',
+    'South Dakota': 'SD', 'Tennessee': 'TN', 'Texas': 'TX', 'Utah': 'UT', 'Vermont': 'VT',
+    'Virginia': 'VA', 'Washington': 'WA', 'West Virginia': 'WV', 'Wisconsin': 'WI', 'Wyoming': 'WY'
+}
+
+# Abbreviations that are ordinary words even in capitals, or a loan type (VA)
+AMBIGUOUS_ABBREVIATIONS = {'HI', 'ID', 'IN', 'ME', 'OH', 'OK', 'OR', 'VA'}
+
+LOAN_TYPES = ['fha', 'conventional', 'jumbo', 'va', 'usda', 'crypto', 'private', 'bridge']
+
+# Surface forms -> property type
+PROPERTY_TYPES = {
+    'single-family': 'single-family',
+    'single family': 'single-family',
+    'multi-family': 'multi-family',
+    'multi family': 'multi-family',
+    'condo': 'condo',
+    'condominium': 'condo',
+    'townhouse': 'townhouse',
+    'investment property': 'investment property',
+    'primary residence': 'primary residence'
+}
+
+# Hyphens and whitespace are interchangeable in phrases
+SEPARATORS = str.maketrans({char: ' ' for char in '-\t\n\r\f\v'})
+
+def _normalize(text: str) -> str:
+    """
+    Lower-case text and treat hyphens and whitespace alike.
+
+    Every character maps to exactly one character, so offsets in the
+    result are offsets in the original text.
+    """
+    lowered = text.lower()
+    if len(lowered) != len(text):
+        # A few characters lower-case to several; leave those as they are
+        lowered = ''.join(char.lower() if len(char.lower()) == 1 else char for char in text)
+    return lowered.translate(SEPARATORS)
+
+def _trie_pattern(phrases: Iterable[str]) -> str:
+    """
+    Compile phrases into a regex shaped like their prefix trie.
+
+    Shared prefixes are matched once, and at every node the longer
+    continuations are tried before stopping, so the longest phrase starting
+    at a position wins.
+    """
+    trie = {}
+    for phrase in phrases:
+        node = trie
+        for char in phrase:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def emit(node: Dict[str, Dict]) -> str:
+        branches = [re.escape(char) + emit(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+        return f'(?:{body})?' if '' in node else body
+
+    return emit(trie)
+
+class Gazetteer:
+    """
+    Finds known phrases in text with a precomputed trie.
+
+    The phrases are compiled into a trie-shaped regex once, so the text is
+    scanned in one pass however many phrases there are. Phrases match whole
+    words only, case-insensitively unless added as case-sensitive, with
+    hyphens and spaces interchangeable. Where matches overlap, the leftmost
+    and then the longest wins, so "West Virginia" is not also read as
+    "Virginia".
+    """
+
+    def __init__(self):
+        # Normalized phrase -> (entity_type, value), without and with case sensitivity
+        self._phrases: Dict[str, Tuple[str, str]] = {}
+        self._exact_phrases: Dict[str, Tuple[str, str]] = {}
+        self._patterns = None
+
+    def add(self, phrase: str, entity_type: str, value: str, case_sensitive: bool = False) -> None:
+        """Add a phrase that yields `value` as an entity of `entity_type`; the first value added for a phrase wins"""
+        if case_sensitive:
+            self._exact_phrases.setdefault(phrase.translate(SEPARATORS), (entity_type, value))
+        else:
+            self._phrases.setdefault(_normalize(phrase), (entity_type, value))
+        self._patterns = None
+
+    def _compile(self) -> List[Tuple[re.Pattern, Dict[str, Tuple[str, str]], bool]]:
+        """Compile one trie pattern per phrase table"""
+        patterns = []
+        for phrases, normalize in ((self._phrases, True), (self._exact_phrases, False)):
+            if phrases:
+                pattern = re.compile(rf'(?<!\w)(?:{_trie_pattern(phrases)})(?!\w)')
+                patterns.append((pattern, phrases, normalize))
+        return patterns
+
+    def find(self, text: str) -> List[Tuple[int, int, str, str]]:
+        """
+        Find every non-overlapping phrase in the text.
+
+        Returns:
+            (start, end, entity_type, value) for each match, in order
+        """
+        if self._patterns is None:
+            self._patterns = self._compile()
+
+        candidates = []
+        for pattern, phrases, normalize in self._patterns:
+            scanned = _normalize(text) if normalize else text.translate(SEPARATORS)
+            for match in pattern.finditer(scanned):
+                candidates.append((match.start(), match.end(), *phrases[match.group()]))
+
+        matches = []
+        position = 0
+        for start, end, entity_type, value in sorted(candidates, key=lambda match: (match[0], -match[1])):
+            if start >= position:
+                matches.append((start, end, entity_type, value))
+                position = end
+        return matches
+
+    def extract(self, text: str) -> Dict[str, str]:
+        """Return the first value found for each entity type"""
+        entities = {}
+        for _, _, entity_type, value in self.find(text):
+            entities.setdefault(entity_type, value)
+        return entities
+
+def build_entity_gazetteer(documents: Dict[str, List[str]] = None) -> Gazetteer:
+    """
+    Build the gazetteer of states, loan types, property types and document types.
+
+    Args:
+        documents: Document category -> document types, e.g. the engine's
+            categories['documents']; each type is returned as written there
+
+    Returns:
+        Gazetteer yielding 'state', 'loan_type', 'property_type' and
+        'document_type' entities
+    """
+    gazetteer = Gazetteer()
+    for state, abbreviation in US_STATES.items():
+        gazetteer.add(state, 'state', state)
+        # Only capitalised abbreviations, so "in" or "me" aren't read as states
+        if abbreviation not in AMBIGUOUS_ABBREVIATIONS:
+            gazetteer.add(abbreviation, 'state', state, case_sensitive=True)
+    for loan_type in LOAN_TYPES:
+        gazetteer.add(loan_type, 'loan_type', loan_type)
+    for phrase, property_type in PROPERTY_TYPES.items():
+        gazetteer.add(phrase, 'property_type', property_type)
+    for document_types in (documents or {}).values():
+        for document_type in document_types:
+            phrases = [document_type.replace('_', ' ')]
+            if document_type.upper() == 'W2':
+                phrases.append('W-2')
+            for phrase in phrases:
+                gazetteer.add(phrase, 'document_type', document_type)
+                gazetteer.add(f"{phrase}s", 'document_type', document_type)
+    return gazetteer
+
+class QueryContext:
+    """
+    Everything computed for one query as it moves through the pipeline.
+
+    Each stage stores its result here and later stages read it instead of
+    recomputing it from the raw query, so intent detection, entity
+    extraction and guideline search each run once per request. Stages are
+    timed with `stage()`.
+    """
+
+    def __init__(self, query: str):
+        self.query = query
+        # Whitespace collapsed so phrases like "New  York" still match
+        self.normalized_query = ' '.join(query.split())
+        self.intent: str = None
+        self.entities: Dict[str, Any] = None
+        self.guidelines: List[Dict] = None
+        self.timings: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Record how long the enclosed stage takes, in seconds"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = round(time.perf_counter() - started, 6)
+
@@ -0,0 +1,208 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from typing import Dict, Any
+from dotenv import load_dotenv
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+class TokenBucket:
+    """Requests-per-second limit: `rate` tokens are added per second, up to `burst`"""
+
+    def __init__(self, rate: float, burst: float = None):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    def reset(self) -> None:
+        """Refill the bucket"""
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self) -> float:
+        """Take a token and return 0, or return how long to wait for one"""
+        self._refill(time.monotonic())
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+class AIMDController:
+    """
+    Additive-increase / multiplicative-decrease concurrency limit.
+
+    Each healthy response (no 429/5xx, latency within `latency_target`)
+    grows the limit by `1 / limit`, i.e. by about one per round of requests.
+    An error or slow response cuts it by `decrease`, at most once per
+    `cooldown` seconds so one burst of failures counts as a single signal.
+    """
+
+    def __init__(self, initial: float, min_limit: float = 1, max_limit: float = 64,
+                 decrease: float = 0.5, latency_target: float = 60.0, cooldown: float = 1.0):
+        self.initial = float(initial)
+        self.limit = self.initial
+        self.min_limit = float(min_limit)
+        self.max_limit = float(max_limit)
+        self.decrease = decrease
+        self.latency_target = latency_target
+        self.cooldown = cooldown
+        self.last_decrease = 0.0
+
+    def reset(self) -> None:
+        """Return to the initial limit"""
+        self.limit = self.initial
+        self.last_decrease = 0.0
+
+    def record(self, latency: float, error: bool) -> None:
+        if error or latency > self.latency_target:
+            now = time.monotonic()
+            if now - self.last_decrease >= self.cooldown:
+                self.limit = max(self.min_limit, self.limit * self.decrease)
+                self.last_decrease = now
+                logger.warning(f"Addy concurrency limit reduced to {self.limit:.1f}")
+        else:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+class RequestSlot:
+    """
+    Handed out for one request; set `error` if the response should count
+    against the limit, or `unused` if nothing was sent after all.
+    """
+
+    def __init__(self, limiter: 'AddyRateLimiter'):
+        self.limiter = limiter
+        self.error = False
+        self.unused = False
+        self.started = time.monotonic()
+
+    def __enter__(self) -> 'RequestSlot':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.limiter.release(time.monotonic() - self.started, self.error or exc_type is not None, self.unused)
+
+class AddyRateLimiter:
+    """
+    Process-wide limiter for outbound Addy AI requests.
+
+    A token bucket caps the request rate and an AIMD controller caps the
+    number of requests in flight, growing while responses are fast and
+    healthy and backing off on 429s, 5xx and transport errors. Threads
+    block in `request()`; coroutines wait in `request_async()`.
+    """
+
+    def __init__(self, rate: float = None, burst: float = None, initial_limit: float = None,
+                 max_limit: float = None, latency_target: float = None):
+        self.bucket = TokenBucket(
+            rate or float(os.getenv('ADDY_RATE_LIMIT', '10')),
+            burst or (float(os.getenv('ADDY_RATE_BURST')) if os.getenv('ADDY_RATE_BURST') else None)
+        )
+        self.controller = AIMDController(
+            initial_limit or float(os.getenv('ADDY_CONCURRENCY_INITIAL', '4')),
+            max_limit=max_limit or float(os.getenv('ADDY_CONCURRENCY_MAX', '64')),
+            latency_target=latency_target or float(os.getenv('ADDY_LATENCY_TARGET', '60'))
+        )
+        self.in_flight = 0
+        self.stats = {'requests': 0, 'errors': 0, 'throttled_seconds': 0.0}
+        self._lock = threading.Lock()
+        self._released = threading.Condition(self._lock)
+
+    @property
+    def limit(self) -> int:
+        """Current number of requests allowed in flight"""
+        return max(1, int(self.controller.limit))
+
+    @property
+    def max_limit(self) -> int:
+        """Configured ceiling on requests in flight; unlike `limit` it does not move with load"""
+        return max(1, int(self.controller.max_limit))
+
+    def _try_acquire(self) -> float:
+        """Claim a slot and a token, or return how long to wait before trying again"""
+        if self.in_flight >= self.limit:
+            return -1.0
+        wait_time = self.bucket.take()
+        if wait_time == 0:
+            self.in_flight += 1
+            self.stats['requests'] += 1
+        return wait_time
+
+    def request(self) -> RequestSlot:
+        """Block until a request may be sent"""
+        started = time.monotonic()
+        with self._lock:
+            while True:
+                wait_time = self._try_acquire()
+                if wait_time == 0:
+                    break
+                # A negative wait means no slot is free: wait for a release
+                self._released.wait(wait_time if wait_time > 0 else None)
+            self.stats['throttled_seconds'] += time.monotonic() - started
+        return RequestSlot(self)
+
+    async def request_async(self) -> RequestSlot:
+        """Wait on the event loop until a request may be sent"""
+        started = time.monotonic()
+        while True:
+            with self._lock:
+                wait_time = self._try_acquire()
+                if wait_time == 0:
+                    self.stats['throttled_seconds'] += time.monotonic() - started
+                    return RequestSlot(self)
+            await asyncio.sleep(wait_time if wait_time > 0 else 0.05)
+
+    def release(self, latency: float, error: bool, unused: bool = False) -> None:
+        """Return a slot and feed the outcome to the AIMD controller, unless the slot went `unused`"""
+        with self._lock:
+            self.in_flight -= 1
+            if not unused:
+                if error:
+                    self.stats['errors'] += 1
+                self.controller.record(latency, error)
+            self._released.notify_all()
+
+    def reset(self) -> None:
+        """
+        Forget past traffic: refill the bucket, return to the initial limit
+        and clear the stats. Requests in flight keep their slots.
+        """
+        with self._lock:
+            self.bucket.reset()
+            self.controller.reset()
+            self.stats = {'requests': 0, 'errors': 0, 'throttled_seconds': 0.0}
+            self._released.notify_all()
+
+    def state(self) -> Dict[str, Any]:
+        """Snapshot of the limiter for metrics"""
+        with self._lock:
+            return {
+                'limit': self.limit,
+                'in_flight': self.in_flight,
+                'rate': self.bucket.rate,
+                'tokens': round(self.bucket.tokens, 2),
+                **self.stats,
+                'throttled_seconds': round(self.stats['throttled_seconds'], 3)
+            }
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+def get_rate_limiter() -> AddyRateLimiter:
+    """Return the limiter shared by every Addy client in the process"""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = AddyRateLimiter()
+        return _limiter
@@ -0,0 +1,234 @@
+import unittest
+import threading
+import asyncio
+from unittest.mock import patch, MagicMock, AsyncMock
+import requests
+from addy_client import (AddyClient, AsyncAddyClient, CircuitBreaker, CircuitOpenError, HedgeCancelled,
+                         get_addy_client, reset_shared_state)
+from rate_limiter import AddyRateLimiter, get_rate_limiter
+
+class TestAddyClient(unittest.TestCase):
+    def setUp(self):
+        self.client = AddyClient('test-addy-key', max_retries=2, timeouts={'classify': 30},
+                                 limiter=AddyRateLimiter(rate=1000), breaker=CircuitBreaker())
+        self.payload = {'fileData': ['ZGF0YQ=='], 'contentType': 'application/pdf'}
+
+    def _response(self, status_code, headers=None):
+        response = MagicMock()
+        response.status_code = status_code
+        response.headers = headers or {}
+        return response
+
+    def test_session_headers_and_timeouts(self):
+        """Test the pooled session carries auth headers and per-endpoint timeouts"""
+        with patch.object(self.client.session, 'post', return_value=self._response(200)) as mock_post:
+            self.client.classify(self.payload)
+            self.client.extract(self.payload)
+
+        self.assertEqual(self.client.session.headers['api-key'], 'test-addy-key')
+        self.assertEqual(mock_post.call_args_list[0].kwargs['timeout'], 30)
+        self.assertEqual(mock_post.call_args_list[1].kwargs['timeout'], 300)
+        self.assertTrue(mock_post.call_args_list[0].args[0].endswith('/document/classify'))
+
+    @patch('addy_client.time.sleep')
+    def test_retries_transient_failures(self, mock_sleep):
+        """Test 429/5xx responses are retried with backoff"""
+        responses = [self._response(429, {'Retry-After': '2'}), self._response(503), self._response(200)]
+        with patch.object(self.client.session, 'post', side_effect=responses) as mock_post:
+            response = self.client.extract(self.payload)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(mock_post.call_count, 3)
+        self.assertEqual(mock_sleep.call_args_list[0].args[0], 2.0)
+        self.assertLessEqual(mock_sleep.call_args_list[1].args[0], 1.0)
+
+    @patch('addy_client.time.sleep')
+    def test_gives_up_after_max_retries(self, mock_sleep):
+        """Test the last response is returned once retries are exhausted"""
+        with patch.object(self.client.session, 'post', return_value=self._response(500)) as mock_post:
+            response = self.client.extract(self.payload)
+
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(mock_post.call_count, 3)
+
+    @patch('addy_client.time.sleep')
+    def test_retries_connection_errors(self, mock_sleep):
+        """Test connection errors are retried and re-raised when persistent"""
+        with patch.object(self.client.session, 'post', side_effect=requests.exceptions.ConnectionError('reset')):
+            with self.assertRaises(requests.exceptions.ConnectionError):
+                self.client.classify(self.payload)
+
+        self.assertEqual(mock_sleep.call_count, 2)
+
+    @patch('addy_client.time.sleep')
+    def test_read_timeouts_not_retried(self, mock_sleep):
+        """Test a read timeout is raised at once instead of resending the request"""
+        with patch.object(self.client.session, 'post', side_effect=requests.exceptions.ReadTimeout('slow')) as mock_post:
+            with self.assertRaises(requests.exceptions.ReadTimeout):
+                self.client.extract(self.payload)
+
+        self.assertEqual(mock_post.call_count, 1)
+        mock_sleep.assert_not_called()
+
+    def test_requests_go_through_limiter(self):
+        """Test every attempt takes a limiter slot and errors shrink the limit"""
+        with patch.object(self.client.session, 'post', return_value=self._response(503)), \
+             patch('addy_client.time.sleep'):
+            self.client.extract(self.payload)
+
+        state = self.client.limiter.state()
+        self.assertEqual(state['requests'], 3)
+        self.assertEqual(state['errors'], 3)
+        self.assertEqual(state['in_flight'], 0)
+        self.assertEqual(state['limit'], 2)
+
+    def test_circuit_breaker_fails_fast(self):
+        """Test the circuit opens after repeated failures and recovers after a trial call"""
+        self.client.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        with patch.object(self.client.session, 'post', return_value=self._response(503)) as mock_post, \
+             patch('addy_client.time.sleep'):
+            self.client.extract(self.payload)
+            self.client.extract(self.payload)
+            with self.assertRaises(CircuitOpenError):
+                self.client.extract(self.payload)
+
+        self.assertEqual(mock_post.call_count, 6)
+        self.assertEqual(self.client.breaker.state, 'open')
+
+        # After the reset timeout one trial call is let through
+        self.client.breaker.opened_at -= 60
+        with patch.object(self.client.session, 'post', return_value=self._response(200)):
+            self.client.extract(self.payload)
+        self.assertEqual(self.client.breaker.state, 'closed')
+
+    def test_hedged_extract(self):
+        """Test a slow extract call is hedged and the faster response wins"""
+        self.client.hedge_percentile = 95
+        self.client.hedge_delay_default = 0.05
+        release = threading.Event()
+        fast = self._response(200)
+
+        def post(url, json=None, timeout=None):
+            if mock_post.call_count == 1:
+                release.wait(5)
+                return self._response(200)
+            return fast
+
+        with patch.object(self.client.session, 'post', side_effect=post) as mock_post:
+            response = self.client.extract(self.payload)
+        release.set()
+
+        self.assertIs(response, fast)
+        self.assertEqual(mock_post.call_count, 2)
+        self.assertEqual(self.client.hedged_requests, 1)
+
+    def test_hedge_timed_from_send(self):
+        """Test time spent waiting for a limiter slot doesn't trigger a hedge"""
+        self.client.limiter = AddyRateLimiter(rate=1000, initial_limit=1)
+        self.client.hedge_percentile = 95
+        self.client.hedge_delay_default = 0.2
+        held = self.client.limiter.request()
+        threading.Timer(0.3, held.__exit__, (None, None, None)).start()
+
+        with patch.object(self.client.session, 'post', return_value=self._response(200)) as mock_post:
+            response = self.client.extract(self.payload)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(mock_post.call_count, 1)
+        self.assertEqual(self.client.hedged_requests, 0)
+
+    def test_no_hedge_while_limiter_full(self):
+        """Test a slow call isn't duplicated while the limiter has no free slot"""
+        self.client.limiter = AddyRateLimiter(rate=1000, initial_limit=1)
+        self.client.hedge_percentile = 95
+        self.client.hedge_delay_default = 0.05
+
+        def post(url, json=None, timeout=None):
+            threading.Event().wait(0.2)
+            return self._response(200)
+
+        with patch.object(self.client.session, 'post', side_effect=post) as mock_post:
+            response = self.client.extract(self.payload)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(mock_post.call_count, 1)
+        self.assertEqual(self.client.hedged_requests, 0)
+
+    def test_aborted_request_not_sent(self):
+        """Test a hedge whose call was answered gives its limiter slot back unsent"""
+        answered = threading.Event()
+        answered.set()
+        limit = self.client.limiter.controller.limit
+
+        with patch.object(self.client.session, 'post') as mock_post:
+            with self.assertRaises(HedgeCancelled):
+                self.client.post('extract', self.payload, abort=answered)
+
+        mock_post.assert_not_called()
+        self.assertEqual(self.client.breaker.state, 'closed')
+        self.assertEqual(self.client.limiter.in_flight, 0)
+        self.assertEqual(self.client.limiter.stats['errors'], 0)
+        self.assertEqual(self.client.limiter.controller.limit, limit)
+
+    def test_reset_shared_state(self):
+        """Test the shared breaker and limiter can be reset between tests"""
+        client = get_addy_client('test-reset-key')
+        for _ in range(client.breaker.failure_threshold):
+            client.breaker.record(False)
+        with get_rate_limiter().request() as slot:
+            slot.error = True
+        self.assertTrue(client.breaker.is_open)
+
+        reset_shared_state()
+
+        self.assertEqual(client.breaker.state, 'closed')
+        self.assertEqual(get_rate_limiter().limit, int(get_rate_limiter().controller.initial))
+        self.assertEqual(get_rate_limiter().state()['errors'], 0)
+
+    def test_client_reused_per_api_key(self):
+        """Test callers share one client per API key"""
+        self.assertIs(get_addy_client('key-a'), get_addy_client('key-a'))
+        self.assertIsNot(get_addy_client('key-a'), get_addy_client('key-b'))
+
+class TestAsyncAddyClient(unittest.IsolatedAsyncioTestCase):
+    @patch('addy_client.asyncio.sleep', new_callable=AsyncMock)
+    async def test_retries_transient_failures(self, mock_sleep):
+        """Test the async client retries 5xx responses"""
+        failed = MagicMock(status_code=502, headers={})
+        succeeded = MagicMock(status_code=200, headers={})
+
+        async with AsyncAddyClient('test-addy-key', max_retries=2, max_concurrency=5,
+                                   limiter=AddyRateLimiter(rate=1000), breaker=CircuitBreaker()) as client:
+            with patch.object(client.client, 'post', AsyncMock(side_effect=[failed, succeeded])) as mock_post:
+                response = await client.extract({'fileData': 'ZGF0YQ=='})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(mock_post.await_count, 2)
+        self.assertEqual(mock_sleep.await_count, 1)
+
+    async def test_hedged_extract_cancels_loser(self):
+        """Test the slower of two hedged requests is cancelled"""
+        cancelled = asyncio.Event()
+        fast = MagicMock(status_code=200, headers={})
+
+        async def post(url, json=None, timeout=None):
+            if mock_post.await_count == 1:
+                try:
+                    await asyncio.sleep(5)
+                except asyncio.CancelledError:
+                    cancelled.set()
+                    raise
+            return fast
+
+        async with AsyncAddyClient('test-addy-key', limiter=AddyRateLimiter(rate=1000), breaker=CircuitBreaker(),
+                                   hedge_percentile=95) as client:
+            client.hedge_delay_default = 0.05
+            with patch.object(client.client, 'post', AsyncMock(side_effect=post)) as mock_post:
+                response = await client.extract({'fileData': 'ZGF0YQ=='})
+            await asyncio.wait_for(cancelled.wait(), 1)
+
+        self.assertIs(response, fast)
+        self.assertEqual(client.breaker.state, 'closed')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,11 +3,21 @@ from unittest.mock import patch, MagicMock
 import json
 import jwt
 import os
+import io
+import time
+import threading
+import shutil
+import tempfile
 from datetime import datetime, timedelta
 from api import app
+from job_queue import JobQueue
+from addy_client import reset_shared_state
 
 class TestAPI(unittest.TestCase):
     def setUp(self):
+        # Start from a closed circuit and a fresh rate limiter
+        reset_shared_state()
+        
         app.config['TESTING'] = True
         self.client = app.test_client()
         
@@ -114,10 +124,10 @@ class TestAPI(unittest.TestCase):
         mock_guidelines = ['Guideline 1', 'Guideline 2']
         mock_response = "The maximum LTV is 97% for single-family homes in California."
         
-        with patch('api.nlp_engine.extract_entities', return_value=mock_entities), \
-             patch('api.nlp_engine.detect_intent', return_value=mock_intent), \
+        with patch('api.nlp_engine.extract_entities', return_value=mock_entities) as mock_extract, \
+             patch('api.nlp_engine.detect_intent', return_value=mock_intent) as mock_detect, \
              patch('api.nlp_engine.search_guidelines', return_value=mock_guidelines), \
-             patch('api.nlp_engine.generate_response', return_value=mock_response):
+             patch('api.nlp_engine.generate_response', return_value=(mock_response, {'confidence_score': 0.9})):
             
             response = self.client.post(
                 '/api/nlp/query',
@@ -135,6 +145,12 @@ class TestAPI(unittest.TestCase):
             self.assertEqual(data['entities'], mock_entities)
             self.assertEqual(data['guidelines'], mock_guidelines)
             self.assertEqual(data['response'], mock_response)
+            self.assertEqual(data['metadata'], {'confidence_score': 0.9})
+            self.assertEqual(set(data['timings']), {'intent', 'entities', 'search', 'response'})
+            
+            # Each stage runs once per request
+            mock_detect.assert_called_once_with(test_query)
+            mock_extract.assert_called_once_with(test_query)
 
     def test_process_query_no_query(self):
         """Test query processing without query"""
@@ -189,5 +205,192 @@ class TestAPI(unittest.TestCase):
             self.assertTrue(data['success'])
             self.assertEqual(data['classification']['documentType'], 'W2')
 
+    def test_process_document_streams_upload(self):
+        """Test uploads reach the pipeline from a unique temp file that is removed afterwards"""
+        seen = {}
+        
+        def fake_process(path):
+            with open(path, 'rb') as f:
+                seen[path] = f.read()
+            return {'success': True, 'data': {}}
+        
+        with patch('api.process_document', side_effect=fake_process):
+            for _ in range(2):
+                response = self.client.post(
+                    '/api/document/process',
+                    headers={'Authorization': f'Bearer {self.test_token}'},
+                    data={'file': (io.BytesIO(b'%PDF-1.4\n...'), 'test.pdf')},
+                    content_type='multipart/form-data'
+                )
+                self.assertEqual(response.status_code, 200)
+        
+        self.assertEqual(len(seen), 2)
+        for path, content in seen.items():
+            self.assertNotEqual(os.path.basename(path), 'test.pdf')
+            self.assertEqual(content, b'%PDF-1.4\n...')
+            self.assertFalse(os.path.exists(path))
+
+    def test_process_document_rejects_non_pdf_content(self):
+        """Test uploads without the PDF header are rejected"""
+        with patch('api.process_document') as mock_process:
+            response = self.client.post(
+                '/api/document/process',
+                headers={'Authorization': f'Bearer {self.test_token}'},
+                data={'file': (io.BytesIO(b'GIF89a...'), 'test.pdf')},
+                content_type='multipart/form-data'
+            )
+        data = json.loads(response.data)
+        
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(data['error'], 'Only PDF files are supported')
+        mock_process.assert_not_called()
+
+    def test_process_document_rejects_oversized_upload(self):
+        """Test uploads over the size limit are rejected"""
+        with patch.dict(os.environ, {'MAX_UPLOAD_BYTES': '1024'}), \
+             patch('api.process_document') as mock_process:
+            response = self.client.post(
+                '/api/document/process',
+                headers={'Authorization': f'Bearer {self.test_token}'},
+                data={'file': (io.BytesIO(b'%PDF-1.4\n' + b'0' * 4096), 'test.pdf')},
+                content_type='multipart/form-data'
+            )
+        
+        self.assertEqual(response.status_code, 413)
+        mock_process.assert_not_called()
+
+    def test_process_document_stream_emits_events(self):
+        """Test progress is streamed as Server-Sent Events ending with the result"""
+        seen = {}
+
+        def fake_process(path, on_event=None, cancel=None):
+            seen['path'] = path
+            seen['exists'] = os.path.exists(path)
+            on_event('preflight', {'route': 'chunked'})
+            on_event('classified', {'documentType': 'w2'})
+            on_event('chunk', {'index': 0, 'fields': {'income': 75000.0}, 'merged': {'income': 75000.0}})
+            return {'success': True, 'data': {'income': 75000.0}}
+
+        with patch('api.process_document', side_effect=fake_process):
+            response = self.client.post(
+                '/api/document/process/stream',
+                headers={'Authorization': f'Bearer {self.test_token}'},
+                data={'file': (io.BytesIO(b'%PDF-1.4\n...'), 'test.pdf')},
+                content_type='multipart/form-data'
+            )
+            body = response.get_data(as_text=True)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'text/event-stream')
+        self.assertTrue(seen['exists'])
+        self.assertFalse(os.path.exists(seen['path']))
+
+        events = [block.split('\n') for block in body.strip().split('\n\n')]
+        self.assertEqual([lines[0] for lines in events],
+                         ['event: preflight', 'event: classified', 'event: chunk', 'event: done'])
+        self.assertEqual(json.loads(events[2][1][len('data: '):])['merged']['income'], 75000.0)
+        self.assertTrue(json.loads(events[3][1][len('data: '):])['success'])
+
+    def test_process_document_stream_cancelled_on_disconnect(self):
+        """Test processing is cancelled when the streaming client goes away"""
+        started = threading.Event()
+        cancelled = threading.Event()
+
+        def fake_process(path, on_event=None, cancel=None):
+            on_event('preflight', {'route': 'chunked'})
+            started.set()
+            if cancel.wait(5):
+                cancelled.set()
+            return {'success': False, 'error': 'Processing cancelled', 'error_type': 'ProcessingCancelled'}
+
+        with patch('api.process_document', side_effect=fake_process):
+            response = self.client.post(
+                '/api/document/process/stream',
+                headers={'Authorization': f'Bearer {self.test_token}'},
+                data={'file': (io.BytesIO(b'%PDF-1.4\n...'), 'test.pdf')},
+                content_type='multipart/form-data'
+            )
+            first = next(response.response)
+            self.assertTrue(started.wait(5))
+            response.close()
+
+        self.assertIn('event: preflight', first.decode() if isinstance(first, bytes) else first)
+        self.assertTrue(cancelled.wait(5))
+
+    def test_nlp_document_multiple_files(self):
+        """Test several files sent to the NLP endpoint are processed together"""
+        def fake_process_documents(paths, borrower_stated_type=None, applicants=None):
+            return {
+                'success': True,
+                'documents': [{'file': path, 'success': True} for path in paths],
+                'failed_documents': 0
+            }
+        
+        with patch('api.nlp_engine.process_documents', side_effect=fake_process_documents) as mock_process:
+            response = self.client.post(
+                '/api/nlp/document',
+                headers={'Authorization': f'Bearer {self.test_token}'},
+                data={'file': [(io.BytesIO(b'%PDF-1.4\n...'), 'w2.pdf'), (io.BytesIO(b'%PDF-1.4\n...'), 'paystub.pdf')]},
+                content_type='multipart/form-data'
+            )
+        data = json.loads(response.data)
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(mock_process.call_args.args[0]), 2)
+        self.assertEqual([entry['file'] for entry in data['documents']], ['w2.pdf', 'paystub.pdf'])
+
+    def test_batch_documents_and_job_status(self):
+        """Test batch upload returns immediately and the job reports per-file results"""
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        mock_result = {'success': True, 'data': {'income': 75000.0}}
+        queue = JobQueue(
+            os.path.join(temp_dir, 'jobs.db'),
+            os.path.join(temp_dir, 'jobs'),
+            processors={'document': lambda path, **options: mock_result}
+        )
+        self.addCleanup(queue.stop)
+        
+        with patch('api.get_job_queue', return_value=queue):
+            response = self.client.post(
+                '/api/documents/batch',
+                headers={'Authorization': f'Bearer {self.test_token}'},
+                data={'files': [
+                    (io.BytesIO(b'%PDF-1.4\n...'), 'w2.pdf'),
+                    (io.BytesIO(b'%PDF-1.4\n...'), 'paystub.pdf')
+                ]},
+                content_type='multipart/form-data'
+            )
+            data = json.loads(response.data)
+            
+            self.assertEqual(response.status_code, 202)
+            self.assertEqual(data['files'], 2)
+            
+            for _ in range(500):
+                status = json.loads(self.client.get(
+                    data['status_url'],
+                    headers={'Authorization': f'Bearer {self.test_token}'}
+                ).data)
+                if status['status'] == 'completed':
+                    break
+                time.sleep(0.01)
+            
+            self.assertEqual(status['status'], 'completed')
+            self.assertEqual([f['filename'] for f in status['files']], ['w2.pdf', 'paystub.pdf'])
+            self.assertEqual(status['files'][0]['result'], mock_result)
+
+    def test_job_status_not_found(self):
+        """Test unknown jobs return 404"""
+        queue = MagicMock()
+        queue.get_job.return_value = None
+        
+        with patch('api.get_job_queue', return_value=queue):
+            response = self.client.get(
+                '/api/jobs/missing',
+                headers={'Authorization': f'Bearer {self.test_token}'}
+            )
+        
+        self.assertEqual(response.status_code, 404)
+
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
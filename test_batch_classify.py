@@ -0,0 +1,57 @@
+import unittest
+from unittest.mock import MagicMock
+from document_buffer import DocumentBuffer
+from batch_classify import pack_batches, map_classifications, classify_batch
+
+def classify_response(classifications, success=True):
+    response = MagicMock()
+    response.json.return_value = {'success': success, 'classifications': classifications}
+    return response
+
+class TestBatchClassify(unittest.TestCase):
+    def test_pack_batches_respects_limits(self):
+        """Test inputs are packed in order within the byte and count limits"""
+        self.assertEqual(pack_batches([10, 10, 10, 10, 10], max_bytes=100, max_files=2), [[0, 1], [2, 3], [4]])
+        self.assertEqual(pack_batches([60, 30, 20, 150, 10], max_bytes=100, max_files=10), [[0, 1], [2], [3], [4]])
+        self.assertEqual(pack_batches([], max_bytes=100, max_files=10), [])
+
+        # One file per request unless CLASSIFY_BATCH_FILES is raised
+        self.assertEqual(pack_batches([10, 10, 10], max_bytes=100), [[0], [1], [2]])
+
+    def test_map_classifications(self):
+        """Test classifications are mapped back by file index or position"""
+        indexed = [{'documentType': 'W2', 'fileIndex': 1}, {'documentType': 'paystub', 'fileIndex': 0},
+                   {'documentType': 'W2', 'fileIndex': 0}]
+        self.assertEqual([[c['documentType'] for c in group] for group in map_classifications(indexed, 2)],
+                         [['paystub', 'W2'], ['W2']])
+
+        # Without indexes only a single-file batch can be mapped; a packet and an
+        # unclassifiable file also give two classifications for two files
+        unindexed = [{'documentType': 'W2'}, {'documentType': 'paystub'}]
+        self.assertEqual(map_classifications(unindexed, 1), [unindexed])
+        self.assertEqual(map_classifications(unindexed, 2), [None, None])
+        self.assertEqual(map_classifications([], 1), [None])
+
+    def test_classify_batch_maps_results_to_inputs(self):
+        """Test several documents share one classify call and failed batches map to None"""
+        documents = [DocumentBuffer.from_bytes(b'%PDF-' + bytes([i]) * 10) for i in range(3)]
+        client = MagicMock()
+
+        def classify(payload):
+            # Batches are sent concurrently, so answer by payload rather than call order
+            if len(payload['fileData']) == 1:
+                return classify_response([], success=False)
+            return classify_response([{'documentType': 'W2', 'fileIndex': 0},
+                                      {'documentType': 'paystub', 'fileIndex': 1}])
+        client.classify.side_effect = classify
+
+        results = classify_batch(client, documents, lambda file_data: {'fileData': file_data}, max_files=2)
+
+        self.assertEqual(client.classify.call_count, 2)
+        self.assertIn([documents[0].data, documents[1].data],
+                      [call.args[0]['fileData'] for call in client.classify.call_args_list])
+        self.assertEqual(results, [[{'documentType': 'W2', 'fileIndex': 0}], [{'documentType': 'paystub', 'fileIndex': 1}],
+                                   None])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import unittest
+import os
+import base64
+import hashlib
+import tempfile
+import shutil
+from document_buffer import DocumentBuffer, as_document_buffer
+
+class TestDocumentBuffer(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.content = b'%PDF-1.4\n' + b'x' * 4096
+        self.pdf_path = os.path.join(self.temp_dir, 'test.pdf')
+        with open(self.pdf_path, 'wb') as f:
+            f.write(self.content)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_encodes_file_once(self):
+        """Test the base64 payload is computed once and reused"""
+        with DocumentBuffer(self.pdf_path) as document:
+            data = document.data
+            self.assertEqual(data, base64.b64encode(self.content).decode('utf-8'))
+            self.assertIs(document.data, data)
+            self.assertEqual(document.size, len(self.content))
+            self.assertEqual(document.sha256, hashlib.sha256(self.content).hexdigest())
+
+    def test_empty_file(self):
+        """Test empty files fall back to a plain read"""
+        empty_path = os.path.join(self.temp_dir, 'empty.pdf')
+        open(empty_path, 'wb').close()
+
+        with DocumentBuffer(empty_path) as document:
+            self.assertEqual(document.data, '')
+            self.assertEqual(document.size, 0)
+
+    def test_from_bytes(self):
+        """Test in-memory content survives release"""
+        document = DocumentBuffer.from_bytes(self.content, name='chunk-1')
+        document.release()
+        self.assertEqual(document.size, len(self.content))
+        self.assertEqual(document.file_path, 'chunk-1')
+
+    def test_as_document_buffer(self):
+        """Test paths are wrapped and buffers are passed through"""
+        document = as_document_buffer(self.pdf_path)
+        self.assertIsInstance(document, DocumentBuffer)
+        self.assertIs(as_document_buffer(document), document)
+        document.release()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,52 +1,82 @@
 import unittest
-from unittest.mock import patch, MagicMock, mock_open
+import asyncio
+from unittest.mock import patch, MagicMock, AsyncMock
 import json
-from document_processor import process_document
+import base64
+import os
+import shutil
+import tempfile
+import time
+import threading
+import io
+import sqlite3
+import PyPDF2
+from PyPDF2 import PageObject
+from PyPDF2.generic import DecodedStreamObject, NameObject
+from document_processor import (process_document, process_document_async, process_chunks, process_chunks_async,
+                                process_chunk, process_chunk_async, split_pdf, plan_chunks, IncrementalMerger, MergePolicy,
+                                ProcessingCancelled)
+from addy_client import CircuitBreaker, CircuitOpenError, get_addy_client, reset_shared_state
+from extraction_cache import ExtractionCache
+from document_buffer import DocumentBuffer
+
+def write_test_pdf(path, page_texts):
+    """Write a PDF with one page per text so every page has distinct content"""
+    writer = PyPDF2.PdfWriter()
+    for text in page_texts:
+        page = PageObject.create_blank_page(width=612, height=792)
+        contents = DecodedStreamObject()
+        contents.set_data(f"BT ({text}) Tj ET".encode())
+        page[NameObject('/Contents')] = contents
+        writer.add_page(page)
+    with open(path, 'wb') as f:
+        writer.write(f)
 
 class TestDocumentProcessor(unittest.TestCase):
     def setUp(self):
+        # Start from a closed circuit and a fresh rate limiter
+        reset_shared_state()
+        
         # Mock environment variables
         self.env_patcher = patch.dict('os.environ', {
             'ADDY_API_KEY': 'test-addy-key'
         })
         self.env_patcher.start()
+        
+        # A readable PDF without a text layer the local extractor recognises
+        self.temp_dir = tempfile.mkdtemp()
+        self.pdf_path = os.path.join(self.temp_dir, 'test.pdf')
+        write_test_pdf(self.pdf_path, ['Loan file page 1', 'Loan file page 2'])
 
     def tearDown(self):
         self.env_patcher.stop()
+        shutil.rmtree(self.temp_dir)
 
     def test_successful_document_processing(self):
         """Test successful document processing"""
-        # Mock file reading
-        mock_pdf_data = b'test pdf content'
-        m = mock_open(read_data=mock_pdf_data)
-        
-        with patch('builtins.open', m), \
-             patch('os.path.exists', return_value=True), \
-             patch('os.path.getsize', return_value=1024):  # 1KB file
-            
-            # Mock successful API response
-            mock_response = {
-                'success': True,
-                'document': {
-                    'wages': 75000,
-                    'credit_score': 750,
-                    'debt': 25000,
-                    'property_value': 400000
-                }
+        # Mock successful API response
+        mock_response = {
+            'success': True,
+            'document': {
+                'wages': 75000,
+                'credit_score': 750,
+                'debt': 25000,
+                'property_value': 400000
             }
-            
-            with patch('requests.post') as mock_post:
-                mock_post.return_value.json.return_value = mock_response
-                mock_post.return_value.status_code = 200
-                mock_post.return_value.raise_for_status = lambda: None
-                
-                result = process_document('test.pdf')
-                
-                self.assertTrue(result['success'])
-                self.assertEqual(result['data']['income'], 75000.0)
-                self.assertEqual(result['data']['credit_score'], 750)
-                self.assertEqual(result['data']['debt'], 25000.0)
-                self.assertEqual(result['data']['property_value'], 400000.0)
+        }
+        
+        with patch('requests.Session.post') as mock_post:
+            mock_post.return_value.json.return_value = mock_response
+            mock_post.return_value.status_code = 200
+            mock_post.return_value.raise_for_status = lambda: None
+        
+            result = process_document(self.pdf_path)
+        
+            self.assertTrue(result['success'])
+            self.assertEqual(result['data']['income'], 75000.0)
+            self.assertEqual(result['data']['credit_score'], 750)
+            self.assertEqual(result['data']['debt'], 25000.0)
+            self.assertEqual(result['data']['property_value'], 400000.0)
 
     def test_missing_file(self):
         """Test handling of missing file"""
@@ -57,22 +87,557 @@ class TestDocumentProcessor(unittest.TestCase):
 
     def test_error_handling(self):
         """Test error handling for API failures"""
-        mock_pdf_data = b'test pdf content'
-        m = mock_open(read_data=mock_pdf_data)
+        with patch('requests.Session.post') as mock_post, \
+             patch('addy_client.time.sleep'):
+            mock_post.return_value.status_code = 500
+            mock_post.return_value.json.return_value = {'error': 'API Error'}
+            mock_post.return_value.raise_for_status = lambda: None
+        
+            result = process_document(self.pdf_path)
+        
+            self.assertFalse(result['success'])
+            self.assertIn('error', result)
+
+    def test_chunked_document_processing(self):
+        """Test chunked processing merges results from every chunk"""
+        chunk_results = {
+            'chunk1.pdf': {'income': 50000.0, 'credit_score': 0, 'debt': 0.0, 'property_value': 0.0},
+            'chunk2.pdf': {'income': 75000.0, 'credit_score': 720, 'debt': 0.0, 'property_value': 0.0},
+            'chunk3.pdf': ConnectionError('API Error (500)')
+        }
+        
+        def fake_process_chunk(chunk_path, addy_api_key, doc_type=None, budget=None):
+            # Wait for classification like process_chunk does, so it can't outlive the patch
+            doc_type.result()
+            result = chunk_results[chunk_path]
+            if isinstance(result, Exception):
+                raise result
+            return result
+        
+        with patch('document_processor.split_pdf', return_value=list(chunk_results)), \
+             patch('document_processor.classify_document', return_value='w2'), \
+             patch('document_processor.process_chunk', side_effect=fake_process_chunk):
+            
+            events = []
+            result = process_document(self.pdf_path, chunked=True, max_workers=2,
+                                      on_event=lambda event, data: events.append((event, data)))
+            
+            self.assertTrue(result['success'])
+            self.assertEqual(result['data']['income'], 75000.0)
+            self.assertEqual(result['data']['credit_score'], 720)
+            self.assertEqual(result['chunks'], {'total': 3, 'failed': 1, 'cancelled': 0})
+            
+            names = [event for event, _ in events]
+            self.assertEqual(names[0], 'preflight')
+            self.assertEqual(names.count('chunk'), 2)
+            self.assertEqual(names.count('chunk_failed'), 1)
+            self.assertEqual([data['merged']['income'] for event, data in events if event == 'chunk'][-1], 75000.0)
+
+    def test_chunked_document_all_chunks_fail(self):
+        """Test chunked processing fails when no chunk can be extracted"""
+        def fake_process_chunk(chunk_path, addy_api_key, doc_type=None, budget=None):
+            doc_type.result()
+            raise ConnectionError('API Error (500)')
+        
+        with patch('document_processor.split_pdf', return_value=['chunk1.pdf', 'chunk2.pdf']), \
+             patch('document_processor.classify_document', return_value='w2'), \
+             patch('document_processor.process_chunk', side_effect=fake_process_chunk):
+            
+            result = process_document(self.pdf_path, chunked=True)
+            
+            self.assertFalse(result['success'])
+            self.assertEqual(result['error_type'], 'ConnectionError')
+
+    def test_repeat_upload_uses_cache(self):
+        """Test a repeat upload is served from the extraction cache"""
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        pdf_path = os.path.join(cache_dir, 'test.pdf')
+        write_test_pdf(pdf_path, ['Loan file page 1'])
+        
+        mock_response = {
+            'success': True,
+            'document': {'wages': 75000}
+        }
+        
+        with patch('document_processor.get_extraction_cache', return_value=ExtractionCache(cache_dir)), \
+             patch('requests.Session.post') as mock_post:
+            mock_post.return_value.json.return_value = mock_response
+            mock_post.return_value.raise_for_status = lambda: None
+            
+            first = process_document(pdf_path, chunked=False)
+            second = process_document(pdf_path, chunked=False)
+            
+            self.assertEqual(mock_post.call_count, 1)
+            self.assertEqual(first['data'], second['data'])
+            self.assertTrue(second['cached'])
+
+    def test_cache_key_includes_chunking_settings(self):
+        """Test a result cached under one chunking configuration isn't served to another"""
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        cache = ExtractionCache(cache_dir)
+        policy = MergePolicy(required_fields=[])
+        
+        with patch('document_processor.get_extraction_cache', return_value=cache), \
+             patch('document_processor.classify_document', return_value='w2'), \
+             patch('document_processor.process_chunk', return_value={'income': 1000.0}) as mock_process:
+            process_document(self.pdf_path, chunked=True, chunk_size=2, merge_policy=policy)
+            extracted = mock_process.call_count
+            self.assertTrue(process_document(self.pdf_path, chunked=True, chunk_size=2, merge_policy=policy)['cached'])
+            self.assertEqual(mock_process.call_count, extracted)
+            
+            for kwargs in ({'chunked': True, 'chunk_size': 1, 'merge_policy': policy},
+                           {'chunked': True, 'chunk_size': 2, 'merge_policy': MergePolicy(required_fields=['income'])}):
+                self.assertNotIn('cached', process_document(self.pdf_path, **kwargs))
+    
+    def test_cache_failure_does_not_fail_extraction(self):
+        """Test an unusable cache is logged and skipped rather than failing the document"""
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        cache = ExtractionCache(cache_dir)
+        cache._conn = MagicMock()
+        cache._conn.execute.side_effect = sqlite3.OperationalError('database or disk is full')
+        
+        with patch('document_processor.get_extraction_cache', return_value=cache), \
+             patch('requests.Session.post') as mock_post:
+            mock_post.return_value.json.return_value = {'success': True, 'document': {'wages': 75000}}
+            mock_post.return_value.raise_for_status = lambda: None
+            result = process_document(self.pdf_path, chunked=False)
+        
+        self.assertTrue(result['success'])
+        self.assertEqual(result['data']['income'], 75000.0)
+    
+    def test_split_pdf_in_memory(self):
+        """Test chunks are produced lazily in memory without temp files"""
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        pdf_path = os.path.join(temp_dir, 'large.pdf')
+        writer = PyPDF2.PdfWriter()
+        for _ in range(5):
+            writer.add_blank_page(612, 792)
+        with open(pdf_path, 'wb') as f:
+            writer.write(f)
+        
+        with patch('tempfile.NamedTemporaryFile') as mock_temp:
+            chunks = split_pdf(pdf_path, chunk_size=2)
+            first = next(chunks)
+            self.assertEqual(len(PyPDF2.PdfReader(io.BytesIO(first.content)).pages), 2)
+            page_counts = [len(PyPDF2.PdfReader(io.BytesIO(c.content)).pages) for c in chunks]
+        
+        self.assertEqual(page_counts, [2, 1])
+        mock_temp.assert_not_called()
+
+    def test_plan_chunks_balances_bytes(self):
+        """Test chunk boundaries follow page weights, page limits and document boundaries"""
+        # One heavy scanned page gets a chunk of its own instead of joining eight light ones
+        self.assertEqual(plan_chunks([10] * 8 + [80], chunk_size=50, target_chunks=2), [(0, 8), (8, 9)])
+        
+        ranges = plan_chunks([1] * 10, chunk_size=3, target_chunks=1)
+        self.assertEqual((ranges[0][0], ranges[-1][1]), (0, 10))
+        self.assertTrue(all(end - start <= 3 for start, end in ranges))
+        
+        # Documents starting at pages 4 and 8 are not split
+        self.assertEqual(plan_chunks([1] * 12, target_chunks=2), [(0, 6), (6, 12)])
+        self.assertEqual(plan_chunks([1] * 12, target_chunks=2, boundaries=[4, 8]), [(0, 8), (8, 12)])
+        
+        # Chunks never cross a run of pages
+        self.assertEqual(plan_chunks([1] * 10, target_chunks=1, runs=[(0, 3), (6, 10)]), [(0, 3), (6, 10)])
+
+    def test_process_chunks_bounds_materialized_chunks(self):
+        """Test chunks are only pulled from the generator when a worker is free"""
+        state = {'produced': 0, 'finished': 0, 'max_in_memory': 0}
+        
+        def chunks():
+            for _ in range(6):
+                state['produced'] += 1
+                yield 'chunk.pdf'
+        
+        def fake_process_chunk(chunk, addy_api_key, doc_type=None, budget=None):
+            state['max_in_memory'] = max(state['max_in_memory'], state['produced'] - state['finished'])
+            state['finished'] += 1
+            return {'income': 1000.0}
+        
+        with patch('document_processor.process_chunk', side_effect=fake_process_chunk):
+            result = process_chunks(chunks(), 'test-addy-key', max_workers=2)
+        
+        self.assertEqual(result['chunks'], {'total': 6, 'failed': 0, 'cancelled': 0})
+        self.assertLessEqual(state['max_in_memory'], 2)
+
+    def test_reupload_only_extracts_changed_pages(self):
+        """Test unchanged pages reuse cached page range results"""
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        pdf_path = os.path.join(temp_dir, 'loan.pdf')
+        cache = ExtractionCache(os.path.join(temp_dir, 'cache'))
+        extracted_pages = []
         
-        with patch('builtins.open', m), \
-             patch('os.path.exists', return_value=True), \
-             patch('os.path.getsize', return_value=1024):  # 1KB file
+        def fake_process_chunk(chunk, addy_api_key, doc_type=None, budget=None):
+            doc_type.result()
+            pages = PyPDF2.PdfReader(io.BytesIO(chunk.content)).pages
+            extracted_pages.append(len(pages))
+            return {'income': 1000.0 * len(extracted_pages)}
+        
+        with patch('document_processor.get_extraction_cache', return_value=cache), \
+             patch('document_processor.classify_document', return_value='w2'), \
+             patch('document_processor.process_chunk', side_effect=fake_process_chunk):
+            write_test_pdf(pdf_path, ['W2 page', 'Paystub', 'Bank statement', 'Appraisal'])
+            first = process_document(pdf_path, chunked=True, chunk_size=2, max_workers=2)
             
-            with patch('requests.post') as mock_post:
-                mock_post.return_value.status_code = 500
-                mock_post.return_value.json.return_value = {'error': 'API Error'}
-                mock_post.return_value.raise_for_status = lambda: None
-                
-                result = process_document('test.pdf')
-                
-                self.assertFalse(result['success'])
-                self.assertIn('error', result)
+            # Replace the third page and upload again
+            write_test_pdf(pdf_path, ['W2 page', 'Paystub', 'Updated statement', 'Appraisal'])
+            second = process_document(pdf_path, chunked=True, chunk_size=2, max_workers=2)
+        
+        self.assertEqual(first['pages'], {'total': 4, 'reused': 0, 'extracted': 4})
+        self.assertEqual(second['pages'], {'total': 4, 'reused': 2, 'extracted': 2})
+        # The two changed pages are spread over both workers
+        self.assertEqual(extracted_pages, [2, 2, 1, 1])
+        self.assertEqual(second['data']['income'], 4000.0)
+
+    def test_chunked_document_classified_once(self):
+        """Test a chunked document is classified once from a sample, not per chunk"""
+        write_test_pdf(self.pdf_path, [f'Loan file page {i}' for i in range(8)])
+        
+        def fake_post(url, json=None, timeout=None):
+            response = MagicMock()
+            response.status_code = 200
+            response.raise_for_status = lambda: None
+            if url.endswith('classify'):
+                pages = PyPDF2.PdfReader(io.BytesIO(base64.b64decode(json['fileData'][0]))).pages
+                response.json.return_value = {'success': True,
+                                              'classifications': [{'documentType': f'paystub-{len(pages)}'}]}
+            else:
+                response.json.return_value = {'success': True, 'document': {'wages': 50000}}
+            return response
+        
+        with patch('document_processor.CLASSIFY_SAMPLE_PAGES', 3), \
+             patch('document_processor.map_chunk_fields', return_value={'income': 1000.0}) as mock_map, \
+             patch('requests.Session.post', side_effect=fake_post) as mock_post:
+            result = process_document(self.pdf_path, chunked=True, chunk_size=2)
+        
+        self.assertTrue(result['success'])
+        self.assertEqual(result['chunks']['total'], 4)
+        urls = [call.args[0] for call in mock_post.call_args_list]
+        self.assertEqual(sum(url.endswith('classify') for url in urls), 1)
+        self.assertEqual(sum(url.endswith('extract') for url in urls), 4)
+        self.assertEqual({call.args[0] for call in mock_map.call_args_list}, {'paystub-3'})
+
+    def test_bounded_memory_mode_streams_bodies(self):
+        """Test a memory budget streams request bodies and reports peak usage"""
+        write_test_pdf(self.pdf_path, [f'Loan file page {i}' for i in range(6)])
+        bodies = []
+
+        def fake_post(url, timeout=None, **kwargs):
+            self.assertNotIn('json', kwargs)
+            bodies.append(json.loads(kwargs['data'].read()))
+            response = MagicMock()
+            response.status_code = 200
+            response.raise_for_status = lambda: None
+            if url.endswith('classify'):
+                response.json.return_value = {'success': True, 'classifications': [{'documentType': 'W2'}]}
+            else:
+                response.json.return_value = {'success': True, 'document': {'wages': 50000}}
+            return response
+
+        with patch('requests.Session.post', side_effect=fake_post):
+            result = process_document(self.pdf_path, chunked=True, chunk_size=2, memory_budget=64 * 1024,
+                                      merge_policy=MergePolicy(required_fields=[]))
+
+        self.assertTrue(result['success'])
+        self.assertEqual(result['data']['income'], 50000.0)
+        self.assertEqual(len(bodies), 4)
+        self.assertTrue(all(body['fileData'] != '__FILE_DATA__' for body in bodies))
+        self.assertGreater(result['memory']['peak_bytes'], 0)
+        self.assertLessEqual(result['memory']['peak_bytes'], 64 * 1024)
+
+    def test_digital_w2_extracted_locally(self):
+        """Test a W-2 with a text layer is extracted without calling Addy"""
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        pdf_path = os.path.join(temp_dir, 'w2.pdf')
+        write_test_pdf(pdf_path, ['Form W-2 Wage and Tax Statement', '1 Wages, tips, other compensation 85,250.00'])
+        
+        with patch('requests.Session.post') as mock_post:
+            result = process_document(pdf_path)
+        
+        self.assertTrue(result['success'])
+        self.assertEqual(result['data']['income'], 85250.0)
+        self.assertEqual(result['extraction']['source'], 'local')
+        mock_post.assert_not_called()
+
+    def test_incremental_merger_policy(self):
+        """Test the merger is complete only when required fields are confident enough"""
+        merger = IncrementalMerger(MergePolicy(required_fields=['income', 'credit_score'], min_confidence=0.8))
+        
+        self.assertFalse(merger.add({'income': 85250.0, 'confidence': 0.6}))
+        self.assertFalse(merger.add({'credit_score': 720}))
+        self.assertTrue(merger.add({'income': 80000.0, 'confidence': 0.9}))
+        self.assertEqual(merger.data['income'], 85250.0)
+        self.assertFalse(IncrementalMerger(MergePolicy(required_fields=[])).complete)
+        
+        # By default the fields the classified document type can produce are required
+        with patch.dict('os.environ'):
+            os.environ.pop('EARLY_EXIT_FIELDS', None)
+            policy = MergePolicy()
+        self.assertEqual(policy.fields_for('W2'), ('income',))
+        self.assertEqual(policy.fields_for('bank_statement'), ())
+        self.assertFalse(IncrementalMerger(policy).add({'income': 50000.0}))
+
+    def test_process_chunks_stops_when_required_fields_found(self):
+        """Test no further chunks are extracted once the policy is satisfied"""
+        results = [
+            {'income': 50000.0, 'credit_score': 0, 'debt': 0.0, 'property_value': 0.0},
+            {'income': 75000.0, 'credit_score': 720, 'debt': 0.0, 'property_value': 0.0},
+            {'income': 0.0, 'credit_score': 0, 'debt': 9000.0, 'property_value': 0.0}
+        ]
+        policy = MergePolicy(required_fields=['income', 'credit_score'])
+        
+        with patch('document_processor.process_chunk', side_effect=results) as mock_process:
+            result = process_chunks(iter(['c1.pdf', 'c2.pdf', 'c3.pdf']), 'test-addy-key', max_workers=1,
+                                    merger=IncrementalMerger(policy))
+        
+        self.assertEqual(mock_process.call_count, 2)
+        self.assertEqual(result['data']['credit_score'], 720)
+        self.assertEqual(result['chunks'], {'total': 2, 'failed': 0, 'cancelled': 0})
+
+    def test_process_chunks_stops_early_with_default_policy(self):
+        """Test the default policy stops once the W-2's income is found"""
+        results = [
+            {'income': 85250.0, 'credit_score': 0, 'debt': 0.0, 'property_value': 0.0, 'documentType': 'w2'},
+            {'income': 0.0, 'credit_score': 0, 'debt': 0.0, 'property_value': 0.0, 'documentType': 'w2'}
+        ]
+        
+        with patch.dict('os.environ'), \
+             patch('document_processor.process_chunk', side_effect=results) as mock_process:
+            os.environ.pop('EARLY_EXIT_FIELDS', None)
+            result = process_chunks(iter(['c1.pdf', 'c2.pdf', 'c3.pdf']), 'test-addy-key', max_workers=1)
+        
+        self.assertEqual(mock_process.call_count, 1)
+        self.assertEqual(result['data']['income'], 85250.0)
+        self.assertEqual(result['chunks'], {'total': 1, 'failed': 0, 'cancelled': 0})
+
+    def test_classification_deferred_until_needed(self):
+        """Test the document is only classified once a chunk needs Addy, and not left running"""
+        classifier = MagicMock(return_value='w2')
+        
+        def local_chunk(chunk, addy_api_key, doc_type=None, budget=None):
+            return {'income': 0.0}
+        
+        with patch('document_processor.process_chunk', side_effect=local_chunk):
+            process_chunks(iter(['c1.pdf', 'c2.pdf']), 'test-addy-key', max_workers=2, classifier=classifier)
+        classifier.assert_not_called()
+        
+        finished = []
+        
+        def slow_classifier():
+            time.sleep(0.2)
+            finished.append('w2')
+            return 'w2'
+        
+        def remote_chunk(chunk, addy_api_key, doc_type=None, budget=None):
+            doc_type.start()
+            return {'income': 85250.0, 'documentType': 'w2'}
+        
+        with patch('document_processor.process_chunk', side_effect=remote_chunk):
+            result = process_chunks(iter(['c1.pdf', 'c2.pdf', 'c3.pdf']), 'test-addy-key', max_workers=1,
+                                    merger=IncrementalMerger(MergePolicy(required_fields=['income'])),
+                                    classifier=slow_classifier)
+        
+        # The run stopped early but waited for the classify call it had started
+        self.assertEqual(result['chunks']['total'], 1)
+        self.assertEqual(finished, ['w2'])
+
+    def test_process_chunks_cancelled(self):
+        """Test a cancelled run starts no further chunks and raises"""
+        cancel = threading.Event()
+        
+        def fake_process_chunk(chunk, addy_api_key, doc_type=None, budget=None):
+            cancel.set()
+            return {'income': 0.0}
+        
+        with patch('document_processor.process_chunk', side_effect=fake_process_chunk) as mock_process:
+            with self.assertRaises(ProcessingCancelled):
+                process_chunks(iter(['c1.pdf', 'c2.pdf', 'c3.pdf']), 'test-addy-key', max_workers=1, cancel=cancel)
+        
+        self.assertEqual(mock_process.call_count, 1)
+
+    def test_process_chunk_fails_fast_when_circuit_open(self):
+        """Test chunks skip Addy while the circuit is open, using any local result"""
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+        breaker.record(False)
+        w2_path = os.path.join(self.temp_dir, 'w2.pdf')
+        write_test_pdf(w2_path, ['Form W-2', '1 Wages, tips, other compensation 85,250.00', 'Illegible'])
+        
+        with patch.object(get_addy_client('test-addy-key'), 'breaker', breaker), \
+             patch('document_processor.LOCAL_MIN_CONFIDENCE', 1.1), \
+             patch('requests.Session.post') as mock_post:
+            result = process_chunk(w2_path, 'test-addy-key')
+            with self.assertRaises(CircuitOpenError):
+                process_chunk(self.pdf_path, 'test-addy-key')
+        
+        self.assertEqual(result['income'], 85250.0)
+        mock_post.assert_not_called()
+
+    def test_degraded_results_not_cached(self):
+        """Test local fallbacks from an open circuit are cached neither per page range nor per document"""
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+        breaker.record(False)
+        w2_path = os.path.join(self.temp_dir, 'w2.pdf')
+        w2_page = 'Form W-2 Wage and Tax Statement 1 Wages, tips, other compensation 85,250.00'
+        write_test_pdf(w2_path, [w2_page, w2_page + ' copy'])
+        cache = ExtractionCache(os.path.join(self.temp_dir, 'cache'))
+        policy = MergePolicy(required_fields=[])
+        
+        with patch('document_processor.get_extraction_cache', return_value=cache), \
+             patch('document_processor.LOCAL_MIN_CONFIDENCE', 1.1):
+            with patch.object(get_addy_client('test-addy-key'), 'breaker', breaker), \
+                 patch('requests.Session.post') as mock_post:
+                degraded = process_document(w2_path, chunked=True, chunk_size=1, merge_policy=policy)
+                mock_post.assert_not_called()
+            
+            # Once the circuit closes, every page goes to Addy again
+            with patch('document_processor.classify_document', return_value='w2'), \
+                 patch('document_processor.process_chunk', return_value={'income': 90000.0}) as mock_process:
+                recovered = process_document(w2_path, chunked=True, chunk_size=1, merge_policy=policy)
+        
+        self.assertEqual(degraded['data']['income'], 85250.0)
+        self.assertEqual(degraded['chunks']['degraded'], 2)
+        self.assertNotIn('cached', recovered)
+        self.assertEqual(recovered['pages']['reused'], 0)
+        self.assertEqual(mock_process.call_count, 2)
+        self.assertEqual(recovered['data']['income'], 90000.0)
+    
+    def test_corrupt_document_rejected_by_preflight(self):
+        """Test unreadable PDFs are rejected without calling Addy"""
+        with open(self.pdf_path, 'wb') as f:
+            f.write(b'%PDF-1.4 truncated')
+        
+        with patch('requests.Session.post') as mock_post:
+            result = process_document(self.pdf_path)
+        
+        self.assertFalse(result['success'])
+        self.assertEqual(result['error_type'], 'PreflightError')
+        self.assertEqual(result['preflight']['route'], 'reject')
+        mock_post.assert_not_called()
+
+    def test_slimming_reports_uploaded_bytes(self):
+        """Test the slimmed document is uploaded and its byte counts reported"""
+        pages = ['Loan file page 1 amount 1,200.00'] + ['Instructions for Employee'] * 10
+        write_test_pdf(self.pdf_path, pages)
+
+        with patch('document_processor.SLIMMING_ENABLED', True), \
+             patch('requests.Session.post') as mock_post:
+            mock_post.return_value.json.return_value = {'success': True, 'document': {'wages': 50000}}
+            mock_post.return_value.status_code = 200
+            mock_post.return_value.raise_for_status = lambda: None
+
+            result = process_document(self.pdf_path, chunked=False)
+
+        self.assertTrue(result['success'])
+        self.assertEqual(result['slimming']['pages_dropped'], 10)
+        self.assertEqual(result['slimming']['bytes_before'], os.path.getsize(self.pdf_path))
+        self.assertLess(result['slimming']['bytes_after'], result['slimming']['bytes_before'])
+
+        uploaded = base64.b64decode(mock_post.call_args.kwargs['json']['fileData'])
+        self.assertEqual(len(uploaded), result['slimming']['bytes_after'])
+        self.assertEqual(len(PyPDF2.PdfReader(io.BytesIO(uploaded)).pages), 1)
+
+class TestDocumentProcessorAsync(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        # Start from a closed circuit and a fresh rate limiter
+        reset_shared_state()
+        
+        self.env_patcher = patch.dict('os.environ', {
+            'ADDY_API_KEY': 'test-addy-key'
+        })
+        self.env_patcher.start()
+        
+        # Mock async Addy client
+        self.client = MagicMock()
+        classify_response = MagicMock()
+        classify_response.json.return_value = {
+            'success': True,
+            'classifications': [{'documentType': 'W2'}]
+        }
+        self.client.classify = AsyncMock(return_value=classify_response)
+        self.client.breaker = CircuitBreaker()
+
+    def tearDown(self):
+        self.env_patcher.stop()
+
+    def _extract_response(self, wages):
+        response = MagicMock()
+        response.json.return_value = {'success': True, 'document': {'wages': wages}}
+        return response
+
+    async def test_async_chunked_processing(self):
+        """Test chunks are extracted as coroutines and merged"""
+        self.client.extract = AsyncMock(side_effect=[
+            self._extract_response(50000),
+            self._extract_response(75000)
+        ])
+        
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        pdf_path = os.path.join(temp_dir, 'test.pdf')
+        write_test_pdf(pdf_path, ['Loan file page 1', 'Loan file page 2'])
+        chunks = [DocumentBuffer.from_bytes(b'chunk pdf content'), DocumentBuffer.from_bytes(b'chunk pdf content')]
+        
+        with patch('document_processor.split_pdf', return_value=chunks):
+            result = await process_document_async(pdf_path, chunked=True, max_concurrency=2, client=self.client,
+                                                  merge_policy=MergePolicy(required_fields=[]))
+        
+        self.assertTrue(result['success'])
+        self.assertEqual(result['data']['income'], 75000.0)
+        self.assertEqual(result['chunks'], {'total': 2, 'failed': 0, 'cancelled': 0})
+        self.assertEqual(self.client.extract.await_count, 2)
+        self.assertEqual(self.client.classify.await_count, 1)
+
+    async def test_async_cancels_outstanding_chunks(self):
+        """Test outstanding chunk requests are cancelled once the policy is satisfied"""
+        cancelled = asyncio.Event()
+        
+        async def fake_chunk(chunk, client, doc_type=None):
+            if chunk == 'c1.pdf':
+                return {'income': 75000.0}
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+        
+        with patch('document_processor.process_chunk_async', new=fake_chunk):
+            result = await process_chunks_async(
+                iter(['c1.pdf', 'c2.pdf']), self.client, max_concurrency=2,
+                merger=IncrementalMerger(MergePolicy(required_fields=['income']))
+            )
+        await asyncio.wait_for(cancelled.wait(), 1)
+        
+        self.assertEqual(result['data']['income'], 75000.0)
+        self.assertEqual(result['chunks'], {'total': 2, 'failed': 0, 'cancelled': 1})
+
+    async def test_async_chunk_fails_fast_when_circuit_open(self):
+        """Test async chunks skip Addy while the circuit is open, as in process_chunk"""
+        self.client.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+        self.client.breaker.record(False)
+        self.client.extract = AsyncMock()
+        
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        pdf_path = os.path.join(temp_dir, 'test.pdf')
+        write_test_pdf(pdf_path, ['Loan file page 1'])
+        
+        with self.assertRaises(CircuitOpenError):
+            await process_chunk_async(pdf_path, self.client, 'w2')
+        self.client.extract.assert_not_awaited()
+
+    async def test_async_missing_file(self):
+        """Test handling of missing file in the async pipeline"""
+        with patch('os.path.exists', return_value=False):
+            result = await process_document_async('nonexistent.pdf', client=self.client)
+        
+        self.assertFalse(result['success'])
+        self.assertEqual(result['error_type'], 'FileNotFoundError')
 
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
@@ -0,0 +1,101 @@
+import unittest
+from unittest.mock import patch
+import os
+import tempfile
+import shutil
+import sqlite3
+from extraction_cache import ExtractionCache, hash_file
+
+class TestExtractionCache(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.cache = ExtractionCache(self.cache_dir, max_entries=2, ttl_seconds=60)
+
+        self.sample_result = {
+            'success': True,
+            'data': {
+                'income': 75000.0,
+                'credit_score': 750,
+                'debt': 25000.0,
+                'property_value': 400000.0
+            }
+        }
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_hit_and_miss(self):
+        """Test cached results are returned and counted"""
+        key = ExtractionCache.make_key('abc123', pipeline='test')
+
+        self.assertIsNone(self.cache.get(key))
+        self.cache.set(key, self.sample_result)
+        self.assertEqual(self.cache.get(key), self.sample_result)
+
+        stats = self.cache.stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['entries'], 1)
+
+    def test_key_includes_request_parameters(self):
+        """Test different request parameters produce different keys"""
+        key1 = ExtractionCache.make_key('abc123', borrower_stated_type='W2', applicants=None)
+        key2 = ExtractionCache.make_key('abc123', borrower_stated_type='paystub', applicants=None)
+        key3 = ExtractionCache.make_key('abc123', applicants=None, borrower_stated_type='W2')
+
+        self.assertNotEqual(key1, key2)
+        self.assertEqual(key1, key3)
+
+    def test_lru_eviction(self):
+        """Test least recently used entries are evicted over the entry limit"""
+        with patch('extraction_cache.time.time', side_effect=[1.0, 2.0, 3.0, 4.0, 5.0, 6.0]):
+            self.cache.set('a', {'value': 1})
+            self.cache.set('b', {'value': 2})
+            self.cache.get('a')  # 'b' is now the least recently used
+            self.cache.set('c', {'value': 3})
+            self.assertIsNone(self.cache.get('b'))
+            self.assertEqual(self.cache.get('a'), {'value': 1})
+
+        self.assertEqual(self.cache.stats()['evictions'], 1)
+
+    def test_ttl_expiry(self):
+        """Test entries older than the TTL are treated as misses"""
+        with patch('extraction_cache.time.time', return_value=100.0):
+            self.cache.set('a', self.sample_result)
+        with patch('extraction_cache.time.time', return_value=200.0):
+            self.assertIsNone(self.cache.get('a'))
+
+        self.assertEqual(self.cache.stats()['expired'], 1)
+
+    def test_locked_database_is_best_effort(self):
+        """Test a locked database reads as a miss and skips writes instead of raising"""
+        self.cache.set('a', self.sample_result)
+        self.cache._conn.execute('PRAGMA busy_timeout = 0')
+        other = sqlite3.connect(self.cache.db_path)
+        other.execute('BEGIN EXCLUSIVE')
+
+        try:
+            self.assertIsNone(self.cache.get('a'))
+            self.cache.set('b', self.sample_result)
+        finally:
+            other.rollback()
+            other.close()
+
+        # The cache works again once the lock is released
+        self.assertEqual(self.cache.get('a'), self.sample_result)
+        self.assertIsNone(self.cache.get('b'))
+
+    def test_hash_file(self):
+        """Test file hashing matches the document content"""
+        path = os.path.join(self.cache_dir, 'test.pdf')
+        with open(path, 'wb') as f:
+            f.write(b'%PDF-1.4 test content')
+
+        other_path = os.path.join(self.cache_dir, 'copy.pdf')
+        shutil.copy(path, other_path)
+
+        self.assertEqual(hash_file(path), hash_file(other_path))
+        self.assertEqual(len(hash_file(path)), 64)
+
+if __name__ == '__main__':
+    unittest.main()
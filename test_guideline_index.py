@@ -0,0 +1,143 @@
+import threading
+import unittest
+from unittest.mock import MagicMock
+from guideline_index import GuidelineIndex, guideline_loan_type
+
+def guideline(row_id, category, state=None, version='v1', rule_name=None):
+    return {
+        'id': row_id,
+        'rule_name': rule_name or f"RULE-{row_id}",
+        'rule_text': f"Rule {row_id}",
+        'source': 'Fannie Mae',
+        'category': category,
+        'state': state,
+        'version_hash': version,
+        'last_updated': '2024-01-01'
+    }
+
+def table_returning(*responses):
+    """Supabase client whose guidelines queries return each response in turn"""
+    supabase = MagicMock()
+    query = supabase.table.return_value.select.return_value
+    query.in_.return_value = query
+    query.execute.side_effect = [MagicMock(data=data) for data in responses]
+    return supabase
+
+class TestGuidelineIndex(unittest.TestCase):
+    def setUp(self):
+        self.rows = [
+            guideline(1, 'LTV'),
+            guideline(2, 'LTV', state='California'),
+            guideline(3, 'LTV', state='Texas'),
+            guideline(4, 'DTI'),
+            guideline(5, 'FHA_LTV', rule_name='FHA-LTV-2024')
+        ]
+
+    def test_search_filters(self):
+        """Test categories are a union and a state matches its own and stateless guidelines"""
+        index = GuidelineIndex(table_returning(self.rows), refresh_seconds=0)
+        index.refresh()
+
+        self.assertTrue(index.ready)
+        self.assertEqual([row['id'] for row in index.search(['LTV'])], [1, 2, 3])
+        self.assertEqual([row['id'] for row in index.search(['LTV', 'FHA_LTV'], 'California')], [1, 2, 5])
+        self.assertEqual([row['id'] for row in index.search(state='Texas')], [1, 3, 4, 5])
+        self.assertEqual([row['id'] for row in index.search(loan_type='FHA')], [5])
+        self.assertEqual(index.search(['credit_score']), [])
+
+        # Results are copies, so callers can't corrupt the index
+        index.search(['DTI'])[0]['category'] = 'changed'
+        self.assertEqual(index.search(['DTI'])[0]['category'], 'DTI')
+
+    def test_incremental_refresh(self):
+        """Test a refresh fetches only changed rows and drops removed ones"""
+        versions = [{'id': row['id'], 'version_hash': row['version_hash'], 'last_updated': row['last_updated']}
+                    for row in self.rows]
+        versions[1]['version_hash'] = 'v2'
+        del versions[3]
+        versions.append({'id': 6, 'version_hash': 'v1', 'last_updated': '2024-01-01'})
+        changed = [guideline(2, 'DTI', state='California', version='v2'), guideline(6, 'LTV')]
+
+        supabase = table_returning(self.rows, versions, changed)
+        index = GuidelineIndex(supabase, refresh_seconds=0)
+        index.refresh()
+        stats = index.refresh()
+
+        self.assertEqual(stats, {'added': 1, 'updated': 1, 'removed': 1})
+        query = supabase.table.return_value.select.return_value
+        query.in_.assert_called_once_with('id', [2, 6])
+        self.assertEqual([row['id'] for row in index.search(['LTV'])], [1, 3, 6])
+        self.assertEqual([row['id'] for row in index.search(['DTI'])], [2])
+
+    def test_failed_refresh_keeps_index(self):
+        """Test a failed load leaves the index unready and a failed poll keeps the loaded rows"""
+        supabase = table_returning(None, self.rows)
+        query = supabase.table.return_value.select.return_value
+        query.execute.side_effect = [*query.execute.side_effect, Exception("timeout")]
+        index = GuidelineIndex(supabase, refresh_seconds=0)
+
+        index.refresh()
+        self.assertFalse(index.ready)
+
+        index.refresh()
+        index.refresh()
+        self.assertTrue(index.ready)
+        self.assertEqual(len(index.search()), 5)
+
+    def test_start_loads_in_background(self):
+        """Test start returns before the first load finishes and never runs two workers"""
+        loading = threading.Event()
+        release = threading.Event()
+        supabase = table_returning(self.rows)
+        query = supabase.table.return_value.select.return_value
+        response = MagicMock(data=self.rows)
+
+        def slow_execute():
+            loading.set()
+            release.wait(5)
+            return response
+        query.execute.side_effect = slow_execute
+        index = GuidelineIndex(supabase, refresh_seconds=0)
+
+        index.start()
+        self.assertTrue(loading.wait(5))
+        self.assertFalse(index.ready)
+        worker = index._worker
+        index.start()
+        self.assertIs(index._worker, worker)
+
+        release.set()
+        worker.join(5)
+        self.assertTrue(index.ready)
+        self.assertEqual(len(index.search()), 5)
+        self.assertEqual(query.execute.call_count, 1)
+
+        # Nothing left to do once loaded without polling
+        index.start()
+        self.assertIs(index._worker, worker)
+
+    def test_json_guidelines(self):
+        """Test JSON sections are converted once and looked up by source, section and state"""
+        index = GuidelineIndex(MagicMock(), {
+            'Fannie Mae': {
+                'ltv': [{'title': 'Max LTV', 'content': '97%', 'category': 'LTV'}],
+                'fha': [{'title': 'FHA LTV', 'content': '96.5%'}],
+                'state_specific': {'Texas': [{'title': 'Texas cash-out', 'content': '80%', 'state': 'Texas'}]}
+            },
+            'Freddie Mac': {}
+        }, refresh_seconds=0)
+
+        self.assertEqual(index.json_sources, ['Fannie Mae'])
+        matches = index.json_guidelines('Fannie Mae', ['ltv', 'fha'], 'Texas')
+        self.assertEqual([match['rule_name'] for match in matches], ['Max LTV', 'FHA LTV', 'Texas cash-out'])
+        self.assertEqual(matches[1]['category'], 'general')
+        self.assertEqual(index.json_guidelines('Freddie Mac', ['ltv']), [])
+
+    def test_guideline_loan_type(self):
+        """Test the loan type is read from the category or rule name prefix"""
+        self.assertEqual(guideline_loan_type({'category': 'VA_DTI'}), 'va')
+        self.assertEqual(guideline_loan_type({'category': 'LTV', 'rule_name': 'USDA-LTV-2024'}), 'usda')
+        self.assertIsNone(guideline_loan_type({'category': 'LTV', 'rule_name': 'FNM-LTV-2023'}))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import unittest
+from unittest.mock import patch
+import os
+import time
+import shutil
+import tempfile
+from job_queue import JobQueue
+
+class TestJobQueue(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.temp_dir, 'jobs.db')
+        self.storage_dir = os.path.join(self.temp_dir, 'jobs')
+
+        def fake_process(path, **options):
+            if path.endswith('-bad.pdf'):
+                raise ValueError("Unreadable PDF")
+            return {'success': True, 'data': {'income': 75000.0}, 'options': options}
+
+        self.processors = {'document': fake_process}
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _store(self, queue, filename):
+        path = queue.storage_path(filename)
+        if 'bad' in filename:
+            path = path.replace('.pdf', '-bad.pdf')
+        with open(path, 'wb') as f:
+            f.write(b'%PDF-1.4 test')
+        return filename, path
+
+    def _wait(self, queue, job_id, timeout=5.0):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            job = queue.get_job(job_id)
+            if job['status'] not in ('queued', 'processing'):
+                return job
+            time.sleep(0.01)
+        self.fail(f"Job {job_id} did not finish")
+
+    def test_batch_processing(self):
+        """Test every file in a job is processed and reported"""
+        queue = JobQueue(self.db_path, self.storage_dir, self.processors, max_workers=2)
+        self.addCleanup(queue.stop)
+
+        files = [self._store(queue, f"w2_{i}.pdf") for i in range(3)]
+        job_id = queue.submit(files, options={'source': 'batch'}, owner='test_user')
+        job = self._wait(queue, job_id)
+
+        self.assertEqual(job['status'], 'completed')
+        self.assertEqual(job['owner'], 'test_user')
+        self.assertEqual(job['counts']['completed'], 3)
+        self.assertEqual(job['files'][0]['result']['options'], {'source': 'batch'})
+        self.assertFalse(any(os.path.exists(path) for _, path in files))
+
+    def test_partial_failure(self):
+        """Test a failing file is reported without failing the others"""
+        queue = JobQueue(self.db_path, self.storage_dir, self.processors, max_workers=2)
+        self.addCleanup(queue.stop)
+
+        job_id = queue.submit([self._store(queue, 'w2.pdf'), self._store(queue, 'bad.pdf')])
+        job = self._wait(queue, job_id)
+
+        self.assertEqual(job['status'], 'partial')
+        failed = [f for f in job['files'] if f['status'] == 'failed']
+        self.assertEqual(failed[0]['error'], 'Unreadable PDF')
+
+    def test_queue_survives_restart(self):
+        """Test files interrupted by a restart are processed by the next queue"""
+        queue = JobQueue(self.db_path, self.storage_dir, self.processors, max_workers=1)
+        with patch.object(queue, 'start'):
+            job_id = queue.submit([self._store(queue, 'w2.pdf')])
+
+        # Simulate a crash while the file was being processed
+        queue._conn.execute("UPDATE job_files SET status = 'processing'")
+        queue._conn.commit()
+        self.assertEqual(queue.get_job(job_id)['status'], 'processing')
+
+        restarted = JobQueue(self.db_path, self.storage_dir, self.processors, max_workers=1)
+        self.addCleanup(restarted.stop)
+        restarted.start()
+
+        self.assertEqual(self._wait(restarted, job_id)['status'], 'completed')
+
+    def test_unknown_job_and_pipeline(self):
+        """Test unknown jobs and pipelines are rejected"""
+        queue = JobQueue(self.db_path, self.storage_dir, self.processors)
+
+        self.assertIsNone(queue.get_job('missing'))
+        with self.assertRaises(ValueError):
+            queue.submit([('w2.pdf', '/tmp/w2.pdf')], pipeline='unknown')
+
+if __name__ == '__main__':
+    unittest.main()
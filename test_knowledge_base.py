@@ -3,6 +3,7 @@ from unittest.mock import patch, MagicMock
 from knowledge_base import KnowledgeBaseManager
 import os
 import json
+import base64
 from datetime import datetime
 import pandas as pd
 
@@ -145,6 +146,35 @@ class TestKnowledgeBaseManager(unittest.TestCase):
         os.remove(csv_file)
         os.remove(json_file)
     
+    def test_classify_documents(self):
+        """Test each document is classified in its own call and results come back in input order"""
+        def classify(payload):
+            response = MagicMock()
+            document_type = 'W2' if payload['fileData'][0] == w2_data else 'paystub'
+            response.json.return_value = {'success': True, 'classifications': [{'documentType': document_type}]}
+            return response
+        
+        paths = []
+        for i in range(2):
+            path = f'test_classify_{i}.pdf'
+            with open(path, 'wb') as f:
+                f.write(b'%PDF-' + bytes([i]) * 10)
+            paths.append(path)
+        w2_data = base64.b64encode(b'%PDF-' + bytes([0]) * 10).decode()
+        self.kb.addy_client = MagicMock()
+        self.kb.addy_client.classify.side_effect = classify
+        
+        try:
+            results = self.kb.classify_documents(paths)
+        finally:
+            for path in paths:
+                os.remove(path)
+        
+        self.assertEqual([r['documentType'] for r in results], ['W2', 'paystub'])
+        self.assertEqual(self.kb.addy_client.classify.call_count, 2)
+        for call in self.kb.addy_client.classify.call_args_list:
+            self.assertEqual(len(call.args[0]['fileData']), 1)
+    
     def test_error_handling(self):
         """Test error handling in various scenarios"""
         # Test missing credentials
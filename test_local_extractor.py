@@ -0,0 +1,44 @@
+import unittest
+from local_extractor import extract_fields, extract_local, MIN_CONFIDENCE
+from document_buffer import DocumentBuffer
+
+class TestLocalExtractor(unittest.TestCase):
+    def test_w2_wages(self):
+        """Test W-2 box 1 is found with high confidence when every copy agrees"""
+        text = (
+            'Form W-2 Wage and Tax Statement 2023\n'
+            '1 Wages, tips, other compensation $85,250.00\n'
+            'Copy C\n1 Wages, tips, other compensation 85,250.00'
+        )
+        result = extract_fields(text)
+        
+        self.assertEqual(result['documentType'], 'w2')
+        self.assertEqual(result['document'], {'wages': 85250.0})
+        self.assertGreaterEqual(result['confidence'], MIN_CONFIDENCE)
+
+    def test_paystub_gross_pay(self):
+        """Test the current-period gross pay is taken from a paystub"""
+        text = 'Earnings Statement\nPay Period: 01/01 - 01/15\nGross Pay 4,200.00\nNet Pay 3,150.00'
+        result = extract_fields(text)
+        
+        self.assertEqual(result['documentType'], 'paystub')
+        self.assertEqual(result['document'], {'grossPay': 4200.0})
+        self.assertGreaterEqual(result['confidence'], MIN_CONFIDENCE)
+
+    def test_low_confidence_without_field(self):
+        """Test a recognised document without the field falls below the threshold"""
+        result = extract_fields('Form W-2 Wage and Tax Statement (illegible)')
+        
+        self.assertEqual(result['document'], {})
+        self.assertLess(result['confidence'], MIN_CONFIDENCE)
+
+    def test_unrecognised_text(self):
+        """Test unrelated text is not matched"""
+        self.assertIsNone(extract_fields('Bank statement ending balance 12,000.00'))
+
+    def test_unreadable_document(self):
+        """Test documents that PyPDF2 cannot read have no local result"""
+        self.assertIsNone(extract_local(DocumentBuffer.from_bytes(b'%PDF-1.4 not really')))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+import os
+import json
+from unittest.mock import patch
+from document_buffer import DocumentBuffer
+from memory_budget import (MemoryBudget, RequestBody, FILE_DATA_PLACEHOLDER, payload_body, spill_document,
+                           release_document)
+
+class TestMemoryBudget(unittest.TestCase):
+    def setUp(self):
+        self.document = DocumentBuffer.from_bytes(os.urandom(100_000), name='chunk.pdf')
+        self.payload = {'documentType': 'w2', 'fileData': FILE_DATA_PLACEHOLDER, 'contentType': 'application/pdf'}
+
+    def test_request_body_matches_json_payload(self):
+        """Test the streamed body is the same JSON as encoding the payload directly"""
+        budget = MemoryBudget(1024 * 1024)
+
+        with patch('memory_budget.ENCODE_BLOCK_BYTES', 3 * 1000):
+            body = RequestBody(self.payload, self.document, budget)
+        content = body.read()
+
+        self.assertEqual(json.loads(content), {**self.payload, 'fileData': self.document.data})
+        self.assertEqual(len(content), len(body))
+        self.assertTrue(body.in_memory)
+        self.assertEqual(budget.in_use, len(body))
+
+        body.close()
+        self.assertEqual(budget.in_use, 0)
+        self.assertEqual(budget.report()['peak_bytes'], len(body))
+
+    def test_request_body_spills_when_over_budget(self):
+        """Test bodies that don't fit the budget are written to disk"""
+        budget = MemoryBudget(50_000)
+
+        with payload_body({'fileData': [FILE_DATA_PLACEHOLDER]}, self.document, budget) as body:
+            self.assertFalse(body.in_memory)
+            self.assertEqual(json.loads(body.read())['fileData'], [self.document.data])
+
+        self.assertEqual(budget.report(), {'budget_bytes': 50_000, 'peak_bytes': 0, 'spilled_bytes': len(body)})
+
+    def test_payload_body_without_budget(self):
+        """Test the payload dict is used unchanged when bounded-memory mode is off"""
+        with payload_body(self.payload) as body:
+            self.assertIs(body, self.payload)
+
+    def test_spill_document(self):
+        """Test chunks that don't fit are moved to a temp file and cleaned up"""
+        budget = MemoryBudget(150_000)
+
+        kept = spill_document(self.document, budget)
+        spilled = spill_document(DocumentBuffer.from_bytes(b'%PDF-' + b'0' * 99_995), budget)
+
+        self.assertIs(kept, self.document)
+        self.assertTrue(spilled.from_file)
+        self.assertEqual(bytes(spilled.content), b'%PDF-' + b'0' * 99_995)
+        self.assertEqual(budget.in_use, 100_000)
+
+        release_document(kept, budget)
+        release_document(spilled, budget)
+        self.assertEqual(budget.in_use, 0)
+        self.assertFalse(os.path.exists(spilled.file_path))
+        self.assertEqual(budget.report()['spilled_bytes'], 100_000)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,17 +1,33 @@
 import unittest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
+import asyncio
 from nlp_engine import MortgageNLPEngine
 import os
 import json
+import base64
+import io
+import tempfile
+import shutil
+import sqlite3
+import PyPDF2
+from PyPDF2 import PageObject
+from PyPDF2.generic import DecodedStreamObject, NameObject
+from addy_client import CircuitBreaker, reset_shared_state
+from extraction_cache import ExtractionCache
+from document_buffer import DocumentBuffer
 
 class TestMortgageNLPEngine(unittest.TestCase):
     @patch('nlp_engine.create_client')
     def setUp(self, mock_create_client):
+        # Start from a closed circuit and a fresh rate limiter
+        reset_shared_state()
+        
         # Mock environment variables
         self.env_patcher = patch.dict('os.environ', {
             'SUPABASE_URL': 'https://test.supabase.co',
             'SUPABASE_KEY': 'test-key',
-            'OPENAI_API_KEY': 'test-openai-key'
+            'OPENAI_API_KEY': 'test-openai-key',
+            'GUIDELINE_INDEX': 'false'
         })
         self.env_patcher.start()
         
@@ -57,6 +73,9 @@ class TestMortgageNLPEngine(unittest.TestCase):
         for query, expected_intent in test_cases:
             intent = self.engine.detect_intent(query)
             self.assertEqual(intent, expected_intent, f"Failed to detect intent for: {query}")
+        
+        queries = [query for query, _ in test_cases]
+        self.assertEqual(self.engine.detect_intents(queries), [intent for _, intent in test_cases])
     
     def test_entity_extraction(self):
         """Test entity extraction from queries"""
@@ -66,6 +85,18 @@ class TestMortgageNLPEngine(unittest.TestCase):
         self.assertEqual(entities['state'], 'California')
         self.assertEqual(entities['property_type'], 'single-family')
     
+    def test_relevance_matches_property_type_spellings(self):
+        """Test a normalized property type still matches the spelling used in a guideline"""
+        entities = self.engine.extract_entities("What is the maximum LTV for a single family home?")
+        self.assertEqual(entities['property_type'], 'single-family')
+        
+        guidelines = [
+            {'category': 'DTI', 'rule_name': 'Other', 'rule_text': 'Applies to condos.', 'state': None},
+            {'category': 'DTI', 'rule_name': 'SFR', 'rule_text': 'Applies to Single Family homes.', 'state': None}
+        ]
+        ranked = self.engine._sort_guidelines_by_relevance(guidelines, 'ltv_inquiry', entities)
+        self.assertEqual(ranked[0]['rule_name'], 'SFR')
+    
     def test_confidence_scoring(self):
         """Test confidence score calculation"""
         # Test with no guidelines or entities
@@ -126,6 +157,34 @@ class TestMortgageNLPEngine(unittest.TestCase):
         self.assertTrue(isinstance(guidelines, list))
         self.assertEqual(len(guidelines), 2)
     
+    def test_guideline_search_uses_index(self):
+        """Test a loaded guideline index answers searches without querying Supabase"""
+        self.mock_supabase.table.return_value.select.return_value.execute.return_value = MagicMock(
+            data=self.sample_guidelines
+        )
+        self.engine.guideline_index.refresh()
+        self.mock_supabase.reset_mock()
+        
+        guidelines = self.engine.search_guidelines('ltv_inquiry', {'state': 'California'})
+        self.assertEqual([g['rule_name'] for g in guidelines], ['FNM-LTV-2023'])
+        self.mock_supabase.table.assert_not_called()
+    
+    @patch('nlp_engine.create_client')
+    def test_guideline_index_loads_on_first_search(self, mock_create_client):
+        """Test the engine leaves the index unloaded until a search, and only when enabled"""
+        mock_create_client.return_value = self.mock_supabase
+        with patch.dict('os.environ', {'GUIDELINE_INDEX': 'true'}):
+            engine = MortgageNLPEngine()
+        
+        with patch.object(engine.guideline_index, 'start') as mock_start:
+            self.mock_supabase.table.assert_not_called()
+            engine.search_guidelines('ltv_inquiry', {})
+            mock_start.assert_called_once()
+        
+        with patch.object(self.engine.guideline_index, 'start') as mock_start:
+            self.engine.search_guidelines('ltv_inquiry', {})
+            mock_start.assert_not_called()
+    
     @patch('nlp_engine.openai.chat.completions.create')
     def test_end_to_end_query(self, mock_openai):
         """Test end-to-end query processing"""
@@ -152,6 +211,22 @@ class TestMortgageNLPEngine(unittest.TestCase):
         self.assertEqual(result['intent'], 'ltv_inquiry')
         self.assertIn('entities', result)
         self.assertIn('metadata', result)
+        self.assertEqual(set(result['timings']), {'intent', 'entities', 'search', 'response'})
+    
+    @patch('nlp_engine.openai.chat.completions.create')
+    def test_query_stages_run_once(self, mock_openai):
+        """Test intent and entities are computed once and reused by response generation"""
+        mock_openai.return_value = MagicMock(choices=[MagicMock(message=MagicMock(content="95%"))])
+        
+        with patch.object(self.engine, 'detect_intent', wraps=self.engine.detect_intent) as mock_detect, \
+             patch.object(self.engine, 'extract_entities', wraps=self.engine.extract_entities) as mock_extract, \
+             patch.object(self.engine, 'search_guidelines', return_value=self.sample_guidelines):
+            result = self.engine.process_query("What is the  maximum LTV in  New York?")
+        
+        self.assertEqual(mock_detect.call_count, 1)
+        self.assertEqual(mock_extract.call_count, 1)
+        self.assertEqual(result['entities'], {'state': 'New York'})
+        self.assertEqual(result['metadata']['intent'], 'ltv_inquiry')
     
     @patch('nlp_engine.openai.chat.completions.create')
     def test_error_handling(self, mock_openai):
@@ -169,5 +244,244 @@ class TestMortgageNLPEngine(unittest.TestCase):
         self.assertEqual(metadata['confidence_score'], 0.0)
         self.assertEqual(metadata['model_used'], 'gpt-4o-mini')
 
+    @patch('requests.Session.post')
+    def test_document_encoded_once(self, mock_post):
+        """Test classification and extraction share a single encoded payload"""
+        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as f:
+            f.write(b'%PDF-1.4 test document')
+        self.addCleanup(os.remove, f.name)
+        
+        classify_response = MagicMock()
+        classify_response.json.return_value = {
+            'success': True,
+            'classifications': [{'documentType': 'W2', 'startPage': 0, 'pages': 1}]
+        }
+        extract_response = MagicMock()
+        extract_response.json.return_value = {
+            'success': True,
+            'documentType': 'W2',
+            'document': {'wages': 75000}
+        }
+        mock_post.side_effect = [classify_response, extract_response]
+        
+        with patch('document_buffer.base64.b64encode', wraps=base64.b64encode) as mock_encode:
+            result = self.engine.process_document(f.name)
+        
+        self.assertTrue(result['success'])
+        self.assertEqual(mock_encode.call_count, 1)
+        classify_payload = mock_post.call_args_list[0].kwargs['json']
+        extract_payload = mock_post.call_args_list[1].kwargs['json']
+        self.assertIs(classify_payload['fileData'][0], extract_payload['fileData'])
+
+    def test_process_document_async(self):
+        """Test the async document pipeline classifies then extracts"""
+        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as f:
+            f.write(b'%PDF-1.4 test document')
+        self.addCleanup(os.remove, f.name)
+        
+        classify_response = MagicMock()
+        classify_response.json.return_value = {
+            'success': True,
+            'classifications': [{'documentType': 'W2'}]
+        }
+        extract_response = MagicMock()
+        extract_response.json.return_value = {
+            'success': True,
+            'documentType': 'W2',
+            'document': {'wages': 75000}
+        }
+        client = MagicMock()
+        client.classify = AsyncMock(return_value=classify_response)
+        client.extract = AsyncMock(return_value=extract_response)
+        
+        result = asyncio.run(self.engine.process_document_async(f.name, borrower_stated_type='W2', client=client))
+        
+        self.assertTrue(result['success'])
+        self.assertEqual(result['extraction']['data']['wages'], 75000)
+        classify_payload = client.classify.await_args.args[0]
+        self.assertEqual(classify_payload['borrowerStatedDocumentType'], 'W2')
+        self.assertEqual(client.extract.await_args.args[0]['classification']['documentType'], 'W2')
+
+    @patch('requests.Session.post')
+    def test_process_packet(self, mock_post):
+        """Test a packet is split by classified page ranges and grouped by applicant"""
+        writer = PyPDF2.PdfWriter()
+        for _ in range(5):
+            writer.add_blank_page(612, 792)
+        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as f:
+            writer.write(f)
+        self.addCleanup(os.remove, f.name)
+        
+        classify_response = MagicMock()
+        classify_response.json.return_value = {
+            'success': True,
+            'classifications': [
+                {'documentType': 'W2', 'startPage': 0, 'pages': 2, 'applicantIds': ['a1']},
+                {'documentType': 'paystub', 'startPage': 2, 'pages': 3, 'applicantIds': ['a2']}
+            ]
+        }
+        
+        uploaded_pages = {}
+        
+        def fake_post(url, json=None, timeout=None):
+            if url.endswith('/document/classify'):
+                return classify_response
+            doc_type = json['classification']['documentType']
+            pdf = PyPDF2.PdfReader(io.BytesIO(base64.b64decode(json['fileData'])))
+            uploaded_pages[doc_type] = len(pdf.pages)
+            response = MagicMock()
+            response.json.return_value = {'success': True, 'documentType': doc_type, 'document': {}}
+            return response
+        
+        mock_post.side_effect = fake_post
+        
+        result = self.engine.process_packet(f.name)
+        
+        self.assertTrue(result['success'])
+        self.assertEqual(uploaded_pages, {'W2': 2, 'paystub': 3})
+        self.assertEqual([d['page_range'] for d in result['documents']], [[0, 2], [2, 5]])
+        self.assertEqual(result['borrowers']['a1'][0]['document_type'], 'W2')
+        self.assertEqual(result['borrowers']['a2'][0]['document_type'], 'paystub')
+        self.assertEqual(result['failed_documents'], 0)
+
+    def test_split_packet_page_ranges(self):
+        """Test parts without a length stop at the next part and 1-based page numbers are normalized"""
+        writer = PyPDF2.PdfWriter()
+        for _ in range(5):
+            writer.add_blank_page(612, 792)
+        buffer = io.BytesIO()
+        writer.write(buffer)
+        document = DocumentBuffer.from_bytes(buffer.getvalue())
+        
+        def page_ranges(classifications):
+            return [page_range for _, _, page_range in self.engine._split_packet(document, classifications)]
+        
+        self.assertEqual(page_ranges([{'documentType': 'W2', 'startPage': 0},
+                                      {'documentType': 'paystub', 'startPage': 2}]), [(0, 2), (2, 5)])
+        self.assertEqual(page_ranges([{'documentType': 'W2', 'startPage': 1, 'pages': 2},
+                                      {'documentType': 'paystub', 'startPage': 3}]), [(0, 2), (2, 5)])
+        self.assertEqual(page_ranges([{'documentType': 'W2'}]), [(0, 5)])
+    
+    def test_process_packet_skips_cache_for_local_fallback(self):
+        """Test a packet with a sub-document extracted locally while Addy was down is not cached"""
+        writer = PyPDF2.PdfWriter()
+        for _ in range(2):
+            writer.add_blank_page(612, 792)
+        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as f:
+            writer.write(f)
+        self.addCleanup(os.remove, f.name)
+        
+        cache = MagicMock()
+        cache.get.return_value = None
+        classifications = [{'documentType': 'W2', 'startPage': 0, 'pages': 1},
+                           {'documentType': 'paystub', 'startPage': 1, 'pages': 1}]
+        extractions = [{'documentType': 'W2', 'data': {'wages': 85250.0}, 'source': 'local'},
+                       {'documentType': 'paystub', 'data': {'grossPay': 4000.0}}]
+        
+        with patch.object(self.engine, 'extraction_cache', cache), \
+             patch.object(self.engine, '_classify_packet', return_value=classifications), \
+             patch.object(self.engine, '_extract_document_data', side_effect=extractions):
+            result = self.engine.process_packet(f.name)
+        
+        self.assertTrue(result['success'])
+        self.assertEqual(result['failed_documents'], 0)
+        cache.set.assert_not_called()
+
+    def test_process_packet_survives_unusable_cache(self):
+        """Test a locked or full cache database doesn't fail an otherwise successful extraction"""
+        writer = PyPDF2.PdfWriter()
+        writer.add_blank_page(612, 792)
+        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as f:
+            writer.write(f)
+        self.addCleanup(os.remove, f.name)
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        
+        cache = ExtractionCache(cache_dir)
+        cache._conn = MagicMock()
+        cache._conn.execute.side_effect = sqlite3.OperationalError('database is locked')
+        classifications = [{'documentType': 'W2', 'startPage': 0, 'pages': 1}]
+        
+        with patch.object(self.engine, 'extraction_cache', cache), \
+             patch.object(self.engine, '_classify_packet', return_value=classifications), \
+             patch.object(self.engine, '_extract_document_data', return_value={'documentType': 'W2', 'data': {}}):
+            result = self.engine.process_packet(f.name)
+        
+        self.assertTrue(result['success'])
+        self.assertEqual(result['failed_documents'], 0)
+    
+    @patch('requests.Session.post')
+    def test_process_document_local_fallback_when_circuit_open(self, mock_post):
+        """Test a W-2 is handled from its text layer while the Addy circuit is open"""
+        writer = PyPDF2.PdfWriter()
+        page = PageObject.create_blank_page(width=612, height=792)
+        contents = DecodedStreamObject()
+        contents.set_data(b"BT (Form W-2 Wage and Tax Statement 1 Wages, tips, other compensation 85,250.00) Tj ET")
+        page[NameObject('/Contents')] = contents
+        writer.add_page(page)
+        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as f:
+            writer.write(f)
+        self.addCleanup(os.remove, f.name)
+        
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+        breaker.record(False)
+        
+        with patch.object(self.engine.addy_client, 'breaker', breaker):
+            result = self.engine.process_document(f.name)
+        
+        self.assertTrue(result['success'])
+        self.assertEqual(result['classification']['documentType'], 'w2')
+        self.assertEqual(result['extraction']['data'], {'wages': 85250.0})
+        self.assertEqual(result['extraction']['source'], 'local')
+        mock_post.assert_not_called()
+
+    @patch('requests.Session.post')
+    def test_process_documents_classifies_each_file(self, mock_post):
+        """Test each file gets its own classify call by default and results map back to each file"""
+        paths = []
+        for index in range(3):
+            with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as f:
+                f.write(b'%PDF-1.4 document ' + str(index).encode())
+            self.addCleanup(os.remove, f.name)
+            paths.append(f.name)
+        
+        def fake_post(url, json=None, timeout=None):
+            response = MagicMock()
+            if url.endswith('/document/classify'):
+                # Responses don't say which file they belong to; fileIndex is only
+                # sent by deployments that batch several files per call
+                files = [base64.b64decode(file_data).decode()[-1] for file_data in json['fileData']]
+                classifications = [{'documentType': f'type-{file}'} for file in files]
+                if len(files) > 1:
+                    classifications = [{**c, 'fileIndex': i} for i, c in enumerate(classifications)]
+                response.json.return_value = {'success': True, 'classifications': classifications}
+            else:
+                doc_type = json['classification']['documentType']
+                response.json.return_value = {'success': True, 'documentType': doc_type, 'document': {}}
+            return response
+        
+        mock_post.side_effect = fake_post
+        
+        def classify_requests():
+            return [call for call in mock_post.call_args_list if call.args[0].endswith('/document/classify')]
+        
+        result = self.engine.process_documents(paths)
+        
+        self.assertTrue(result['success'])
+        self.assertEqual([len(call.kwargs['json']['fileData']) for call in classify_requests()], [1, 1, 1])
+        self.assertEqual([entry['file'] for entry in result['documents']], paths)
+        self.assertEqual([entry['extraction']['document_type'] for entry in result['documents']],
+                         ['type-0', 'type-1', 'type-2'])
+        self.assertEqual(result['failed_documents'], 0)
+        
+        # A deployment that returns fileIndex can take several files per call
+        mock_post.reset_mock()
+        with patch('batch_classify.CLASSIFY_BATCH_FILES', 10):
+            result = self.engine.process_documents(paths)
+        
+        self.assertEqual(len(classify_requests()), 1)
+        self.assertEqual([entry['extraction']['document_type'] for entry in result['documents']],
+                         ['type-0', 'type-1', 'type-2'])
+
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
@@ -0,0 +1,88 @@
+import unittest
+import io
+import zlib
+import PyPDF2
+from PIL import Image
+from PyPDF2 import PageObject
+from PyPDF2.generic import DecodedStreamObject, DictionaryObject, NameObject, NumberObject, StreamObject
+from document_buffer import DocumentBuffer
+from pdf_slimming import slim_pdf, is_boilerplate
+
+def build_pdf(page_texts, image=None):
+    """Build PDF bytes with one page per text, each optionally showing an RGB image"""
+    writer = PyPDF2.PdfWriter()
+    for text in page_texts:
+        page = PageObject.create_blank_page(width=612, height=792)
+        contents = DecodedStreamObject()
+        contents.set_data(f"BT ({text}) Tj ET".encode())
+        page[NameObject('/Contents')] = contents
+        if image is not None:
+            x_object = StreamObject()
+            x_object._data = zlib.compress(image.tobytes())
+            x_object.update({
+                NameObject('/Type'): NameObject('/XObject'),
+                NameObject('/Subtype'): NameObject('/Image'),
+                NameObject('/Width'): NumberObject(image.width),
+                NameObject('/Height'): NumberObject(image.height),
+                NameObject('/ColorSpace'): NameObject('/DeviceRGB'),
+                NameObject('/BitsPerComponent'): NumberObject(8),
+                NameObject('/Filter'): NameObject('/FlateDecode')
+            })
+            page[NameObject('/Resources')] = DictionaryObject({
+                NameObject('/XObject'): DictionaryObject({NameObject('/Im0'): writer._add_object(x_object)})
+            })
+        writer.add_page(page)
+    output = io.BytesIO()
+    writer.write(output)
+    return DocumentBuffer.from_bytes(output.getvalue(), name='test.pdf')
+
+def read_pdf(document):
+    return PyPDF2.PdfReader(io.BytesIO(bytes(document.content)))
+
+class TestPdfSlimming(unittest.TestCase):
+    def test_boilerplate_heuristic(self):
+        """Test instruction pages are boilerplate unless they carry amounts"""
+        self.assertTrue(is_boilerplate('Instructions for Employee. Box 1 shows your wages.'))
+        self.assertFalse(is_boilerplate('Notice to Employee: wages 52,000.00'))
+        self.assertFalse(is_boilerplate('Form W-2 Wage and Tax Statement'))
+
+    def test_downsamples_large_images(self):
+        """Test images above the DPI threshold are re-encoded smaller"""
+        # 2400px across an 8.5in page is ~280 DPI
+        image = Image.effect_noise((2400, 600), 60).convert('RGB')
+        document = build_pdf(['Form W-2'], image)
+
+        slimmed, report = slim_pdf(document, max_dpi=150)
+
+        self.assertTrue(report['applied'])
+        self.assertEqual(report['images_downsampled'], 1)
+        self.assertEqual(report['bytes_before'], document.size)
+        self.assertEqual(report['bytes_after'], slimmed.size)
+        self.assertLess(report['bytes_after'], report['bytes_before'])
+
+        x_object = read_pdf(slimmed).pages[0]['/Resources']['/XObject']['/Im0'].get_object()
+        self.assertEqual(x_object['/Filter'], '/DCTDecode')
+        self.assertLessEqual(x_object['/Width'], 1275)
+
+    def test_drops_boilerplate_pages(self):
+        """Test instruction-only pages are removed but content pages are kept"""
+        document = build_pdf(['Form W-2 Wages 52,000.00', 'Instructions for Employee'] * 20)
+
+        slimmed, report = slim_pdf(document)
+
+        self.assertEqual(report['pages_dropped'], 20)
+        pages = read_pdf(slimmed).pages
+        self.assertEqual(len(pages), 20)
+        self.assertIn('52,000.00', pages[0].extract_text())
+
+    def test_never_drops_every_page(self):
+        """Test a document made only of boilerplate is left whole"""
+        document = build_pdf(['Instructions for Employee', 'Notice to Employee'])
+
+        slimmed, report = slim_pdf(document)
+
+        self.assertEqual(report['pages_dropped'], 0)
+        self.assertEqual(len(read_pdf(slimmed).pages), 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+import io
+import PyPDF2
+from PyPDF2 import PageObject
+from PyPDF2.generic import DecodedStreamObject, NameObject
+from pdf_utils import page_hashes, write_pages, outline_starts
+
+def build_pdf(page_texts):
+    """Build an in-memory PDF with one page per text"""
+    writer = PyPDF2.PdfWriter()
+    for text in page_texts:
+        page = PageObject.create_blank_page(width=612, height=792)
+        contents = DecodedStreamObject()
+        contents.set_data(f"BT ({text}) Tj ET".encode())
+        page[NameObject('/Contents')] = contents
+        writer.add_page(page)
+    output = io.BytesIO()
+    writer.write(output)
+    return PyPDF2.PdfReader(io.BytesIO(output.getvalue()))
+
+class TestPdfUtils(unittest.TestCase):
+    def test_page_hashes_follow_content(self):
+        """Test identical pages hash the same and changed pages differ"""
+        original = page_hashes(build_pdf(['W2', 'Paystub', 'Bank statement']))
+        updated = page_hashes(build_pdf(['W2', 'Paystub v2', 'Bank statement']))
+
+        self.assertEqual(original[0], updated[0])
+        self.assertNotEqual(original[1], updated[1])
+        self.assertEqual(original[2], updated[2])
+
+    def test_page_hashes_survive_rewrite(self):
+        """Test hashes do not depend on object numbers in the file"""
+        reader = build_pdf(['W2', 'Paystub', 'Bank statement'])
+        rewritten = PyPDF2.PdfReader(io.BytesIO(write_pages(reader, [1, 2])))
+
+        self.assertEqual(page_hashes(reader)[1:], page_hashes(rewritten))
+
+    def test_write_pages(self):
+        """Test a page range is written as a standalone PDF"""
+        reader = build_pdf(['A', 'B', 'C', 'D'])
+        chunk = PyPDF2.PdfReader(io.BytesIO(write_pages(reader, range(1, 3))))
+
+        self.assertEqual(len(chunk.pages), 2)
+
+    def test_outline_starts(self):
+        """Test top-level bookmarks give the first page of each document"""
+        writer = PyPDF2.PdfWriter()
+        for page in build_pdf(['W2', 'Paystub', 'Paystub', 'Bank statement']).pages:
+            writer.add_page(page)
+        writer.add_outline_item('W2', 0)
+        paystubs = writer.add_outline_item('Paystubs', 1)
+        writer.add_outline_item('March', 2, parent=paystubs)
+        writer.add_outline_item('Bank statement', 3)
+        output = io.BytesIO()
+        writer.write(output)
+
+        self.assertEqual(outline_starts(PyPDF2.PdfReader(io.BytesIO(output.getvalue()))), [0, 1, 3])
+        self.assertEqual(outline_starts(build_pdf(['W2'])), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import unittest
+import io
+from unittest.mock import patch
+import PyPDF2
+from PyPDF2 import PageObject
+from PyPDF2.generic import DecodedStreamObject, NameObject
+from document_buffer import DocumentBuffer
+from preflight import preflight, ROUTE_LOCAL, ROUTE_SINGLE, ROUTE_CHUNKED, ROUTE_REJECT
+
+def build_pdf(page_texts, password=None):
+    """Build PDF bytes with one page per text; None gives a page without text"""
+    writer = PyPDF2.PdfWriter()
+    for text in page_texts:
+        page = PageObject.create_blank_page(width=612, height=792)
+        if text is not None:
+            contents = DecodedStreamObject()
+            contents.set_data(f"BT ({text}) Tj ET".encode())
+            page[NameObject('/Contents')] = contents
+        writer.add_page(page)
+    if password:
+        writer.encrypt(password)
+    output = io.BytesIO()
+    writer.write(output)
+    return DocumentBuffer.from_bytes(output.getvalue(), name='test.pdf')
+
+class TestPreflight(unittest.TestCase):
+    def test_short_text_document_routes_local(self):
+        """Test short documents with a text layer try the local extractor"""
+        report = preflight(build_pdf(['Form W-2', 'Wages']), chunk_size=50)
+        
+        self.assertEqual(report['route'], ROUTE_LOCAL)
+        self.assertEqual(report['pages'], 2)
+        self.assertTrue(report['text_layer'])
+        self.assertGreater(report['max_page_bytes'], 0)
+
+    def test_scan_routes_single(self):
+        """Test documents without a text layer go to Addy in one request"""
+        report = preflight(build_pdf([None, None]), chunk_size=50)
+        
+        self.assertEqual(report['route'], ROUTE_SINGLE)
+        self.assertFalse(report['text_layer'])
+
+    def test_long_document_routes_chunked(self):
+        """Test documents longer than the chunk size are chunked"""
+        report = preflight(build_pdf([f'Page {i}' for i in range(5)]), chunk_size=2)
+        
+        self.assertEqual(report['route'], ROUTE_CHUNKED)
+
+    def test_heavy_page_routes_chunked(self):
+        """Test a heavy page splits a multi-page document but not a single page"""
+        with patch('preflight.HEAVY_PAGE_BYTES', 1):
+            report = preflight(build_pdf(['Form W-2', 'Wages']), chunk_size=50)
+            single = preflight(build_pdf(['Form W-2']), chunk_size=50)
+        
+        self.assertEqual(report['route'], ROUTE_CHUNKED)
+        self.assertIn('page size', report['reason'])
+        self.assertEqual(single['route'], ROUTE_LOCAL)
+
+    def test_corrupt_document_rejected(self):
+        """Test unreadable files are rejected before any remote call"""
+        report = preflight(DocumentBuffer.from_bytes(b'%PDF-1.4 truncated', name='bad.pdf'), chunk_size=50)
+        
+        self.assertEqual(report['route'], ROUTE_REJECT)
+        self.assertIn('unreadable', report['reason'])
+
+    def test_encrypted_document_rejected(self):
+        """Test encrypted files are rejected"""
+        report = preflight(build_pdf(['Secret'], password='secret'), chunk_size=50)
+        
+        self.assertEqual(report['route'], ROUTE_REJECT)
+        self.assertTrue(report['encrypted'])
+
+if __name__ == '__main__':
+    unittest.main()
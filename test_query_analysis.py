@@ -0,0 +1,69 @@
+import unittest
+from query_analysis import IntentScorer, Gazetteer, fold_case, build_entity_gazetteer
+
+class TestIntentScorer(unittest.TestCase):
+    def setUp(self):
+        self.scorer = IntentScorer(
+            {
+                'ltv_inquiry': r'(?i)(ltv|down[- ]?payment)',
+                'dti_inquiry': r'(?i)(dti|monthly payment)',
+                'document_type': r'(?i)(W2|bank statement)'
+            },
+            [('dti_inquiry', r'(?i)(income|payment)')],
+            priority=['ltv_inquiry', 'dti_inquiry']
+        )
+
+    def test_fold_case(self):
+        """Test patterns are lower-cased without changing escape sequences"""
+        self.assertEqual(fold_case(r'(?i)(W2|How\s+Much|\S+\D)'), r'(w2|how\s+much|\S+\D)')
+
+    def test_scores(self):
+        """Test keyword matches are counted, boosts add once and case is ignored"""
+        scores = self.scorer.scores('Is a W2 enough, or do I need a w2 and my Down Payment?')
+
+        self.assertEqual(scores, {'ltv_inquiry': 1, 'dti_inquiry': 1, 'general_inquiry': 0, 'document_type': 2})
+
+    def test_detect(self):
+        """Test ties go to the earlier intent and unscored queries get the default"""
+        self.assertEqual(self.scorer.detect('What LTV and DTI are allowed?'), 'ltv_inquiry')
+        self.assertEqual(self.scorer.detect('Tell me about loans'), 'general_inquiry')
+        self.assertEqual(
+            self.scorer.detect_many(['Monthly payment with my income', 'Which bank statement?']),
+            ['dti_inquiry', 'document_type']
+        )
+
+class TestGazetteer(unittest.TestCase):
+    def setUp(self):
+        self.gazetteer = build_entity_gazetteer({'income': ['W2', 'tax_return'], 'assets': ['bank_statement']})
+
+    def test_extract_entities(self):
+        """Test states, loan, property and document types are found in one pass"""
+        entities = self.gazetteer.extract('Do I need a W-2 for a VA loan on a single family home in West Virginia?')
+
+        self.assertEqual(entities, {
+            'document_type': 'W2',
+            'loan_type': 'va',
+            'property_type': 'single-family',
+            'state': 'West Virginia'
+        })
+
+    def test_state_matches(self):
+        """Test abbreviations need capitals and capitalised words aren't read as states"""
+        self.assertEqual(self.gazetteer.extract('What is the LTV in TX?'), {'state': 'Texas'})
+        self.assertEqual(self.gazetteer.extract('What Is The Maximum LTV In Total?'), {})
+        self.assertEqual(self.gazetteer.extract('tx or ca'), {})
+        self.assertEqual(self.gazetteer.extract('Two tax returns and bank statements'),
+                         {'document_type': 'tax_return'})
+
+    def test_find_prefers_longest_whole_word_match(self):
+        """Test overlapping phrases resolve to the longest and words aren't matched inside others"""
+        gazetteer = Gazetteer()
+        gazetteer.add('york', 'city', 'York')
+        gazetteer.add('new york', 'state', 'New York')
+        gazetteer.add('va', 'loan_type', 'va')
+
+        self.assertEqual(gazetteer.find('New-York value, York'),
+                         [(0, 8, 'state', 'New York'), (16, 20, 'city', 'York')])
+
+if __name__ == '__main__':
+    unittest.main()
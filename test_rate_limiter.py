@@ -0,0 +1,59 @@
+import unittest
+import threading
+from rate_limiter import TokenBucket, AIMDController, AddyRateLimiter
+
+class TestRateLimiter(unittest.TestCase):
+    def test_token_bucket(self):
+        """Test the bucket allows a burst and then asks callers to wait"""
+        bucket = TokenBucket(rate=10, burst=2)
+
+        self.assertEqual(bucket.take(), 0)
+        self.assertEqual(bucket.take(), 0)
+        self.assertGreater(bucket.take(), 0)
+
+    def test_aimd_grows_and_backs_off(self):
+        """Test healthy responses grow the limit and errors halve it once per cooldown"""
+        controller = AIMDController(initial=4, max_limit=8, cooldown=60)
+        for _ in range(4):
+            controller.record(latency=0.1, error=False)
+        self.assertAlmostEqual(controller.limit, 5, delta=0.1)
+
+        controller.record(latency=0.1, error=True)
+        controller.record(latency=0.1, error=True)
+        self.assertAlmostEqual(controller.limit, 2.5, delta=0.1)
+
+        controller.record(latency=120, error=False)
+        self.assertAlmostEqual(controller.limit, 2.5, delta=0.1)
+
+    def test_concurrency_limit(self):
+        """Test requests beyond the limit wait for a slot"""
+        limiter = AddyRateLimiter(rate=1000, initial_limit=1)
+        slot = limiter.request()
+        acquired = threading.Event()
+
+        def second_request():
+            with limiter.request():
+                acquired.set()
+
+        worker = threading.Thread(target=second_request)
+        worker.start()
+        self.assertFalse(acquired.wait(0.1))
+
+        with slot:
+            pass
+        worker.join(1)
+        self.assertTrue(acquired.is_set())
+        self.assertEqual(limiter.state()['in_flight'], 0)
+        self.assertEqual(limiter.state()['requests'], 2)
+
+    def test_max_limit_ignores_backoff(self):
+        """Test the configured ceiling stays put while the current limit backs off"""
+        limiter = AddyRateLimiter(rate=1000, initial_limit=4, max_limit=8)
+        with limiter.request() as slot:
+            slot.error = True
+
+        self.assertEqual(limiter.limit, 2)
+        self.assertEqual(limiter.max_limit, 8)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+import os
+import shutil
+import logging
+import tempfile
+from typing import List
+from flask import Request
+from dotenv import load_dotenv
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+PDF_MAGIC = b'%PDF-'
+
+class UploadRejected(Exception):
+    """
+    Raised while an upload is still streaming in.
+
+    Deliberately not a ValueError: werkzeug's form parser silently swallows
+    those, which would turn a rejected upload into a missing file.
+    """
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+class PDFUploadStream:
+    """
+    Uniquely named temp file that a multipart upload is streamed into.
+
+    The first bytes are checked against the PDF header and the running size
+    against the upload limit as they arrive, so a bad upload is rejected
+    before the rest of the body is read. Accepted uploads are handed to the
+    pipeline by path, without a second copy.
+    """
+
+    def __init__(self, upload_dir: str = None, max_bytes: int = None):
+        self.max_bytes = max_bytes or int(os.getenv('MAX_UPLOAD_BYTES', 200 * 1024 * 1024))
+        self._file = tempfile.NamedTemporaryFile(
+            prefix='upload-', suffix='.pdf', dir=upload_dir or os.getenv('UPLOAD_TMP_DIR') or None, delete=False
+        )
+        self.name = self._file.name
+        self.size = 0
+        self.detached = False
+        self._header = b''
+
+    def write(self, data: bytes) -> int:
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            self.discard()
+            raise UploadRejected(f'File exceeds the {self.max_bytes} byte upload limit', 413)
+
+        if len(self._header) < len(PDF_MAGIC):
+            self._header += bytes(data[:len(PDF_MAGIC) - len(self._header)])
+            if not PDF_MAGIC.startswith(self._header):
+                self.discard()
+                raise UploadRejected('Only PDF files are supported')
+
+        return self._file.write(data)
+
+    def validate(self) -> str:
+        """Check the complete upload and return the path it was written to"""
+        if self._header != PDF_MAGIC:
+            raise UploadRejected('Only PDF files are supported')
+        self._file.flush()
+        return self.name
+
+    def move_to(self, path: str) -> str:
+        """Move the accepted upload to a permanent location"""
+        self.validate()
+        self._file.close()
+        shutil.move(self.name, path)
+        return path
+
+    def detach(self) -> str:
+        """Keep the accepted upload after the request ends; the caller must delete it"""
+        self.validate()
+        self._file.close()
+        self.detached = True
+        return self.name
+
+    def discard(self) -> None:
+        """Close the temp file and delete it if it is still there"""
+        self._file.close()
+        if not self.detached and os.path.exists(self.name):
+            os.remove(self.name)
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __getattr__(self, name):
+        # read, seek, tell, etc. go straight to the temp file
+        return getattr(self._file, name)
+
+class UploadRequest(Request):
+    """Flask request that streams file uploads into PDFUploadStreams"""
+
+    upload_streams: List[PDFUploadStream]
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        stream = PDFUploadStream()
+        if content_length is not None and content_length > stream.max_bytes:
+            stream.discard()
+            raise UploadRejected(f'File exceeds the {stream.max_bytes} byte upload limit', 413)
+
+        if not hasattr(self, 'upload_streams'):
+            self.upload_streams = []
+        self.upload_streams.append(stream)
+        return stream
+
+    def close(self) -> None:
+        """Remove any upload the request did not move elsewhere"""
+        super().close()
+        for stream in getattr(self, 'upload_streams', []):
+            stream.discard()